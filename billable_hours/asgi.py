@@ -2,6 +2,8 @@
 ASGI config for billable_hours project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it (e.g. ``uvicorn billable_hours.asgi:application``)
+so that the status event streams are pushed as they happen.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
@@ -93,6 +94,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Shared by the web and Celery processes, e.g. for the progress of the files being processed.
+# The file-based default only works when they run on the same host, and its increments are not atomic,
+# so the progress of files loaded in parallel chunks is approximate. Use Redis in production:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and CACHE_LOCATION=redis://<host>:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'billable_hours_cache')),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -138,6 +154,14 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Static files settings for whitenoise
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# File uploads
+# The content hash of uploaded files is computed while they are received, before they are stored
+FILE_UPLOAD_HANDLERS = [
+    'invoices.upload_handlers.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -152,3 +176,41 @@ CELERY_TASK_SERIALIZER = 'json'      # Serialize tasks in JSON
 CELERY_RESULT_SERIALIZER = 'json'    # Serialize results in JSON
 CELERY_TIMEZONE = 'UTC'              # Use UTC time zone
 
+
+# Invoices pipeline
+# Accumulate the invoice summary while the CSV file is read, in the same task and transaction
+INVOICES_FUSED_PIPELINE = config('INVOICES_FUSED_PIPELINE', default=False, cast=bool)
+
+# Files larger than this (in bytes) are split into chunks of this size processed in parallel, 0 disables it
+INVOICES_PARALLEL_CHUNK_SIZE = config('INVOICES_PARALLEL_CHUNK_SIZE', default=64 * 1024 * 1024, cast=int)
+
+# How timesheet entries are inserted: 'copy' (PostgreSQL only), 'bulk_create' or 'auto' to pick COPY on PostgreSQL
+INVOICES_LOADER = config('INVOICES_LOADER', default='auto')
+# Number of rows per INSERT statement of the 'bulk_create' loader
+INVOICES_LOADER_BATCH_SIZE = config('INVOICES_LOADER_BATCH_SIZE', default=1000, cast=int)
+
+# How invoice summaries are totalled: 'decimal', or 'numpy' for vectorized integer arithmetic (requires NumPy)
+INVOICES_SUMMARY_BACKEND = config('INVOICES_SUMMARY_BACKEND', default='decimal')
+
+# Seconds the number of rows processed of a file is kept in the cache, it is deleted once the file is processed or failed
+INVOICES_PROGRESS_TIMEOUT = config('INVOICES_PROGRESS_TIMEOUT', default=24 * 60 * 60, cast=int)
+# Seconds a rendered invoice summary page is cached for, it is also replaced when the summary changes
+INVOICES_PAGE_CACHE_TIMEOUT = config('INVOICES_PAGE_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+# Seconds between two checks of the status of the files followed by the status event streams
+INVOICES_STATUS_POLL_INTERVAL = config('INVOICES_STATUS_POLL_INTERVAL', default=1.0, cast=float)
+# Seconds after which a status event stream is closed (browsers reconnect automatically)
+INVOICES_STATUS_STREAM_TIMEOUT = config('INVOICES_STATUS_STREAM_TIMEOUT', default=300, cast=int)
+
+# Render the PDF invoices of a file in the background as soon as its summary is saved
+INVOICES_PRERENDER_PDFS = config('INVOICES_PRERENDER_PDFS', default=True, cast=bool)
+
+# Seconds the results of the analytics API are cached for, they are also invalidated when files are processed
+INVOICES_ANALYTICS_CACHE_TIMEOUT = config('INVOICES_ANALYTICS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Size (in bytes) of the parts of chunked uploads, small enough to be sent within the request timeouts
+INVOICES_UPLOAD_CHUNK_SIZE = config('INVOICES_UPLOAD_CHUNK_SIZE', default=5 * 1024 * 1024, cast=int)
+# Maximum size (in bytes) of a file uploaded in parts
+INVOICES_UPLOAD_MAX_SIZE = config('INVOICES_UPLOAD_MAX_SIZE', default=10 * 1024 * 1024 * 1024, cast=int)
+# Seconds after the last part received after which an incomplete chunked upload is deleted by delete_stale_uploads
+INVOICES_UPLOAD_EXPIRY = config('INVOICES_UPLOAD_EXPIRY', default=24 * 60 * 60, cast=int)
@@ -1,6 +1,38 @@
 from django.contrib import admin
-from .models import Employee, Project, TimesheetInvoice
+from .models import DailyRollup, Employee, ProcessingStage, Project, TimeSheetFile, TimesheetInvoice
 
 admin.site.register(Employee)
 admin.site.register(Project)
 admin.site.register(TimesheetInvoice)
+
+
+class ProcessingStageInline(admin.TabularInline):
+    model = ProcessingStage
+    fields = ['name', 'started_at', 'finished_at', 'seconds', 'rows', 'queries', 'bytes_processed']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TimeSheetFile)
+class TimeSheetFileAdmin(admin.ModelAdmin):
+    list_display = ['id', 'file', 'status', 'uploaded_at']
+    list_filter = ['status']
+    inlines = [ProcessingStageInline]
+
+
+@admin.register(ProcessingStage)
+class ProcessingStageAdmin(admin.ModelAdmin):
+    list_display = ['file', 'name', 'seconds', 'rows', 'queries', 'bytes_processed', 'started_at']
+    list_filter = ['name']
+    ordering = ['-seconds']
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'project', 'employee', 'rate', 'entries', 'minutes', 'cost']
+    list_filter = ['date']
+    date_hierarchy = 'date'
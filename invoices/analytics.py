@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import json
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from .models import DailyRollup
+
+
+# Periods the totals can be grouped by, as the start date of each period
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Dimensions the totals can be grouped by, and the fields of DailyRollup they are read from
+DIMENSIONS = {
+    'project': 'project__name',
+    'employee': 'employee__employee_id',
+}
+
+# Cache key of the version of the analytics, increased whenever the rollups change
+VERSION_KEY = 'invoices:analytics:version'
+
+
+def analytics_version():
+    """
+    Return the current version of the analytics, part of the cache keys of their results.
+    """
+    cache.add(VERSION_KEY, 1, timeout=None)
+    return cache.get(VERSION_KEY, 1)
+
+
+def invalidate_analytics():
+    """
+    Make the cached analytics results out of date, once the rollups they are computed from change.
+    """
+    cache.add(VERSION_KEY, 1, timeout=None)
+    cache.incr(VERSION_KEY)
+
+
+def encode_cursor(values):
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+    """
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, fields):
+    """
+    Decode a cursor returned by encode_cursor for a query sorted by the given fields.
+    Raises a ValueError if the cursor was not made for these fields.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("Invalid cursor.")
+
+        return [decode_cursor_value(field, value) for field, value in zip(fields, values)]
+
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+def decode_cursor_value(field, value):
+    """
+    Return the value of a field decoded from a cursor, checking that it has the type of the field.
+    Raises a ValueError (or TypeError) if it does not.
+    """
+    if field == 'period':
+        return date.fromisoformat(value)
+
+    expected_type = int if field == DIMENSIONS['employee'] else str
+    # Booleans are integers too
+    if type(value) is not expected_type:
+        raise TypeError(f"Invalid value of {field} in cursor.")
+    return value
+
+
+def after(fields, values):
+    """
+    Return the condition selecting the rows sorted after the given values of the fields.
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        condition |= Q(**dict(zip(fields[:i], values[:i])), **{f'{field}__gt': values[i]})
+    return condition
+
+
+def aggregate_totals(start, end, dimensions=('project',), period=None, project=None, employee=None,
+                     cursor=None, limit=100):
+    """
+    Return a page of the hours and cost of the entries of every file between start and end
+    (inclusive), grouped by the given dimensions and period, and the cursor of the next page
+    (None on the last page). Totals can be limited to a project (by name) or an employee (by employee ID).
+    With a ``limit`` of None, every row is returned in a single page.
+
+    The totals are read from the daily rollups, by date range, and paginated on their sort key
+    rather than with offsets, so every page takes the same time.
+    Raises a ValueError for unknown dimensions or periods and invalid cursors.
+    """
+    if not dimensions and period is None:
+        raise ValueError("Totals must be grouped by a dimension or a period.")
+
+    unknown = set(dimensions) - DIMENSIONS.keys()
+    if unknown:
+        raise ValueError(f"Totals cannot be grouped by {', '.join(sorted(unknown))}.")
+    if period is not None and period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}.")
+
+    rollups = DailyRollup.objects.filter(date__range=(start, end))
+    if project is not None:
+        rollups = rollups.filter(project__name=project)
+    if employee is not None:
+        rollups = rollups.filter(employee__employee_id=employee)
+
+    # Rows are sorted by period first, then by the dimensions in the order given
+    fields = [DIMENSIONS[dimension] for dimension in dimensions]
+    if period is not None:
+        rollups = rollups.annotate(period=PERIODS[period]('date'))
+        fields.insert(0, 'period')
+
+    totals = (
+        rollups.values(*fields)
+        .annotate(entries=Sum('entries'), minutes=Sum('minutes'), cost=Sum('cost'))
+        .order_by(*fields)
+    )
+    if cursor is not None:
+        totals = totals.filter(after(fields, decode_cursor(cursor, fields)))
+
+    if limit is None:
+        rows, next_cursor = list(totals), None
+    else:
+        # One row more than the page tells whether there is a next one
+        rows = list(totals[:limit + 1])
+        next_cursor = encode_cursor([rows[limit - 1][field] for field in fields]) if len(rows) > limit else None
+
+    names = {field: name for name, field in DIMENSIONS.items()}
+    return [
+        {
+            **{names.get(field, field): row[field] for field in fields},
+            'entries': row['entries'],
+            'hours': round(Decimal(row['minutes']) / 60, 2),
+            'cost': row['cost'],
+        }
+        for row in rows[:limit]
+    ], next_cursor
+
+
+def cached_totals(**params):
+    """
+    Return aggregate_totals(**params), cached until the rollups change or
+    INVOICES_ANALYTICS_CACHE_TIMEOUT seconds have passed.
+    """
+    key = json.dumps(params, sort_keys=True, default=str)
+    cache_key = f'invoices:analytics:{analytics_version()}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    result = cache.get(cache_key)
+    if result is None:
+        result = aggregate_totals(**params)
+        cache.set(cache_key, result, timeout=settings.INVOICES_ANALYTICS_CACHE_TIMEOUT)
+
+    return result
@@ -0,0 +1,68 @@
+import hashlib
+import re
+import tempfile
+import zipfile
+from pathlib import PurePosixPath
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+
+
+# Members added to archives by the archivers themselves, rather than by the user
+IGNORED_MEMBERS = re.compile(r'(^|/)(__MACOSX/|\.)')
+
+# Number of bytes extracted from an archive at a time
+EXTRACT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_archive_members(archive, max_files, max_size):
+    """
+    Return an iterator over the files of a ZIP archive, as (uploaded file, SHA-256) tuples,
+    extracted one at a time to temporary files (kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE,
+    like uploads).
+
+    The archive is checked before anything is extracted: a ValueError is raised if it is not
+    a ZIP archive, or if it holds more than ``max_files`` files or more than ``max_size`` bytes
+    once extracted. Members are never extracted beyond the size they declare.
+    """
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ValueError("File is not a ZIP archive.")
+
+    members = [
+        info for info in zip_file.infolist()
+        if not info.is_dir() and not IGNORED_MEMBERS.search(info.filename)
+    ]
+
+    if not members:
+        raise ValueError("The archive does not contain any file.")
+    if len(members) > max_files:
+        raise ValueError(f"At most {max_files} files can be uploaded at once.")
+    if sum(info.file_size for info in members) > max_size:
+        raise ValueError(f"The files of the archive are larger than {max_size} bytes.")
+
+    return (extract_member(zip_file, info) for info in members)
+
+
+def extract_member(zip_file, info):
+    """
+    Extract a member of a ZIP archive to a temporary file, computing its SHA-256 on the way.
+    Raises a ValueError if the member is corrupted.
+    """
+    content = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    sha256 = hashlib.sha256()
+
+    try:
+        with zip_file.open(info) as member:
+            for chunk in iter(lambda: member.read(EXTRACT_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                content.write(chunk)
+    except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+        # Corrupted, encrypted or compressed with an unsupported method
+        content.close()
+        raise ValueError(f"Cannot extract {info.filename} from the archive: {e}")
+
+    content.seek(0)
+    name = PurePosixPath(info.filename).name
+    content_type = 'text/csv' if name.endswith('.csv') else 'application/octet-stream'
+    return UploadedFile(content, name=name, content_type=content_type, size=info.file_size), sha256.hexdigest()
@@ -0,0 +1,141 @@
+import hashlib
+import os
+from datetime import timedelta
+from io import RawIOBase
+from uuid import uuid4
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import ChunkedUpload, Status, TimeSheetFile
+
+
+def upload_directory(upload):
+    """
+    Return the storage directory of the parts of a chunked upload.
+    """
+    return f'timesheets/chunked/{upload.id}'
+
+
+def part_path(upload, number):
+    """
+    Return the storage path of a part of a chunked upload.
+    """
+    return f'{upload_directory(upload)}/{number:06d}.part'
+
+
+def save_part(upload, number, content):
+    """
+    Write a part of a chunked upload to a temporary path of the storage from a file-like object,
+    a chunk at a time, so that it is received without holding the lock of the upload.
+    Returns the temporary path and the number of bytes written.
+    """
+    path = f'{upload_directory(upload)}/{number:06d}.{uuid4().hex}.tmp'
+    saved_path = default_storage.save(path, File(content, name=path))
+    return saved_path, default_storage.size(saved_path)
+
+
+def accept_part(upload, number, temporary_path):
+    """
+    Move a part saved by save_part to its path, replacing the part if it was partly written
+    before. Storages without local paths copy it instead.
+    """
+    path = part_path(upload, number)
+
+    try:
+        os.replace(default_storage.path(temporary_path), default_storage.path(path))
+    except NotImplementedError:
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        with default_storage.open(temporary_path) as part:
+            default_storage.save(path, part)
+        default_storage.delete(temporary_path)
+
+
+def delete_parts(upload):
+    """
+    Delete the parts of a chunked upload from storage, including the ones never accepted.
+    """
+    try:
+        _, names = default_storage.listdir(upload_directory(upload))
+    except FileNotFoundError:
+        return
+
+    for name in names:
+        default_storage.delete(f'{upload_directory(upload)}/{name}')
+
+
+def delete_stale_uploads(max_age):
+    """
+    Delete the incomplete (or failed) chunked uploads that have not received a part for ``max_age``
+    seconds, and their parts. Uploads receiving a part at the same time are left alone.
+    Returns the number of uploads deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+
+    with transaction.atomic():
+        stale = list(
+            ChunkedUpload.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[Status.PENDING, Status.FAILED], updated_at__lt=cutoff)
+        )
+        ChunkedUpload.objects.filter(pk__in=[upload.pk for upload in stale]).delete()
+
+    # Parts sent once the upload is deleted are rejected, so they can be deleted out of the lock
+    for upload in stale:
+        delete_parts(upload)
+
+    return len(stale)
+
+
+class PartsReader(RawIOBase):
+    """
+    Read-only stream of the parts of a chunked upload, opened from storage one at a time,
+    computing the SHA-256 of the content as it is read.
+    """
+
+    def __init__(self, upload):
+        self.paths = [part_path(upload, number) for number in range(1, upload.part_count + 1)]
+        self.part = None
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.paths or self.part is not None:
+            if self.part is None:
+                self.part = default_storage.open(self.paths.pop(0))
+
+            data = self.part.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.sha256.update(data)
+                return len(data)
+
+            self.part.close()
+            self.part = None
+
+        return 0
+
+    def close(self):
+        if self.part is not None:
+            self.part.close()
+            self.part = None
+        super().close()
+
+
+def assemble_upload(upload):
+    """
+    Save the file of a complete chunked upload as a TimeSheetFile, streaming its parts into
+    the storage one chunk at a time, so the file is never held in memory.
+    """
+    reader = PartsReader(upload)
+    with reader:
+        content = File(reader, name=upload.name)
+        content.size = upload.size
+        timesheet_file = TimeSheetFile(file=content)
+        timesheet_file.file.save(upload.name, content, save=False)
+
+    timesheet_file.content_hash = reader.sha256.hexdigest()
+    timesheet_file.save()
+    return timesheet_file
@@ -0,0 +1,118 @@
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from .models import TimesheetInvoice
+
+
+# Number of rows fetched at a time from the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+
+# Same columns as the uploaded files, so that an export can be uploaded again
+LINE_ITEM_HEADER = ['Employee ID', 'Billable Rate (per hour)', 'Project', 'Date', 'Start Time', 'End Time']
+LINE_ITEM_FIELDS = ['employee_id', 'billable_rate', 'project', 'date', 'start_time', 'end_time']
+
+SUMMARY_HEADER = ['Project', 'Employee ID', 'Total Hours', 'Unit Price', 'Cost']
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, so csv.writer can format
+    rows one at a time for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_line_items(file_id):
+    """
+    Yield the timesheet entries of a file as tuples of LINE_ITEM_FIELDS values, in the
+    order they were inserted, without loading them all in memory.
+    """
+    return (
+        TimesheetInvoice.objects.filter(file_id=file_id)
+        .order_by('id')
+        .values_list(
+            'employee__employee_id', 'billable_rate__rate', 'project__name', 'date', 'start_time', 'end_time'
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def iter_summary_rows(invoice_summary):
+    """
+    Yield a row of SUMMARY_HEADER values for each employee of each project of a summary.
+    """
+    for project_name, employees in invoice_summary.project_summary.items():
+        for employee in employees:
+            yield [project_name, employee['employee_id'], employee['total_hours'], employee['unit_price'], employee['cost']]
+
+
+def stream_csv(header, rows):
+    """
+    Yield the lines of a CSV file with the given header and rows.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(objects):
+    """
+    Yield a line of JSON for each object.
+    """
+    for obj in objects:
+        yield json.dumps(obj, default=str) + '\n'
+
+
+def stream_line_items(file_id, export_format):
+    """
+    Yield the timesheet entries of a file in the given format, 'csv' or 'ndjson'.
+    """
+    rows = iter_line_items(file_id)
+
+    if export_format == 'csv':
+        return stream_csv(LINE_ITEM_HEADER, rows)
+
+    return stream_ndjson(dict(zip(LINE_ITEM_FIELDS, row)) for row in rows)
+
+
+def stream_summary(invoice_summary, export_format):
+    """
+    Yield the per-project summary of a file in the given format: a row per employee of each
+    project in CSV, or an object per project with its employees and total cost in NDJSON.
+    """
+    if export_format == 'csv':
+        return stream_csv(SUMMARY_HEADER, iter_summary_rows(invoice_summary))
+
+    return stream_ndjson(
+        {
+            'project': project_name,
+            'employees': employees,
+            'total_cost': invoice_summary.project_total_costs.get(project_name),
+        }
+        for project_name, employees in invoice_summary.project_summary.items()
+    )
+
+
+async def iter_async(lines, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the lines of a synchronous export from an async generator, joined in chunks of
+    ``chunk_size`` lines read in the thread of the synchronous code, so that responses served
+    through ASGI are streamed rather than read into a list first.
+    """
+    read_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)))
+
+    try:
+        while True:
+            chunk = await read_chunk()
+            if not chunk:
+                break
+            yield chunk
+
+    finally:
+        # Release the server-side cursor of exports that are not read to the end
+        if hasattr(lines, 'close'):
+            await sync_to_async(lines.close)()
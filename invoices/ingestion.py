@@ -0,0 +1,347 @@
+import csv
+from collections import namedtuple
+from datetime import date, datetime, time
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from io import BufferedReader, RawIOBase, TextIOWrapper
+from django.db import transaction
+from .models import Project, Employee, BillableRate, TimesheetInvoice
+
+
+# Number of CSV rows parsed, resolved and inserted together
+BATCH_SIZE = 1000
+
+# Maximum number of values sent in a single ``__in`` lookup
+LOOKUP_BATCH_SIZE = 500
+
+# Number of distinct date and time strings remembered by their parsers
+PARSE_CACHE_SIZE = 4096
+
+
+class TimesheetRow(namedtuple('TimesheetRow', ['project', 'employee_id', 'rate', 'date', 'start_time', 'end_time'])):
+    """
+    A CSV row once its values have been parsed.
+    """
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        """Time worked, computed like TimesheetInvoice.hours_worked."""
+        return datetime.combine(self.date, self.end_time) - datetime.combine(self.date, self.start_time)
+
+
+def chunked(values, size):
+    """
+    Split a sequence of values into lists of at most ``size`` items.
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_date(value):
+    """
+    Parse a date in the %Y-%m-%d format, like datetime.strptime but faster.
+    Files hold few distinct dates, so the parsed values are cached.
+    Raises a ValueError (or TypeError) if the value is not a valid date.
+    """
+    # Fixed-width values are parsed directly, anything else is left to strptime
+    if len(value) == 10 and value[4] == '-' and value[7] == '-' and value.isascii():
+        year, month, day = value[:4], value[5:7], value[8:]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            return date(int(year), int(month), int(day))
+
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_time(value):
+    """
+    Parse a time in the %H:%M format, like datetime.strptime but faster.
+    Files hold few distinct times, so the parsed values are cached.
+    Raises a ValueError (or TypeError) if the value is not a valid time.
+    """
+    if len(value) == 5 and value[2] == ':' and value.isascii():
+        hour, minute = value[:2], value[3:]
+        if hour.isdigit() and minute.isdigit():
+            return time(int(hour), int(minute))
+
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def parse_row(row, file_id):
+    """
+    Parse the values of a CSV row read by csv.DictReader.
+    Raises a ValueError if the date or times are not in the expected format.
+    """
+    try:
+        row_date = parse_date(row['Date'])
+        start_time = parse_time(row['Start Time'])
+        end_time = parse_time(row['End Time'])
+
+    except (TypeError, ValueError):
+        # If any row fails to parse, stop processing and roll back the transaction
+        raise ValueError(f"Failed to process file {file_id}. Date/Time format error in row {row}")
+
+    return TimesheetRow(
+        project=row['Project'],
+        employee_id=int(row['Employee ID']),
+        # Rates are stored with 2 decimal places, round them the same way before comparing them
+        rate=Decimal(row['Billable Rate (per hour)']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        date=row_date,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+
+class ByteRange(RawIOBase):
+    """
+    Read-only view of the bytes between two offsets of a file.
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def split_byte_ranges(timesheet_file, chunk_size):
+    """
+    Split the rows of a timesheet file into byte ranges of roughly ``chunk_size`` bytes,
+    each starting at the beginning of a line.
+    Returns the header of the file and the list of (start, end) byte ranges.
+    """
+    csv_file = timesheet_file.file
+    csv_file.open('rb')
+
+    try:
+        header = next(csv.reader([csv_file.readline().decode('utf-8')]), [])
+        boundaries = [csv_file.tell()]
+        size = csv_file.size
+
+        while boundaries[-1] + chunk_size < size:
+            # Move the boundary forward to the start of the next line
+            csv_file.seek(boundaries[-1] + chunk_size)
+            csv_file.readline()
+            boundaries.append(csv_file.tell())
+
+        if boundaries[-1] < size:
+            boundaries.append(size)
+
+    finally:
+        csv_file.close()
+
+    return header, list(zip(boundaries, boundaries[1:]))
+
+
+def iter_row_batches(timesheet_file, batch_size=BATCH_SIZE, byte_range=None, header=None):
+    """
+    Stream the rows of a timesheet file and yield them parsed, in lists of at most ``batch_size`` rows.
+
+    The file is decoded incrementally, so memory use depends on the batch size
+    and not on the size of the file. With a ``byte_range`` (see split_byte_ranges),
+    only the rows in that range are read, using the given ``header`` as field names.
+    """
+    csv_file = timesheet_file.file
+    csv_file.open('rb')
+    stream = BufferedReader(ByteRange(csv_file, *byte_range)) if byte_range else csv_file
+
+    try:
+        decoded_file = TextIOWrapper(stream, encoding='utf-8', newline='')
+        batch = []
+
+        for row in csv.DictReader(decoded_file, fieldnames=header):
+            # Skip empty rows
+            if not any(row.values()):
+                continue
+
+            batch.append(parse_row(row, timesheet_file.id))
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        # Any remaining rows
+        if batch:
+            yield batch
+
+    finally:
+        csv_file.close()
+
+
+class EntityResolver:
+    """
+    Identity map of the projects, employees and billable rates referenced by a timesheet file.
+
+    Entities are fetched (or created) in set-based queries for all the distinct keys
+    of a group of rows at once, so the number of queries depends on the number of
+    distinct entities rather than on the number of rows.
+
+    With ``create=False``, entities are only fetched, e.g. by the chunks of a file whose
+    entities were created by resolve_file_entities, and missing ones raise a ValueError.
+    """
+
+    def __init__(self, timesheet_file, create=True):
+        self.timesheet_file = timesheet_file
+        self.create = create
+        self.projects = {}   # project name -> Project
+        self.employees = {}  # employee ID -> Employee
+        self.rates = {}      # employee ID -> BillableRate
+        self.file_rates = {} # employee ID -> first rate seen in the file
+
+    def resolve(self, rows):
+        """
+        Load every entity referenced by the given parsed rows into the identity map.
+        Raises a ValueError if an employee has two different billable rates in the file.
+        """
+        self.check_rates(rows)
+        self.resolve_keys({row.project for row in rows}, {row.employee_id for row in rows})
+
+    def check_rates(self, rows):
+        """
+        Remember the billable rate of every employee of the given parsed rows.
+        Raises a ValueError if an employee has two different billable rates in the file.
+        """
+        for row in rows:
+            rate = self.file_rates.setdefault(row.employee_id, row.rate)
+            if rate != row.rate:
+                raise ValueError(f"Billable rate for employee {row.employee_id} in same file can't have two different values.")
+
+    def resolve_keys(self, project_names, employee_ids):
+        """
+        Load the given projects (by name) and employees (by employee ID), and the billable
+        rates of the employees, into the identity map. The rates must have been checked first.
+        """
+        self._resolve_projects(set(project_names) - self.projects.keys())
+        self._resolve_employees(set(employee_ids) - self.employees.keys())
+        self._resolve_rates(set(employee_ids) - self.rates.keys())
+
+    def _check_missing(self, kind, missing):
+        if missing and not self.create:
+            raise ValueError(
+                f"{kind} {', '.join(map(str, sorted(missing)))} of file {self.timesheet_file.id} "
+                f"must be created before its rows are loaded."
+            )
+
+    def build_invoice(self, row):
+        """
+        Build (without saving) the TimesheetInvoice for a row already resolved.
+        """
+        return TimesheetInvoice(
+            file=self.timesheet_file,
+            employee=self.employees[row.employee_id],
+            project=self.projects[row.project],
+            billable_rate=self.rates[row.employee_id],
+            date=row.date,
+            start_time=row.start_time,
+            end_time=row.end_time
+        )
+
+    def _resolve_projects(self, names):
+        if not names:
+            return
+
+        self._fetch_projects(names)
+
+        missing = names - self.projects.keys()
+        self._check_missing('Projects', missing)
+        if missing:
+            Project.objects.bulk_create([Project(name=name) for name in missing])
+            # Fetch them back as not every database returns the primary keys of bulk inserts
+            self._fetch_projects(missing)
+
+    def _fetch_projects(self, names):
+        for chunk in chunked(names, LOOKUP_BATCH_SIZE):
+            # Keep the oldest project when several share the same name
+            for project in Project.objects.filter(name__in=chunk).order_by('pk'):
+                self.projects.setdefault(project.name, project)
+
+    def _resolve_employees(self, employee_ids):
+        if not employee_ids:
+            return
+
+        self._fetch_employees(employee_ids)
+
+        missing = employee_ids - self.employees.keys()
+        self._check_missing('Employees', missing)
+        if missing:
+            # Another worker may be creating the same employees concurrently
+            Employee.objects.bulk_create(
+                [Employee(employee_id=employee_id) for employee_id in missing],
+                ignore_conflicts=True
+            )
+            self._fetch_employees(missing)
+
+    def _fetch_employees(self, employee_ids):
+        for chunk in chunked(employee_ids, LOOKUP_BATCH_SIZE):
+            for employee in Employee.objects.filter(employee_id__in=chunk):
+                self.employees[employee.employee_id] = employee
+
+    def _resolve_rates(self, employee_ids):
+        if not employee_ids:
+            return
+
+        self._fetch_rates(employee_ids)
+
+        missing = employee_ids - self.rates.keys()
+        self._check_missing('Billable rates of employees', missing)
+        if missing:
+            # Another task may be loading the same file
+            BillableRate.objects.bulk_create(
+                [
+                    BillableRate(
+                        file=self.timesheet_file,
+                        employee=self.employees[employee_id],
+                        rate=self.file_rates[employee_id]
+                    )
+                    for employee_id in missing
+                ],
+                ignore_conflicts=True
+            )
+            self._fetch_rates(missing)
+
+        # Rates stored for this file must agree with the ones in the CSV
+        for employee_id in employee_ids:
+            if self.rates[employee_id].rate != self.file_rates[employee_id]:
+                raise ValueError(f"Billable rate for employee {employee_id} in same file can't have two different values.")
+
+    def _fetch_rates(self, employee_ids):
+        employees = {self.employees[employee_id].pk: employee_id for employee_id in employee_ids}
+        for chunk in chunked(employees, LOOKUP_BATCH_SIZE):
+            billable_rates = BillableRate.objects.filter(file=self.timesheet_file, employee_id__in=chunk)
+            for billable_rate in billable_rates:
+                self.rates[employees[billable_rate.employee_id]] = billable_rate
+
+
+def resolve_file_entities(timesheet_file, batches):
+    """
+    Get or create every project, employee and billable rate referenced by the given batches
+    of parsed rows of a file, before its chunks are loaded in parallel.
+
+    The rows are read first, and the entities created in one short transaction once their keys
+    are known. Committed before the chunks start, the entities are only read by the chunks, which
+    then never wait on each other's inserts of the same keys.
+    Returns the EntityResolver holding the entities.
+    Raises a ValueError if a row cannot be parsed or an employee has two different billable rates.
+    """
+    resolver = EntityResolver(timesheet_file)
+    project_names = set()
+
+    for rows in batches:
+        resolver.check_rates(rows)
+        project_names.update(row.project for row in rows)
+
+    with transaction.atomic():
+        resolver.resolve_keys(project_names, resolver.file_rates.keys())
+
+    return resolver
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from time import perf_counter
+from django.db import connection
+from django.utils.timezone import now
+from .models import ProcessingStage
+
+
+class QueryCounter:
+    """
+    Count the queries run on a connection, without keeping their SQL like CaptureQueriesContext.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class StageRecord:
+    """
+    Totals of a processing stage, added up over the steps it is measured in.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = None
+        self.finished_at = None
+        self.seconds = 0.0
+        self.rows = None
+        self.queries = 0
+        self.bytes_processed = None
+
+    def add_rows(self, rows):
+        self.rows = (self.rows or 0) + rows
+
+    def add_bytes(self, bytes_processed):
+        self.bytes_processed = (self.bytes_processed or 0) + bytes_processed
+
+
+class StageMetrics:
+    """
+    Collect the time, rows, queries and bytes of the processing stages of a timesheet file.
+
+    The metrics are kept in memory and saved with save() once the work is over, outside
+    of its transaction, so that they are also kept for the files that fail.
+    """
+
+    def __init__(self):
+        self.records = {}
+
+    def stage(self, name):
+        """
+        Return the record of a stage, to count its rows or bytes.
+        """
+        if name not in self.records:
+            self.records[name] = StageRecord(name)
+        return self.records[name]
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Add the time taken and the queries run in the block to a stage, and yield its record.
+        """
+        record = self.stage(name)
+        counter = QueryCounter()
+
+        if record.started_at is None:
+            record.started_at = now()
+        started = perf_counter()
+
+        try:
+            with connection.execute_wrapper(counter):
+                yield record
+        finally:
+            record.seconds += perf_counter() - started
+            record.queries += counter.count
+            record.finished_at = now()
+
+    def save(self, file_id):
+        """
+        Save the stages measured so far for a file.
+        """
+        ProcessingStage.objects.bulk_create([
+            ProcessingStage(
+                file_id=file_id,
+                name=record.name,
+                started_at=record.started_at,
+                finished_at=record.finished_at,
+                seconds=record.seconds,
+                rows=record.rows,
+                queries=record.queries,
+                bytes_processed=record.bytes_processed,
+            )
+            for record in self.records.values()
+            if record.started_at is not None
+        ])
+        self.records = {}
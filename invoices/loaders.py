@@ -0,0 +1,86 @@
+from io import StringIO
+from django.conf import settings
+from django.db import connection
+from .models import TimesheetInvoice
+
+
+class BulkCreateLoader:
+    """
+    Insert timesheet entries with batched multi-row INSERT statements.
+    Works with every database backend.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.INVOICES_LOADER_BATCH_SIZE
+
+    def load(self, invoices):
+        TimesheetInvoice.objects.bulk_create(invoices, batch_size=self.batch_size)
+
+
+class PostgresCopyLoader:
+    """
+    Stream timesheet entries into their table with COPY FROM STDIN, which avoids
+    parsing large INSERT statements. Only available on PostgreSQL.
+    """
+
+    def __init__(self):
+        self.fields = [field for field in TimesheetInvoice._meta.concrete_fields if not field.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        self.sql = f'COPY {connection.ops.quote_name(TimesheetInvoice._meta.db_table)} ({columns}) FROM STDIN'
+
+    def load(self, invoices):
+        rows = (self.values(invoice) for invoice in invoices)
+
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+
+            if hasattr(raw_cursor, 'copy'):
+                # psycopg 3
+                with raw_cursor.copy(self.sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            else:
+                # psycopg2
+                raw_cursor.copy_expert(self.sql, StringIO(''.join(format_copy_row(row) for row in rows)))
+
+    def values(self, invoice):
+        """
+        Return the values of the columns of a timesheet entry, prepared as for an INSERT.
+        """
+        return [
+            field.get_db_prep_save(field.pre_save(invoice, True), connection=connection)
+            for field in self.fields
+        ]
+
+
+def format_copy_row(values):
+    """
+    Format a row of values as a line of the text format of COPY.
+    """
+    return '\t'.join(
+        r'\N' if value is None else (
+            str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+        )
+        for value in values
+    ) + '\n'
+
+
+def get_loader(name=None):
+    """
+    Return the loader inserting timesheet entries, as set by INVOICES_LOADER:
+    'copy', 'bulk_create' or 'auto' to use COPY when the database is PostgreSQL.
+    """
+    name = name or settings.INVOICES_LOADER
+
+    if name == 'auto':
+        name = 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+
+    if name == 'copy':
+        if connection.vendor != 'postgresql':
+            raise ValueError("The COPY loader requires a PostgreSQL database.")
+        return PostgresCopyLoader()
+
+    if name == 'bulk_create':
+        return BulkCreateLoader()
+
+    raise ValueError(f"Unknown timesheet loader {name!r}.")
@@ -0,0 +1,72 @@
+from datetime import date, time
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from invoices.loaders import BulkCreateLoader, PostgresCopyLoader
+from invoices.models import BillableRate, Employee, Project, TimeSheetFile, TimesheetInvoice
+
+
+class Command(BaseCommand):
+    """
+    Compare the speed of the timesheet loaders.
+    Every run is rolled back, so the command leaves the database unchanged.
+    """
+    help = 'Compare the time taken by each timesheet loader to insert the given numbers of rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000],
+                            help='Numbers of rows to insert with each loader.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows per INSERT statement of the bulk_create loader.')
+        parser.add_argument('--load-size', type=int, default=10_000,
+                            help='Number of rows handed to the loader at once, like a batch of CSV rows.')
+
+    def handle(self, *args, **options):
+        loaders = {'bulk_create': BulkCreateLoader(batch_size=options['batch_size'])}
+
+        if connection.vendor == 'postgresql':
+            loaders['copy'] = PostgresCopyLoader()
+        else:
+            self.stdout.write(f"The COPY loader is not available on {connection.vendor}, only bulk_create is measured.")
+
+        for row_count in options['rows']:
+            for name, loader in loaders.items():
+                elapsed = self.measure(loader, row_count, options['load_size'])
+                self.stdout.write(
+                    f"{name:<12} {row_count:>10} rows {elapsed:10.2f} s {row_count / elapsed:12.0f} rows/s"
+                )
+
+    def measure(self, loader, row_count, load_size):
+        """
+        Return the time (in seconds) taken by the loader to insert the given number of rows.
+        """
+        elapsed = 0.0
+
+        with transaction.atomic():
+            timesheet_file = TimeSheetFile.objects.create(file='timesheets/benchmark.csv')
+            project = Project.objects.create(name='Benchmark')
+            employee = Employee.objects.create(employee_id=-1)
+            billable_rate = BillableRate.objects.create(file=timesheet_file, employee=employee, rate=100)
+
+            for start in range(0, row_count, load_size):
+                invoices = [
+                    TimesheetInvoice(
+                        file=timesheet_file,
+                        employee=employee,
+                        project=project,
+                        billable_rate=billable_rate,
+                        date=date(2024, 1, 1 + i % 28),
+                        start_time=time(9, i % 60),
+                        end_time=time(17, 0)
+                    )
+                    for i in range(start, min(start + load_size, row_count))
+                ]
+
+                started = perf_counter()
+                loader.load(invoices)
+                elapsed += perf_counter() - started
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+        return elapsed
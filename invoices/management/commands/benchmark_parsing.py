@@ -0,0 +1,73 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from invoices.ingestion import TimesheetRow, parse_date, parse_row, parse_time
+
+
+def parse_row_with_strptime(row, file_id):
+    """
+    Parse a row like parse_row, but with datetime.strptime for its dates and times.
+    """
+    try:
+        row_date = datetime.strptime(row['Date'], '%Y-%m-%d').date()
+        start_time = datetime.strptime(row['Start Time'], '%H:%M').time()
+        end_time = datetime.strptime(row['End Time'], '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ValueError(f"Failed to process file {file_id}. Date/Time format error in row {row}")
+
+    return TimesheetRow(
+        project=row['Project'],
+        employee_id=int(row['Employee ID']),
+        rate=Decimal(row['Billable Rate (per hour)']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        date=row_date,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+
+class Command(BaseCommand):
+    """
+    Compare the time taken to parse the dates and times of timesheet rows with
+    datetime.strptime and with the memoized parsers used by parse_row.
+    """
+    help = 'Compare the per-row time of datetime.strptime and of the parsers of parse_row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000,
+                            help='Number of rows to parse.')
+        parser.add_argument('--dates', type=int, default=30,
+                            help='Number of distinct dates in the rows, like the days of a monthly file.')
+
+    def handle(self, *args, **options):
+        row_count = options['rows']
+        rows = [
+            {
+                'Employee ID': str(i % 50),
+                'Billable Rate (per hour)': '100',
+                'Project': 'Benchmark',
+                'Date': f'2024-{1 + (i // 28) % 12:02d}-{1 + i % 28:02d}',
+                'Start Time': f'{8 + i % 3:02d}:{i % 60:02d}',
+                'End Time': f'{16 + i % 3:02d}:{(i * 7) % 60:02d}',
+            }
+            for i in range(options['dates'])
+        ]
+        rows = [rows[i % len(rows)] for i in range(row_count)]
+
+        # Measure the parsers from a cold cache
+        parse_date.cache_clear()
+        parse_time.cache_clear()
+
+        timings = {}
+        for name, parse in [('strptime', parse_row_with_strptime), ('parse_row', parse_row)]:
+            started = perf_counter()
+            for row in rows:
+                parse(row, 'benchmark')
+            timings[name] = perf_counter() - started
+
+            self.stdout.write(
+                f"{name:<10} {row_count:>10} rows {timings[name]:8.3f} s "
+                f"{timings[name] / row_count * 1_000_000:8.2f} us/row"
+            )
+
+        self.stdout.write(f"Speedup: {timings['strptime'] / timings['parse_row']:.1f}x")
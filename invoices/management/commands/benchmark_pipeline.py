@@ -0,0 +1,184 @@
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+import django
+from django.core.cache import cache
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.utils.timezone import now
+from invoices.ingestion import iter_row_batches
+from invoices.instrumentation import QueryCounter
+from invoices.models import Status, TimeSheetFile
+from invoices.status import progress_key
+from invoices.synthetic import write_timesheet
+from invoices.tasks import compute_invoice_summary, ingest_rows
+from invoices.utils import invoice_page_cache_key
+from invoices.views import InvoicesView
+
+
+@contextmanager
+def measure(result, memory=True):
+    """
+    Record the time taken, the number of queries and the peak memory allocated by Python
+    in the block in the given result.
+    """
+    counter = QueryCounter()
+    if memory:
+        tracemalloc.start()
+
+    started = perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield
+    finally:
+        result['seconds'] = round(perf_counter() - started, 6)
+        result['queries'] = counter.count
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the processing of synthetic timesheet files: the ingestion of their rows, the
+    computation of their invoice summary and the rendering of the summary page.
+    Every run is rolled back, so the command leaves the database unchanged.
+    """
+    help = ('Measure the throughput, number of queries and peak memory of ingestion, summary computation '
+            'and summary rendering for synthetic files, and write the results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000],
+                            help='Numbers of rows of the synthetic files.')
+        parser.add_argument('--employees', type=int, default=50,
+                            help='Number of employees in each file.')
+        parser.add_argument('--projects', type=int, default=20,
+                            help='Number of projects in each file.')
+        parser.add_argument('--conflict-ratio', type=float, default=0.0,
+                            help='Share of the employees given conflicting billable rates, which fails the file.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the synthetic files, the same seed gives the same files.')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Do not trace memory allocations, which slow the stages down.')
+        parser.add_argument('--output', help='File to write the JSON results to, instead of the standard output.')
+
+    def handle(self, *args, **options):
+        file_options = {
+            'employees': options['employees'],
+            'projects': options['projects'],
+            'conflict_ratio': options['conflict_ratio'],
+            'seed': options['seed'],
+        }
+
+        report = {
+            'environment': self.environment(),
+            'parameters': {**file_options, 'trace_memory': not options['no_memory']},
+            'results': [],
+        }
+
+        # Only the stages themselves are measured, not the tasks they would queue, and the
+        # page is rendered without the manifest of collectstatic, which may not have been run
+        with override_settings(
+            INVOICES_PRERENDER_PDFS=False,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        ):
+            for row_count in options['rows']:
+                results = self.run(row_count, file_options, memory=not options['no_memory'])
+                report['results'] += results
+
+                for result in results:
+                    self.stderr.write(
+                        f"{result['rows']:>10} rows {result['stage']:<8} {result['seconds']:10.3f} s "
+                        f"{result['rows_per_second'] or 0:12.0f} rows/s {result['queries']:>7} queries"
+                    )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, row_count, file_options, memory):
+        """
+        Process a synthetic file with the given number of rows and return the results of each stage.
+        """
+        results = []
+
+        with tempfile.TemporaryFile('w+', newline='') as csv_file:
+            write_timesheet(csv_file, row_count, **file_options)
+            csv_file.seek(0)
+
+            with transaction.atomic():
+                timesheet_file = TimeSheetFile.objects.create(file=File(csv_file.buffer, name='benchmark.csv'))
+
+                try:
+                    stages = [
+                        ('ingest', lambda: self.ingest(timesheet_file)),
+                        ('summary', lambda: compute_invoice_summary(timesheet_file.id)),
+                        ('render', lambda: self.render(timesheet_file)),
+                    ]
+                    for stage, run_stage in stages:
+                        result = {'rows': row_count, 'stage': stage}
+                        results.append(result)
+
+                        try:
+                            with measure(result, memory):
+                                run_stage()
+                        except Exception as e:
+                            # Files with conflicting rates are expected to fail
+                            result['error'] = str(e)
+
+                        result['rows_per_second'] = round(row_count / result['seconds']) if result['seconds'] else None
+                        if 'error' in result:
+                            break
+
+                finally:
+                    # Leave the database, the storage and the cache as they were
+                    transaction.set_rollback(True)
+                    timesheet_file.file.delete(save=False)
+                    cache.delete_many([progress_key(timesheet_file.id), invoice_page_cache_key(timesheet_file.id)])
+
+        return results
+
+    def ingest(self, timesheet_file):
+        """
+        Load the rows of the file like process_csv_file, in a single task.
+        """
+        with transaction.atomic():
+            ingest_rows(timesheet_file, iter_row_batches(timesheet_file))
+            timesheet_file.status = Status.LOADED
+            timesheet_file.save()
+
+    def render(self, timesheet_file):
+        """
+        Render the summary page of the file, without the cached page.
+        """
+        request = RequestFactory().get(f'/invoices/{timesheet_file.id}/')
+        response = InvoicesView.as_view()(request, file_id=timesheet_file.id)
+        if response.status_code != 200:
+            raise ValueError(f"The summary page of file {timesheet_file.id} returned {response.status_code}.")
+
+    def environment(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'date': now().isoformat(),
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+        }
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from invoices.chunked import delete_stale_uploads
+
+
+class Command(BaseCommand):
+    """
+    Delete the chunked uploads abandoned before they were complete, with their parts,
+    e.g. from a daily cron job.
+    """
+    help = 'Delete the incomplete chunked uploads that have not received a part for a while, and their parts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.INVOICES_UPLOAD_EXPIRY,
+                            help='Seconds since the last part received, INVOICES_UPLOAD_EXPIRY by default.')
+
+    def handle(self, *args, **options):
+        deleted = delete_stale_uploads(options['max_age'])
+        self.stdout.write(f"Deleted {deleted} stale chunked uploads.")
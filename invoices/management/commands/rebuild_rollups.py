@@ -0,0 +1,21 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from invoices.rollup import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    Compute the daily rollups again from the stored timesheet entries, e.g. once after
+    migrating, or after files and their entries have been deleted.
+    """
+    help = 'Rebuild the daily rollups of the timesheet entries, for every date or a range of dates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First date to rebuild (YYYY-MM-DD), the earliest by default.')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Last date to rebuild (YYYY-MM-DD), the latest by default.')
+
+    def handle(self, *args, **options):
+        saved = rebuild_rollups(options['start'], options['end'])
+        self.stdout.write(f"Rebuilt {saved} daily rollups.")
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_remove_timesheetfile_is_fully_processed_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheetfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='timesheetfile',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed'), ('LOADED', 'Loaded')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0005_timesheetfile_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicesummary',
+            name='entry_groups',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='TimeSheetAppend',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='timesheets/appends/')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed'), ('LOADED', 'Loaded')], default='PENDING', max_length=10)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('timesheet_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appends', to='invoices.timesheetfile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.16 on 2026-10-18 10:12
+
+from django.db import migrations
+from django.db.models import Max, Min
+from django.db.models.functions import ExtractHour, ExtractMinute
+import invoices.models
+
+
+# Rows of timesheet entries updated per UPDATE statement
+BACKFILL_BATCH_SIZE = 100_000
+
+
+def backfill_duration_minutes(apps, schema_editor):
+    """
+    Store the duration of the existing timesheet entries, computed by the database from their
+    start and end times, with one UPDATE per range of primary keys.
+    """
+    TimesheetInvoice = apps.get_model('invoices', 'TimesheetInvoice')
+
+    bounds = TimesheetInvoice.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return
+
+    duration = (
+        (ExtractHour('end_time') * 60 + ExtractMinute('end_time'))
+        - (ExtractHour('start_time') * 60 + ExtractMinute('start_time'))
+    )
+    for start in range(bounds['first'], bounds['last'] + 1, BACKFILL_BATCH_SIZE):
+        TimesheetInvoice.objects.filter(
+            pk__gte=start, pk__lt=start + BACKFILL_BATCH_SIZE, duration_minutes__isnull=True
+        ).update(duration_minutes=duration)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_invoicesummary_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheetinvoice',
+            name='duration_minutes',
+            field=invoices.models.DurationMinutesField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_duration_minutes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timesheetinvoice',
+            name='duration_minutes',
+            field=invoices.models.DurationMinutesField(editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 10:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_timesheetinvoice_duration_minutes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        # Create the composite index before dropping the index on the file it replaces
+        migrations.AddIndex(
+            model_name='timesheetinvoice',
+            index=models.Index(fields=['file', 'project', 'employee'], name='invoices_ts_file_proj_emp_idx'),
+        ),
+        migrations.AlterField(
+            model_name='timesheetinvoice',
+            name='file',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='invoices.timesheetfile'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_timesheetinvoice_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('validate', 'Upload validation'), ('store', 'Storage write'), ('parse', 'Parse'), ('resolve', 'Entity resolution'), ('insert', 'Bulk insert'), ('summary', 'Summary'), ('render', 'Render')], max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('seconds', models.FloatField()),
+                ('rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('bytes_processed', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='invoices.timesheetfile')),
+            ],
+            options={
+                'ordering': ['started_at', 'id'],
+            },
+        ),
+    ]
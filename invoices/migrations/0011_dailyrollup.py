@@ -0,0 +1,36 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0010_processingstage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingstage',
+            name='name',
+            field=models.CharField(choices=[('validate', 'Upload validation'), ('store', 'Storage write'), ('parse', 'Parse'), ('resolve', 'Entity resolution'), ('insert', 'Bulk insert'), ('rollup', 'Daily rollup'), ('summary', 'Summary'), ('render', 'Render')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('minutes', models.BigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='invoices.employee')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='invoices.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'project', 'employee', 'rate'), name='invoices_rollup_key'),
+        ),
+    ]
@@ -1,5 +1,4 @@
 from django.db import models
-from datetime import datetime
 from uuid import uuid4
 from django.utils.timezone import now
 
@@ -11,6 +10,19 @@ class Status(models.TextChoices):
     LOADED = 'LOADED', 'Loaded'
 
 
+class UploadBatch(models.Model):
+    """
+    Timesheet files uploaded together, from a ZIP archive or a single multipart request.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    # Name of the archive, if the files were uploaded as one
+    name = models.CharField(max_length=255, blank=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name or str(self.id)
+
+
 class TimeSheetFile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     file = models.FileField(upload_to='timesheets/')
@@ -21,11 +33,50 @@ class TimeSheetFile(models.Model):
     )
     error_message = models.TextField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 of the file content, to recognise files uploaded again
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    batch = models.ForeignKey(UploadBatch, on_delete=models.SET_NULL, blank=True, null=True, related_name='files')
 
     def __str__(self):
         return self.file.name
 
 
+class ChunkedUpload(models.Model):
+    """
+    A timesheet file uploaded in parts of ``chunk_size`` bytes, sent one after the other and
+    kept in storage, so that an interrupted upload resumes after the last part received.
+
+    Its status is PENDING while parts are received, LOADED once it is complete and its parts are
+    being assembled, then PROCESSED once assembled into its file, or FAILED if the file is invalid.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    parts_received = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # The file assembled from the parts, once the upload is complete
+    file = models.OneToOneField(
+        TimeSheetFile, on_delete=models.SET_NULL, blank=True, null=True, related_name='chunked_upload'
+    )
+
+    @property
+    def part_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def part_size(self, number):
+        """
+        Return the size of a part, all of them are ``chunk_size`` bytes long but the last one.
+        """
+        return min(self.chunk_size, self.size - (number - 1) * self.chunk_size)
+
+    def __str__(self):
+        return self.name
+
+
 class Employee(models.Model):
     employee_id = models.IntegerField(unique=True)
 
@@ -40,36 +91,154 @@ class BillableRate(models.Model):
 
 
 class Project(models.Model):
-    name = models.CharField(max_length=255)
+    # Projects are looked up by name when files are processed
+    name = models.CharField(max_length=255, db_index=True)
+
+
+def minutes_between(start_time, end_time):
+    """
+    Return the number of minutes from start_time to end_time on the same day.
+    Times are read from the CSV files with minute precision.
+    """
+    return (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+
+
+class DurationMinutesField(models.IntegerField):
+    """
+    Minutes worked in a timesheet entry, computed from its start and end times every time it is
+    saved, including by bulk_create, so that it follows edits of the times (e.g. in the admin).
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if model_instance.start_time is not None and model_instance.end_time is not None:
+            # Times may still be strings, as accepted by TimeField
+            opts = model_instance._meta
+            value = minutes_between(
+                opts.get_field('start_time').to_python(model_instance.start_time),
+                opts.get_field('end_time').to_python(model_instance.end_time)
+            )
+            setattr(model_instance, self.attname, value)
+        return value
 
 
 class TimesheetInvoice(models.Model):
-    file = models.ForeignKey(TimeSheetFile, on_delete=models.CASCADE)
+    # Indexed by the composite index below, which starts with the file
+    file = models.ForeignKey(TimeSheetFile, on_delete=models.CASCADE, db_index=False)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     billable_rate = models.ForeignKey(BillableRate, on_delete=models.CASCADE)
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Stored so that durations can be aggregated in the database
+    duration_minutes = DurationMinutesField(editable=False)
     invoice_date = models.DateField(default=now)
 
+    class Meta:
+        indexes = [
+            # Entries of a file grouped by project and employee, as by aggregate_invoices
+            models.Index(fields=['file', 'project', 'employee'], name='invoices_ts_file_proj_emp_idx'),
+        ]
+
     @property
     def hours_worked(self):
         """Calculates total hours worked."""
-        start = datetime.combine(self.date, self.start_time)
-        end = datetime.combine(self.date, self.end_time)
-        duration = end - start
-        return round(duration.total_seconds() / 3600, 2)
+        minutes = self.duration_minutes
+        if minutes is None:
+            minutes = minutes_between(self.start_time, self.end_time)
+        return round(minutes / 60, 2)
 
 
     def __str__(self):
         return f"TimesheetInvoice {self.id} - {self.employee} - {self.date}"
     
 
+class DailyRollup(models.Model):
+    """
+    Timesheet entries of every file added up per day, project, employee and billable rate,
+    so that reports over date ranges do not read the entries themselves.
+    Maintained by the ingestion tasks (see invoices.rollup) and rebuilt from the entries
+    by the rebuild_rollups command.
+    """
+    date = models.DateField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    rate = models.DecimalField(max_digits=10, decimal_places=2)
+    entries = models.PositiveIntegerField(default=0)
+    minutes = models.BigIntegerField(default=0)
+    # Hours are rounded per entry as in invoice summaries, so costs have 4 decimal places
+    cost = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index of the reports, which select a range of dates
+            models.UniqueConstraint(fields=['date', 'project', 'employee', 'rate'], name='invoices_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"DailyRollup {self.date} - {self.project_id} - {self.employee_id}"
+
+
+class Stage(models.TextChoices):
+    VALIDATE = 'validate', 'Upload validation'
+    STORE = 'store', 'Storage write'
+    PARSE = 'parse', 'Parse'
+    RESOLVE = 'resolve', 'Entity resolution'
+    INSERT = 'insert', 'Bulk insert'
+    ROLLUP = 'rollup', 'Daily rollup'
+    SUMMARY = 'summary', 'Summary'
+    RENDER = 'render', 'Render'
+
+
+class ProcessingStage(models.Model):
+    """
+    Time spent, rows, queries and bytes of a stage of the processing of a timesheet file.
+    Stages run in several steps (batches, chunks) add up their steps, so ``seconds``
+    can be shorter than the time between ``started_at`` and ``finished_at``.
+    """
+    file = models.ForeignKey(TimeSheetFile, on_delete=models.CASCADE, related_name='stages')
+    name = models.CharField(max_length=10, choices=Stage.choices)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    seconds = models.FloatField()
+    rows = models.PositiveIntegerField(null=True, blank=True)
+    queries = models.PositiveIntegerField(default=0)
+    bytes_processed = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['started_at', 'id']
+
+    def __str__(self):
+        return f"{self.get_name_display()} of {self.file_id}"
+
+
+class TimeSheetAppend(models.Model):
+    """
+    Rows appended to a timesheet file that has already been processed.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    timesheet_file = models.ForeignKey(TimeSheetFile, on_delete=models.CASCADE, related_name='appends')
+    file = models.FileField(upload_to='timesheets/appends/')
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    error_message = models.TextField(blank=True, null=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.file.name
+
+
 class InvoiceSummary(models.Model):
     file = models.ForeignKey(TimeSheetFile, on_delete=models.CASCADE)
     project_summary = models.JSONField()
     project_total_costs = models.JSONField()
+    # Entries grouped by project, employee and duration, see SummaryAccumulator.to_json
+    entry_groups = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"InvoiceSummary {self.id} - {self.file}"
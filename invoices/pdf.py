@@ -0,0 +1,195 @@
+import hashlib
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+# US Letter page, in points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 72
+LINE_HEIGHT = 18
+
+# Left edge and title of the columns of the table of each project
+COLUMNS = [(72, 'Employee ID'), (200, 'Total Hours Worked'), (340, 'Unit Price'), (450, 'Cost')]
+
+# Directory of the default storage where the rendered PDF invoices are kept
+PDF_DIRECTORY = 'invoice_pdfs'
+
+
+def escape_text(text):
+    """
+    Escape a string for a literal string of a PDF content stream.
+    """
+    return str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').replace('\r', ' ').replace('\n', ' ')
+
+
+class PDFPage:
+    """
+    Content stream of a single page, drawn with the standard Helvetica fonts.
+    """
+
+    def __init__(self):
+        self.commands = []
+
+    def text(self, x, y, text, bold=False, size=11):
+        font = 'F2' if bold else 'F1'
+        self.commands.append(f'BT /{font} {size} Tf {x} {y} Td ({escape_text(text)}) Tj ET')
+
+    def line(self, x1, y1, x2, y2):
+        self.commands.append(f'{x1} {y1} m {x2} {y2} l S')
+
+    def content(self):
+        return '\n'.join(self.commands)
+
+
+def layout_project(project_name, employees, total_cost):
+    """
+    Lay out the table of a project, starting on a new page and continuing on as many
+    pages as its employees need. Returns the list of pages.
+    """
+    pages = []
+    rows = list(employees)
+
+    while True:
+        page = PDFPage()
+        pages.append(page)
+
+        y = PAGE_HEIGHT - MARGIN
+        page.text(MARGIN, y, 'Invoice Summary', bold=True, size=16)
+        y -= LINE_HEIGHT * 2
+        page.text(MARGIN, y, f"Company: {project_name}{' (continued)' if len(pages) > 1 else ''}", bold=True, size=13)
+        y -= LINE_HEIGHT * 1.5
+
+        for x, title in COLUMNS:
+            page.text(x, y, title, bold=True)
+        page.line(MARGIN, y - 6, PAGE_WIDTH - MARGIN, y - 6)
+        y -= LINE_HEIGHT
+
+        # Fill the page, keeping room for the total
+        while rows and y > MARGIN + LINE_HEIGHT:
+            employee = rows.pop(0)
+            values = [employee['employee_id'], employee['total_hours'], employee['unit_price'], employee['cost']]
+            for (x, _), value in zip(COLUMNS, values):
+                page.text(x, y, value)
+            y -= LINE_HEIGHT
+
+        if not rows:
+            page.line(MARGIN, y + 12, PAGE_WIDTH - MARGIN, y + 12)
+            page.text(COLUMNS[2][0], y - 4, 'Total Cost', bold=True)
+            page.text(COLUMNS[3][0], y - 4, total_cost, bold=True)
+            return pages
+
+
+def build_pdf(pages):
+    """
+    Return the bytes of a PDF document made of the given pages.
+    """
+    fonts = [
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    # Objects 1 and 2 are the catalog and the page tree, 3 and 4 the fonts
+    objects = [None, None] + fonts
+    page_numbers = []
+
+    for page in pages:
+        stream = page.content().encode('cp1252', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append((
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects)} 0 R >>'
+        ).encode())
+        page_numbers.append(len(objects))
+
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode()
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number, obj)
+
+    # Cross-reference table giving the offset of every object
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+
+    return bytes(output)
+
+
+def render_invoice_pdf(invoice_summary, project=None):
+    """
+    Render the invoice of a single project of a summary, or of all its projects if none
+    is given, with each project starting on a new page.
+    Raises KeyError if the project is not in the summary.
+    """
+    project_names = list(invoice_summary.project_summary) if project is None else [project]
+
+    pages = []
+    for project_name in project_names:
+        pages += layout_project(
+            project_name,
+            invoice_summary.project_summary[project_name],
+            invoice_summary.project_total_costs.get(project_name, '')
+        )
+
+    return build_pdf(pages)
+
+
+def pdf_version(invoice_summary):
+    """
+    Return the version of a summary, which changes every time it is recomputed.
+    """
+    return str(int(invoice_summary.updated_at.timestamp() * 1000000))
+
+
+def pdf_path(invoice_summary, project=None):
+    """
+    Return the storage path of the rendered invoice of a summary, for a single project or
+    for all of them. Paths are keyed by file ID and summary version, so that a recomputed
+    summary is never served an outdated invoice.
+    """
+    if project is None:
+        name = 'invoice'
+    else:
+        # Project names are free text, so they are not used in paths as is
+        name = 'project-' + hashlib.sha256(project.encode()).hexdigest()[:16]
+
+    return f'{PDF_DIRECTORY}/{invoice_summary.file_id}/{pdf_version(invoice_summary)}/{name}.pdf'
+
+
+def get_invoice_pdf(invoice_summary, project=None):
+    """
+    Return the storage path of the invoice of a summary, rendering and saving it first
+    unless it is already in storage.
+    """
+    path = pdf_path(invoice_summary, project)
+
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(render_invoice_pdf(invoice_summary, project)))
+
+    return path
+
+
+def delete_stale_pdfs(invoice_summary):
+    """
+    Delete the invoices rendered from earlier versions of a summary.
+    """
+    directory = f'{PDF_DIRECTORY}/{invoice_summary.file_id}'
+    if not default_storage.exists(directory):
+        return
+
+    current_version = pdf_version(invoice_summary)
+    versions, _ = default_storage.listdir(directory)
+
+    for version in versions:
+        if version == current_version:
+            continue
+
+        _, names = default_storage.listdir(f'{directory}/{version}')
+        for name in names:
+            default_storage.delete(f'{directory}/{version}/{name}')
+        default_storage.delete(f'{directory}/{version}')
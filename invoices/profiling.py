@@ -0,0 +1,104 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from django.db import connection
+
+
+# Lists of placeholders, as in IN lookups and multi-row INSERT statements
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+ROW_LIST = re.compile(r'\(\s*%s\.\.\.\s*\)(?:\s*,\s*\(\s*%s\.\.\.\s*\))+')
+
+
+def fingerprint(sql):
+    """
+    Return the SQL of a query with its lists of placeholders collapsed, so that the same
+    query run with other values, or another number of values, has the same fingerprint.
+    """
+    sql = PLACEHOLDER_LIST.sub('%s...', sql)
+    return ROW_LIST.sub('(%s...)...', sql)
+
+
+class QueryProfile:
+    """
+    Record the SQL queries run on a connection in a block, with the time taken by each.
+
+        with QueryProfile() as profile:
+            process_csv_file(file_id)
+        print(profile.count, profile.total_time, profile.duplicates())
+
+    Queries sent directly through the driver, like COPY by PostgresCopyLoader, are not seen.
+    """
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []  # (sql, seconds)
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, perf_counter() - started))
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def duplicates(self):
+        """
+        Return the number of times each query fingerprint was run, for those run more than once.
+        """
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count > 1}
+
+    def report(self):
+        """
+        Return a readable summary of the queries, for failure messages.
+        """
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f} ms"]
+        lines += [f"  {seconds * 1000:8.2f} ms  {sql[:200]}" for sql, seconds in self.queries]
+
+        duplicates = self.duplicates()
+        if duplicates:
+            lines.append("Repeated queries:")
+            lines += [f"  {count} x {sql[:200]}" for sql, count in duplicates.items()]
+
+        return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin checking that a block of code stays within a budget of queries.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_repeats=None):
+        """
+        Fail if the block runs more than ``max_queries`` queries, or if ``max_repeats`` is given,
+        if any query (by fingerprint) is run more than ``max_repeats`` times.
+        Yields the QueryProfile of the block.
+        """
+        with QueryProfile() as profile:
+            yield profile
+
+        if profile.count > max_queries:
+            self.fail(f"Query budget of {max_queries} exceeded: {profile.report()}")
+
+        if max_repeats is not None:
+            repeated = {sql: count for sql, count in profile.duplicates().items() if count > max_repeats}
+            if repeated:
+                self.fail(f"Queries run more than {max_repeats} times: {profile.report()}")
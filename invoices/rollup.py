@@ -0,0 +1,232 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from .analytics import aggregate_totals, invalidate_analytics
+from .models import DailyRollup, TimesheetInvoice
+from .summary import hours_worked
+
+
+# Number of rollups inserted or updated per query
+ROLLUP_BATCH_SIZE = 1000
+
+# Times the rollups of a file are saved before giving up on conflicts with other files
+SAVE_ATTEMPTS = 3
+
+# Groups built up by rebuild_rollups before they are saved
+REBUILD_FLUSH_SIZE = 10_000
+
+# Fields a report can be grouped by, as the dimensions and period of the totals of analytics.aggregate_totals
+REPORT_GROUPS = {
+    'project': (['project'], None),
+    'employee': (['employee'], None),
+    'date': ([], 'day'),
+}
+
+
+def entry_cost(minutes, rate):
+    """
+    Return the cost of a timesheet entry of the given minutes, with its hours rounded
+    the same way as in invoice summaries.
+    """
+    return hours_worked(timedelta(minutes=minutes)).quantize(Decimal('0.01')) * rate
+
+
+class RollupAccumulator:
+    """
+    Collect timesheet entries added up per day, project, employee and billable rate,
+    to be added to the DailyRollup table.
+
+    Like SummaryAccumulator, entries are added while they are read, and the groups can be
+    passed between tasks with to_json and merge.
+    """
+
+    def __init__(self):
+        # (date, project pk, employee pk, rate) -> [entries, minutes, cost]
+        self._groups = {}
+
+    def __len__(self):
+        return len(self._groups)
+
+    def add(self, entry_date, project_id, employee_id, rate, minutes, entries=1):
+        """
+        Count entries of the given minutes worked on a day by an employee on a project.
+        """
+        group = self._groups.setdefault((entry_date, project_id, employee_id, rate), [0, 0, Decimal('0')])
+        group[0] += entries
+        group[1] += minutes * entries
+        group[2] += entry_cost(minutes, rate) * entries
+
+    def to_json(self):
+        """
+        Return the accumulated groups in a JSON serializable form, e.g. to pass them between tasks.
+        """
+        return [
+            [entry_date.isoformat(), project_id, employee_id, str(rate), entries, minutes, str(cost)]
+            for (entry_date, project_id, employee_id, rate), (entries, minutes, cost) in self._groups.items()
+        ]
+
+    def merge(self, groups):
+        """
+        Add groups returned by to_json, e.g. by the accumulator of another chunk of the same file.
+        """
+        for entry_date, project_id, employee_id, rate, entries, minutes, cost in groups:
+            key = (date.fromisoformat(entry_date), project_id, employee_id, Decimal(rate))
+            group = self._groups.setdefault(key, [0, 0, Decimal('0')])
+            group[0] += entries
+            group[1] += minutes
+            group[2] += Decimal(cost)
+
+    def rollups(self):
+        """
+        Return the accumulated groups as unsaved DailyRollup objects.
+        """
+        return [
+            DailyRollup(
+                date=entry_date, project_id=project_id, employee_id=employee_id, rate=rate,
+                entries=entries, minutes=minutes, cost=cost
+            )
+            for (entry_date, project_id, employee_id, rate), (entries, minutes, cost) in self._groups.items()
+        ]
+
+    def save(self):
+        """
+        Add the accumulated groups to the DailyRollup table, in the current transaction so that
+        they are only counted once the entries they come from are committed.
+        """
+        if not self._groups:
+            return
+
+        # A file ingested at the same time may create some of the same rollups first,
+        # in which case they are found and added to on the next attempt
+        for attempt in range(SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    self._save()
+                break
+            except IntegrityError:
+                if attempt == SAVE_ATTEMPTS - 1:
+                    raise
+
+        transaction.on_commit(invalidate_analytics)
+
+    def _save(self):
+        dates = [entry_date for entry_date, _, _, _ in self._groups]
+
+        # Lock the existing rollups of the groups, so that concurrent files add up
+        existing = DailyRollup.objects.select_for_update().filter(
+            date__range=(min(dates), max(dates)),
+            project_id__in={project_id for _, project_id, _, _ in self._groups},
+            employee_id__in={employee_id for _, _, employee_id, _ in self._groups},
+        ).order_by('pk')
+
+        updated = []
+        found = set()
+        for rollup in existing:
+            key = (rollup.date, rollup.project_id, rollup.employee_id, rollup.rate)
+            group = self._groups.get(key)
+            if group is not None:
+                rollup.entries += group[0]
+                rollup.minutes += group[1]
+                rollup.cost += group[2]
+                updated.append(rollup)
+                found.add(key)
+
+        DailyRollup.objects.bulk_update(updated, ['entries', 'minutes', 'cost'], batch_size=ROLLUP_BATCH_SIZE)
+        DailyRollup.objects.bulk_create(
+            [rollup for rollup in self.rollups() if
+             (rollup.date, rollup.project_id, rollup.employee_id, rollup.rate) not in found],
+            batch_size=ROLLUP_BATCH_SIZE
+        )
+
+
+def entry_groups(entries):
+    """
+    Return the timesheet entries of a queryset counted per date, project, employee, billable rate
+    and duration, sorted by date. Grouped by duration as well, so that hours are rounded per entry.
+    """
+    return (
+        entries.values('date', 'project_id', 'employee_id', 'billable_rate__rate', 'duration_minutes')
+        .annotate(entries=Count('id'))
+        .order_by('date')
+    )
+
+
+def add_entry_group(accumulator, group):
+    """
+    Add a group returned by entry_groups to a RollupAccumulator.
+    """
+    accumulator.add(
+        group['date'], group['project_id'], group['employee_id'], group['billable_rate__rate'],
+        group['duration_minutes'], entries=group['entries']
+    )
+
+
+def file_rollups(file_id):
+    """
+    Return a RollupAccumulator of the stored timesheet entries of a file, e.g. to add them to
+    the daily rollups in the same transaction as their invoice summary.
+    """
+    accumulator = RollupAccumulator()
+    for group in entry_groups(TimesheetInvoice.objects.filter(file_id=file_id)).iterator():
+        add_entry_group(accumulator, group)
+    return accumulator
+
+
+@transaction.atomic
+def rebuild_rollups(start=None, end=None):
+    """
+    Compute the daily rollups again from the stored timesheet entries, for every date or
+    for the dates between start and end (inclusive). Returns the number of rollups saved.
+
+    Rollups are only added to as files are ingested, so they are rebuilt after entries
+    are deleted, e.g. with their files.
+    """
+    rollups = DailyRollup.objects.all()
+    entries = TimesheetInvoice.objects.all()
+    if start is not None:
+        rollups = rollups.filter(date__gte=start)
+        entries = entries.filter(date__gte=start)
+    if end is not None:
+        rollups = rollups.filter(date__lte=end)
+        entries = entries.filter(date__lte=end)
+
+    rollups.delete()
+
+    saved = 0
+    accumulator = RollupAccumulator()
+    current_date = None
+
+    for group in entry_groups(entries).iterator():
+        # Days are complete once the next one starts, so they can be saved in parts
+        if group['date'] != current_date and len(accumulator) >= REBUILD_FLUSH_SIZE:
+            saved += len(DailyRollup.objects.bulk_create(accumulator.rollups(), batch_size=ROLLUP_BATCH_SIZE))
+            accumulator = RollupAccumulator()
+        current_date = group['date']
+
+        add_entry_group(accumulator, group)
+
+    saved += len(DailyRollup.objects.bulk_create(accumulator.rollups(), batch_size=ROLLUP_BATCH_SIZE))
+
+    transaction.on_commit(invalidate_analytics)
+    return saved
+
+
+def rollup_report(start, end, group_by='project', project=None, employee=None):
+    """
+    Return the hours and cost of the entries between start and end (inclusive) per project,
+    employee or date, from the daily rollups. Reports can be limited to a project (by name)
+    or an employee (by employee ID).
+    Raises a ValueError if the report cannot be grouped by ``group_by``.
+    """
+    if group_by not in REPORT_GROUPS:
+        raise ValueError(f"Reports cannot be grouped by {group_by!r}.")
+
+    dimensions, period = REPORT_GROUPS[group_by]
+    rows, _ = aggregate_totals(start, end, dimensions, period, project=project, employee=employee, limit=None)
+
+    if period is not None:
+        # Days are reported as dates
+        rows = [{'date': row.pop('period'), **row} for row in rows]
+
+    return rows
@@ -0,0 +1,188 @@
+import asyncio
+import json
+from collections import Counter, defaultdict
+from weakref import WeakKeyDictionary
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Status, TimeSheetFile
+
+
+# Statuses after which the status of a file no longer changes
+FINAL_STATUSES = {Status.PROCESSED, Status.FAILED, 'error'}
+
+
+def progress_key(file_id):
+    return f'invoices:progress:{file_id}'
+
+
+def add_progress(file_id, rows):
+    """
+    Add to the number of rows of a file processed so far.
+    The count is kept in the cache, as the rows themselves are only visible once
+    their transaction is committed.
+    """
+    key = progress_key(file_id)
+    cache.add(key, 0, timeout=settings.INVOICES_PROGRESS_TIMEOUT)
+    cache.incr(key, rows)
+
+
+def clear_progress(file_id):
+    """
+    Delete the number of rows processed of a file once it is processed or failed,
+    when the current transaction is committed.
+    """
+    transaction.on_commit(lambda: cache.delete(progress_key(file_id)))
+
+
+def get_file_states(file_ids):
+    """
+    Return the status, error message and number of rows processed of the given files,
+    with a single query.
+    """
+    progress = cache.get_many([progress_key(file_id) for file_id in file_ids])
+    files = TimeSheetFile.objects.filter(id__in=file_ids).values('id', 'status', 'error_message')
+
+    states = {file_id: {'status': 'error', 'message': 'File not found.'} for file_id in file_ids}
+
+    for timesheet_file in files:
+        states[timesheet_file['id']] = file_state(timesheet_file, progress)
+
+    return states
+
+
+def file_state(timesheet_file, progress):
+    """
+    Build the state of a file from its status and error message and the progress read from the cache.
+    """
+    state = {
+        'status': timesheet_file['status'],
+        'rows_processed': progress.get(progress_key(timesheet_file['id']), 0),
+    }
+    if timesheet_file['status'] == Status.FAILED:
+        state['message'] = timesheet_file['error_message']
+    return state
+
+
+def get_batch_state(batch_id):
+    """
+    Return the state of each file of an upload batch, the number of files in each status and
+    the status of the batch as a whole, with a single query:
+    PENDING until every file is processed or failed, then FAILED if any of them failed,
+    otherwise PROCESSED.
+    """
+    files = list(
+        TimeSheetFile.objects.filter(batch_id=batch_id)
+        .order_by('uploaded_at', 'file')
+        .values('id', 'file', 'status', 'error_message')
+    )
+    progress = cache.get_many([progress_key(timesheet_file['id']) for timesheet_file in files])
+
+    counts = Counter(timesheet_file['status'] for timesheet_file in files)
+    if any(status not in FINAL_STATUSES for status in counts):
+        status = Status.PENDING
+    elif counts[Status.FAILED]:
+        status = Status.FAILED
+    else:
+        status = Status.PROCESSED
+
+    return {
+        'status': status,
+        'counts': dict(counts),
+        'files': [
+            {'file_id': timesheet_file['id'], 'name': timesheet_file['file'], **file_state(timesheet_file, progress)}
+            for timesheet_file in files
+        ],
+    }
+
+
+class StatusWatcher:
+    """
+    Watch the status of the files followed by the open event streams of a process.
+
+    A single poller queries the states of all the watched files at once, every
+    INVOICES_STATUS_POLL_INTERVAL seconds, and pushes the changes to the streams.
+    """
+
+    def __init__(self):
+        self.queues = defaultdict(set)  # file ID -> queues of the streams watching it
+        self.states = {}                # file ID -> last known state
+        self.poller = None
+
+    def subscribe(self, file_id):
+        """
+        Return a queue receiving every new state of the file, starting with the current one.
+        """
+        queue = asyncio.Queue()
+        self.queues[file_id].add(queue)
+
+        if file_id in self.states:
+            queue.put_nowait(self.states[file_id])
+
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self.poll())
+
+        return queue
+
+    def unsubscribe(self, file_id, queue):
+        self.queues[file_id].discard(queue)
+
+        if not self.queues[file_id]:
+            del self.queues[file_id]
+            self.states.pop(file_id, None)
+
+    async def poll(self):
+        while self.queues:
+            states = await sync_to_async(get_file_states)(list(self.queues))
+
+            for file_id, state in states.items():
+                if state != self.states.get(file_id) and file_id in self.queues:
+                    self.states[file_id] = state
+                    for queue in self.queues[file_id]:
+                        queue.put_nowait(state)
+
+            await asyncio.sleep(settings.INVOICES_STATUS_POLL_INTERVAL)
+
+
+# One watcher per event loop, as its queues and poller belong to the loop
+_watchers = WeakKeyDictionary()
+
+
+def get_watcher():
+    loop = asyncio.get_running_loop()
+    if loop not in _watchers:
+        _watchers[loop] = StatusWatcher()
+    return _watchers[loop]
+
+
+async def status_events(file_id):
+    """
+    Yield the status changes of a file as Server-Sent Events, until the file is processed
+    or failed, or the stream has been open for INVOICES_STATUS_STREAM_TIMEOUT seconds
+    (clients reconnect automatically).
+    """
+    watcher = get_watcher()
+    queue = watcher.subscribe(file_id)
+    deadline = asyncio.get_running_loop().time() + settings.INVOICES_STATUS_STREAM_TIMEOUT
+
+    try:
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+
+            try:
+                state = await asyncio.wait_for(queue.get(), timeout=min(remaining, 15))
+            except asyncio.TimeoutError:
+                # Keep the connection open through proxies
+                yield ': keep-alive\n\n'
+                continue
+
+            yield f'event: status\ndata: {json.dumps(state)}\n\n'
+
+            if state['status'] in FINAL_STATUSES:
+                return
+
+    finally:
+        watcher.unsubscribe(file_id, queue)
@@ -0,0 +1,194 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Count, Min
+from .models import TimesheetInvoice
+
+
+def hours_worked(duration):
+    """
+    Convert the duration of a timesheet entry to hours worked, rounded the same
+    way as TimesheetInvoice.hours_worked.
+    """
+    return Decimal(round(duration.total_seconds() / 3600, 2))
+
+
+def invoice_groups(file_id):
+    """
+    Return the query grouping the timesheet entries of a file by project, employee, rate
+    and duration, in the order the entries were inserted.
+    """
+    return (
+        TimesheetInvoice.objects.filter(file_id=file_id)
+        .values('project__name', 'employee__employee_id', 'billable_rate__rate', 'duration_minutes')
+        .annotate(entries=Count('id'), first_entry=Min('id'))
+        .order_by('first_entry')
+    )
+
+
+def aggregate_invoices(file_id):
+    """
+    Group the timesheet entries of a file in the database and return them in
+    a SummaryAccumulator, in the order the entries were inserted.
+
+    Hours worked are rounded per entry, so entries are grouped by their stored duration
+    as well to keep the totals identical to adding up the entries one by one.
+    """
+    accumulator = SummaryAccumulator()
+    for group in invoice_groups(file_id):
+        accumulator.add(
+            group['project__name'],
+            group['employee__employee_id'],
+            group['billable_rate__rate'],
+            timedelta(minutes=group['duration_minutes']),
+            entries=group['entries'],
+        )
+
+    return accumulator
+
+
+def summarize(groups):
+    """
+    Build the project summary and the total cost of each project from grouped timesheet entries.
+
+    ``groups`` is an iterable of (project name, employee ID, unit price, hours worked per entry,
+    number of entries) tuples. Projects and employees keep the order in which they first appear.
+    """
+    # Totals of each employee, grouped by project
+    employees_by_project = {}
+
+    for project_name, employee_id, unit_price, hours, entries in groups:
+        employees_in_project = employees_by_project.setdefault(project_name, {})
+        totals = employees_in_project.setdefault(
+            employee_id,
+            {'total_hours': Decimal('0.00'), 'unit_price': Decimal('0.00'), 'total_cost': Decimal('0.00')}
+        )
+
+        # Update employee's total hours and cost
+        totals['total_hours'] += hours * entries
+        totals['unit_price'] = unit_price
+        totals['total_cost'] += hours * unit_price * entries
+
+    project_summary = {}
+    project_total_costs = {}
+
+    for project_name, employees_in_project in employees_by_project.items():
+        project_summary[project_name] = [
+            {
+                'employee_id': employee_id,
+                'total_hours': totals['total_hours'],
+                'unit_price': totals['unit_price'],
+                'cost': totals['total_cost'],
+            }
+            for employee_id, totals in employees_in_project.items()
+        ]
+        project_total_costs[project_name] = sum(
+            (totals['total_cost'] for totals in employees_in_project.values()),
+            Decimal('0.00')
+        )
+
+    return project_summary, project_total_costs
+
+
+class SummaryAccumulator:
+    """
+    Collect timesheet entries grouped by project, employee and duration, from which
+    the invoice summary is built.
+
+    Entries can be added while they are being read, so the summary can be built without
+    reading them back from the database. The groups are also saved with the summary
+    (see to_json) so that entries appended later can be merged into it exactly.
+    """
+
+    def __init__(self):
+        # (project name, employee ID, duration) -> [unit price, number of entries]
+        self._groups = {}
+
+    def add(self, project_name, employee_id, unit_price, duration, entries=1):
+        """
+        Count entries of the given duration worked by an employee on a project.
+        """
+        group = self._groups.setdefault((project_name, employee_id, duration), [unit_price, 0])
+        group[1] += entries
+
+    def duration_groups(self):
+        """
+        Yield the accumulated groups as (project name, employee ID, unit price, duration,
+        number of entries) tuples, in the order they were first added.
+        """
+        for (project_name, employee_id, duration), (unit_price, entries) in self._groups.items():
+            yield project_name, employee_id, unit_price, duration, entries
+
+    def entry_count(self):
+        """
+        Return the number of entries accumulated.
+        """
+        return sum(entries for _, entries in self._groups.values())
+
+    def groups(self):
+        """
+        Yield the accumulated groups in the format expected by summarize.
+        """
+        return hours_groups(self.duration_groups())
+
+    def to_json(self):
+        """
+        Return the accumulated groups in a JSON serializable form, e.g. to pass them between tasks.
+        """
+        return [
+            [project_name, employee_id, str(unit_price), duration.total_seconds(), entries]
+            for (project_name, employee_id, duration), (unit_price, entries) in self._groups.items()
+        ]
+
+    def merge(self, groups):
+        """
+        Add groups returned by to_json, e.g. by the accumulator of another chunk of the same file.
+        """
+        for project_name, employee_id, unit_price, seconds, entries in groups:
+            key = (project_name, employee_id, timedelta(seconds=seconds))
+            group = self._groups.setdefault(key, [Decimal(unit_price), 0])
+            group[1] += entries
+
+    def summarize(self, backend=None):
+        """
+        Build the project summary and the total cost of each project from the accumulated groups,
+        with the given backend or the one set by INVOICES_SUMMARY_BACKEND.
+        """
+        return get_summary_backend(backend)(self)
+
+
+def hours_groups(duration_groups):
+    """
+    Convert the durations of (project name, employee ID, unit price, duration, number of entries)
+    groups to hours worked, for summarize.
+    """
+    for project_name, employee_id, unit_price, duration, entries in duration_groups:
+        yield project_name, employee_id, unit_price, hours_worked(duration), entries
+
+
+def summarize_decimal(accumulator):
+    """
+    Summarize the groups of an accumulator with Decimal arithmetic, one group at a time.
+    """
+    return summarize(accumulator.groups())
+
+
+def get_summary_backend(name=None):
+    """
+    Return the function summarizing the groups of an accumulator, as set by INVOICES_SUMMARY_BACKEND:
+    'decimal', or 'numpy' to compute the totals with vectorized integer arithmetic (requires NumPy).
+    Both give the same amounts to the cent.
+    """
+    name = name or settings.INVOICES_SUMMARY_BACKEND
+
+    if name == 'decimal':
+        return summarize_decimal
+
+    if name == 'numpy':
+        from .vectorized import numpy_available, summarize_vectorized
+
+        if not numpy_available():
+            raise ValueError("The numpy summary backend requires NumPy to be installed.")
+        return summarize_vectorized
+
+    raise ValueError(f"Unknown summary backend {name!r}.")
@@ -0,0 +1,47 @@
+import csv
+import random
+from datetime import date, timedelta
+
+
+HEADER = ['Employee ID', 'Billable Rate (per hour)', 'Project', 'Date', 'Start Time', 'End Time']
+
+
+def generate_rows(rows, employees=50, projects=20, conflict_ratio=0.0, seed=0):
+    """
+    Yield the rows of a synthetic timesheet file, the same ones for the same arguments.
+
+    Each employee has a billable rate, except that a ``conflict_ratio`` share of the employees
+    are given a different rate in the second half of the file, which makes it fail to process.
+    """
+    generator = random.Random(seed)
+    rates = {employee_id: generator.randint(2000, 30000) / 100 for employee_id in range(1, employees + 1)}
+    conflicting = set(generator.sample(sorted(rates), round(employees * conflict_ratio)))
+
+    for i in range(rows):
+        employee_id = generator.randint(1, employees)
+        rate = rates[employee_id]
+        if employee_id in conflicting and i >= rows // 2:
+            rate += 1
+
+        start = generator.randint(7 * 60, 11 * 60 - 1)
+        end = generator.randint(15 * 60, 19 * 60 - 1)
+
+        yield [
+            employee_id,
+            f'{rate:.2f}',
+            f'Project {generator.randint(1, projects)}',
+            (date(2024, 1, 1) + timedelta(days=generator.randrange(28))).isoformat(),
+            f'{start // 60:02d}:{start % 60:02d}',
+            f'{end // 60:02d}:{end % 60:02d}',
+        ]
+
+
+def write_timesheet(file, rows, **options):
+    """
+    Write a synthetic timesheet file with the given number of rows to a text file object,
+    one row at a time. The options are those of generate_rows.
+    """
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow(HEADER)
+    for row in generate_rows(rows, **options):
+        writer.writerow(row)
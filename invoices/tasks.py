@@ -1,100 +1,85 @@
-from collections import defaultdict
-from celery import shared_task
+from celery import chord, shared_task
 from .models import (
-    Status, TimesheetInvoice, Project, Employee,
-    TimeSheetFile, BillableRate, InvoiceSummary
+    ChunkedUpload, Stage, Status, TimesheetInvoice, TimeSheetFile, TimeSheetAppend, BillableRate, InvoiceSummary, minutes_between
 )
-from decimal import Decimal
-import csv
-from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from .utils import convert_decimal_to_string
+from .utils import convert_decimal_to_string, csv_upload_error, invoice_page_cache_key
+from .chunked import assemble_upload, delete_parts
+from .ingestion import EntityResolver, iter_row_batches, resolve_file_entities, split_byte_ranges
+from .instrumentation import StageMetrics
+from .loaders import get_loader
+from .pdf import delete_stale_pdfs, get_invoice_pdf
+from .rollup import RollupAccumulator, file_rollups
+from .status import add_progress, clear_progress
+from .summary import SummaryAccumulator, aggregate_invoices
 
 
 @shared_task
-def process_csv_file(file_id):
+def process_csv_file(file_id, fused=None):
     """
     Task to process the uploaded CSV file and generate timesheets.
+
+    In fused mode (INVOICES_FUSED_PIPELINE by default), the invoice summary is accumulated
+    while the rows are read and saved in the same transaction, instead of being computed
+    by compute_invoice_summary from the saved timesheets.
+
+    Files larger than INVOICES_PARALLEL_CHUNK_SIZE are split into chunks loaded in parallel
+    by process_csv_chunk, whose results are merged by merge_csv_chunks. The projects, employees
+    and billable rates of the whole file are created first, so that the chunks only read them.
     """
+    if fused is None:
+        fused = settings.INVOICES_FUSED_PIPELINE
+
+    metrics = StageMetrics()
+
     try:
         timesheet_file = TimeSheetFile.objects.get(id=file_id)
         if timesheet_file.status == Status.PROCESSED:
             return f"File {timesheet_file.id} has already been processed."
-        
-        csv_file = timesheet_file.file
 
-        # Decode the CSV file
-        decoded_file = csv_file.read().decode('utf-8').splitlines()
-        reader = csv.DictReader(decoded_file)
-        
-        # List to hold the timesheet entries
-        timesheet_entries = []
-        batch_size = 100
+        chunk_size = settings.INVOICES_PARALLEL_CHUNK_SIZE
+        if chunk_size and timesheet_file.file.size > chunk_size:
+            header, byte_ranges = split_byte_ranges(timesheet_file, chunk_size)
 
-        with transaction.atomic():
-            # Process each row in the CSV file
-            for row in reader:
-                
-                # Check if row is not empty or contains valid data
-                if not any(row.values()):
-                    continue  # Skip empty rows
-                
-                # Parse date and times
-                date_str = row['Date']
-                start_time_str = row['Start Time']
-                end_time_str = row['End Time']
-
-                try:
-                    date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    start_time = datetime.strptime(start_time_str, '%H:%M').time()
-                    end_time = datetime.strptime(end_time_str, '%H:%M').time()
-                    
-                    # Compute hours worked to be used in the creation of the TimesheetInvoice object
-                    start_datetime = datetime.combine(date, start_time)
-                    end_datetime = datetime.combine(date, end_time)
-                                    
-                except ValueError:
-                    # If any row fails to parse, stop processing and roll back the transaction
-                    raise ValueError(f"Failed to process file {file_id}. Date/Time format error in row {row}")
-
-                # Get or create the project
-                project_obj, _ = Project.objects.get_or_create(name=row['Project'])
-                
-                # Get or create the employee
-                employee_obj, _ = Employee.objects.get_or_create(employee_id=row['Employee ID'])
-                
-                # Attempt to get the billable rate for the employee in the file
-                billable_rate, created = BillableRate.objects.get_or_create(
-                    file=timesheet_file,
-                    employee=employee_obj,
-                    defaults={'rate': Decimal(row['Billable Rate (per hour)'])}
-                )
-                
-                if not created:
-                    # Update the billable rate if it has changed
-                    if billable_rate.rate != Decimal(row['Billable Rate (per hour)']):
-                        raise ValueError(f"Billable rate for employee {employee_obj.employee_id} in same file can't have two different values.")
-
-                # Add the TimesheetInvoice object to the list
-                timesheet_entries.append(TimesheetInvoice(
-                    file=timesheet_file,
-                    employee=employee_obj,
-                    project=project_obj,
-                    billable_rate=billable_rate,
-                    date=date,
-                    start_time=start_time,
-                    end_time=end_time
-                ))
-                
-                # Bulk create when batch size is reached
-                if len(timesheet_entries) >= batch_size:
-                    TimesheetInvoice.objects.bulk_create(timesheet_entries)
-                    timesheet_entries = []  # Reset the list
-
-            # Process any remaining entries
-            if timesheet_entries:
-                TimesheetInvoice.objects.bulk_create(timesheet_entries)
+            # Committed before the chunks start: chunks inserting the same billable rates in
+            # their own transactions would wait for each other, or deadlock
+            with metrics.measure(Stage.RESOLVE):
+                resolve_file_entities(timesheet_file, iter_row_batches(timesheet_file))
+
+            # Load each chunk in its own task and merge their results once all of them are done
+            chord(
+                process_csv_chunk.s(file_id, header, byte_range) for byte_range in byte_ranges
+            )(merge_csv_chunks.s(file_id))
+
+            return f"Processing file {timesheet_file.id} in {len(byte_ranges)} chunks."
         
+        with transaction.atomic():
+            # Without fusion, the rollups are added with the summary by compute_invoice_summary,
+            # so that the rows of a file failing there are not counted
+            accumulator = SummaryAccumulator() if fused else None
+            rollup = RollupAccumulator() if fused else None
+
+            # Stream the CSV file so that only one batch of rows is held in memory at a time
+            metrics.stage(Stage.PARSE).add_bytes(timesheet_file.file.size)
+            ingest_rows(timesheet_file, iter_row_batches(timesheet_file), accumulator, rollup=rollup, metrics=metrics)
+
+            if fused:
+                # The daily rollups include the rows once they are committed
+                with metrics.measure(Stage.ROLLUP):
+                    rollup.save()
+
+                with metrics.measure(Stage.SUMMARY) as summary:
+                    save_invoice_summary(file_id, accumulator)
+                    summary.add_rows(accumulator.entry_count())
+
+                timesheet_file.status = Status.PROCESSED
+                timesheet_file.save()
+                clear_progress(file_id)
+
+                return f"File {timesheet_file.id} has been processed and its invoice summary saved."
+
         timesheet_file.status = Status.LOADED
         timesheet_file.save()
 
@@ -107,8 +92,108 @@ def process_csv_file(file_id):
         timesheet_file.status = Status.FAILED
         timesheet_file.error_message = f"Failed to read file {file_id}. Error: {str(e)}"
         timesheet_file.save()
+        clear_progress(file_id)
         return f"Failed to read file {file_id}. Error: {str(e)}"
 
+    finally:
+        # Saved out of the transaction, to keep the metrics of the files that fail
+        metrics.save(file_id)
+
+
+@shared_task
+def process_csv_chunk(file_id, header, byte_range):
+    """
+    Task to load the rows in a byte range of a CSV file processed in parallel.
+    The entities of the file are only read, as they were created by process_csv_file.
+    Returns the billable rates, the partial invoice summary and the daily rollups
+    of the chunk, or the error that made it fail.
+    """
+    metrics = StageMetrics()
+
+    try:
+        timesheet_file = TimeSheetFile.objects.get(id=file_id)
+        accumulator = SummaryAccumulator()
+        rollup = RollupAccumulator()
+
+        with transaction.atomic():
+            metrics.stage(Stage.PARSE).add_bytes(byte_range[1] - byte_range[0])
+            batches = iter_row_batches(timesheet_file, byte_range=byte_range, header=header)
+            resolver = ingest_rows(
+                timesheet_file, batches, accumulator, rollup=rollup, metrics=metrics,
+                resolver=EntityResolver(timesheet_file, create=False)
+            )
+
+        # The rollups are saved by merge_csv_chunks, once every chunk has been loaded
+        return {
+            'rates': {employee_id: str(rate) for employee_id, rate in resolver.file_rates.items()},
+            'groups': accumulator.to_json(),
+            'rollup': rollup.to_json(),
+        }
+
+    except Exception as e:
+        # The error is reported to merge_csv_chunks, which fails the whole file
+        return {'error': str(e)}
+
+    finally:
+        metrics.save(file_id)
+
+
+@shared_task
+def merge_csv_chunks(results, file_id):
+    """
+    Task run once every chunk of a CSV file processed in parallel is loaded.
+    Checks that the chunks agree on the billable rates, merges their partial summaries
+    and saves the invoice summary and the daily rollups.
+    If any chunk failed, the rows loaded by the other chunks are removed, so the file
+    fails as a whole like when it is processed by a single task.
+    """
+    timesheet_file = TimeSheetFile.objects.get(id=file_id)
+    metrics = StageMetrics()
+
+    try:
+        with transaction.atomic():
+            with metrics.measure(Stage.SUMMARY) as summary:
+                rates = {}
+                accumulator = SummaryAccumulator()
+                rollup = RollupAccumulator()
+
+                for result in results:
+                    if 'error' in result:
+                        raise ValueError(result['error'])
+
+                    for employee_id, rate in result['rates'].items():
+                        if rates.setdefault(employee_id, rate) != rate:
+                            raise ValueError(f"Billable rate for employee {employee_id} in same file can't have two different values.")
+
+                    accumulator.merge(result['groups'])
+                    rollup.merge(result['rollup'])
+
+                save_invoice_summary(file_id, accumulator)
+                summary.add_rows(accumulator.entry_count())
+
+            with metrics.measure(Stage.ROLLUP):
+                rollup.save()
+
+            timesheet_file.status = Status.PROCESSED
+            timesheet_file.save()
+            clear_progress(file_id)
+
+        return f"File {timesheet_file.id} has been processed and its invoice summary saved."
+
+    except Exception as e:
+        # Remove what the successful chunks have loaded
+        with transaction.atomic():
+            TimesheetInvoice.objects.filter(file_id=file_id).delete()
+            BillableRate.objects.filter(file_id=file_id).delete()
+
+        timesheet_file.status = Status.FAILED
+        timesheet_file.error_message = f"Failed to read file {file_id}. Error: {str(e)}"
+        timesheet_file.save()
+        clear_progress(file_id)
+        return f"Failed to read file {file_id}. Error: {str(e)}"
+
+    finally:
+        metrics.save(file_id)
 
 @shared_task
 @transaction.atomic
@@ -119,6 +204,7 @@ def compute_invoice_summary(file_id):
     For each employee under a project, the total hours worked, unit price, and total cost are calculated.
     Finally, the total cost for each project is calculated.
     """
+    metrics = StageMetrics()
     
     try:
         
@@ -127,64 +213,23 @@ def compute_invoice_summary(file_id):
         if timesheet_file.status != Status.LOADED:
             raise ValueError(f"File {file_id} has not been loaded yet.")    
         
-        # Fetch all invoices related to the given file ID
-        invoices = TimesheetInvoice.objects.filter(file_id=file_id).select_related('project', 'employee', 'billable_rate')
-    
-        # Dictionary to hold the grouped invoice data by project
-        project_summary = defaultdict(list)
-
-        # Track total cost for each project
-        project_total_costs = {}
-
-        # Group invoices by project and then by employee to calculate total hours and costs
-        for project in invoices.values('project__name').distinct():
-
-            project_name = project['project__name']
-
-            # For each project, group and sum hours worked per employee
-            employees_in_project = defaultdict(lambda: {'total_hours': Decimal('0.00'), 'unit_price': Decimal('0.00'), 'total_cost': Decimal('0.00')})
-
-            for invoice in invoices.filter(project__name=project_name):
-
-                employee_id = invoice.employee.employee_id
-                unit_price = invoice.billable_rate.rate  # Unit price (billable rate) for this employee
-                hours_worked = Decimal(invoice.hours_worked)  # Calculate hours worked
-
-                # Update employee's total hours and cost
-                employees_in_project[employee_id]['total_hours'] += hours_worked
-                employees_in_project[employee_id]['unit_price'] = unit_price
-                employees_in_project[employee_id]['total_cost'] += hours_worked * unit_price
-
-            # Add the summarized data for each employee to the project summary
-            project_total_cost = Decimal('0.00')
-            
-            for employee_id, employee_data in employees_in_project.items():
-                project_summary[project_name].append({
-                    'employee_id': employee_id,
-                    'total_hours': employee_data['total_hours'],
-                    'unit_price': employee_data['unit_price'],
-                    'cost': employee_data['total_cost'],
-                })
-                # Add to the total cost for this project
-                project_total_cost += employee_data['total_cost']
-
-            # Store total cost for the project
-            project_total_costs[project_name] = project_total_cost
-            
-        # Convert Decimal objects to string for JSON serialization
-        project_summary_parsed = convert_decimal_to_string(project_summary)
-        project_total_costs_parsed = convert_decimal_to_string(project_total_costs)
-        
-        # Save the summary to the database
-        InvoiceSummary.objects.create(
-            file_id=file_id,
-            project_summary=project_summary_parsed,
-            project_total_costs=project_total_costs_parsed
-            )
+        # Group the invoices by project, employee and rate in a single database query
+        # and calculate the total hours and costs from the groups
+        with metrics.measure(Stage.SUMMARY) as summary:
+            accumulator = aggregate_invoices(file_id)
+            save_invoice_summary(file_id, accumulator)
+            summary.add_rows(accumulator.entry_count())
+
+        # The daily rollups include the entries of the file once it is processed
+        with metrics.measure(Stage.ROLLUP) as rollup_stage:
+            rollup = file_rollups(file_id)
+            rollup.save()
+            rollup_stage.add_rows(accumulator.entry_count())
         
         # Mark the file as fully processed if no errors occurred
         timesheet_file.status = Status.PROCESSED
         timesheet_file.save()
+        clear_progress(file_id)
 
         return f"Invoice summary for file {file_id} has been computed and saved."
     
@@ -192,4 +237,205 @@ def compute_invoice_summary(file_id):
         timesheet_file.status = Status.FAILED
         timesheet_file.error_message = f"Failed to compute invoice summary for file {file_id}. Error: {str(e)}"
         timesheet_file.save()
+        clear_progress(file_id)
         return f"Failed to compute invoice summary for file {file_id}. Error: {str(e)}"
+
+    finally:
+        metrics.save(file_id)
+
+
+@shared_task
+def append_csv_file(append_id):
+    """
+    Task to add the rows appended to a processed timesheet file.
+    Only the appended rows are read: their totals are merged into the entry groups
+    saved with the invoice summary, which is updated in place.
+    """
+    try:
+        timesheet_append = TimeSheetAppend.objects.select_related('timesheet_file').get(id=append_id)
+        timesheet_file = timesheet_append.timesheet_file
+
+        if timesheet_append.status == Status.PROCESSED:
+            return f"Rows {timesheet_append.id} have already been appended."
+
+        with transaction.atomic():
+            # Lock the summary so that the rows appended to a file are merged one upload at a time
+            invoice_summary = InvoiceSummary.objects.select_for_update().get(file=timesheet_file)
+
+            # Existing billable rates of the file are checked against the appended rows
+            delta = SummaryAccumulator()
+            rollup = RollupAccumulator()
+            ingest_rows(timesheet_file, iter_row_batches(timesheet_append), delta, rollup=rollup)
+            rollup.save()
+
+            if invoice_summary.entry_groups:
+                accumulator = SummaryAccumulator()
+                accumulator.merge(invoice_summary.entry_groups)
+                accumulator.merge(delta.to_json())
+            else:
+                # Summaries saved without their entry groups are computed again from every entry
+                accumulator = aggregate_invoices(timesheet_file.id)
+
+            save_invoice_summary(timesheet_file.id, accumulator, invoice_summary)
+
+            timesheet_append.status = Status.PROCESSED
+            timesheet_append.save()
+
+        return f"Rows {timesheet_append.id} have been appended to file {timesheet_file.id}."
+
+    except Exception as e:
+        timesheet_append.status = Status.FAILED
+        timesheet_append.error_message = f"Failed to append rows to file {timesheet_file.id}. Error: {str(e)}"
+        timesheet_append.save()
+        return f"Failed to append rows to file {timesheet_file.id}. Error: {str(e)}"
+
+
+@shared_task
+def assemble_chunked_upload(upload_id):
+    """
+    Task to assemble the parts of a complete chunked upload into a TimeSheetFile, streamed from
+    storage one chunk at a time, and to check its header before processing it.
+    An invalid file is discarded with its parts, and the upload is marked as failed.
+    """
+    upload = ChunkedUpload.objects.get(id=upload_id)
+    if upload.status != Status.LOADED:
+        return f"Upload {upload.id} has already been assembled."
+
+    metrics = StageMetrics()
+
+    with metrics.measure(Stage.STORE) as storage:
+        timesheet_file = assemble_upload(upload)
+        storage.add_bytes(upload.size)
+
+    # The header may span several parts, it is read from the assembled file
+    with metrics.measure(Stage.VALIDATE) as validation:
+        error = csv_upload_error(timesheet_file.file)
+        timesheet_file.file.close()
+        validation.add_rows(1)
+        validation.add_bytes(upload.size)
+
+    delete_parts(upload)
+
+    if error:
+        # The parts cannot be fixed by resuming the upload, it is discarded
+        timesheet_file.file.delete(save=False)
+        timesheet_file.delete()
+        upload.status = Status.FAILED
+        upload.error_message = error[0]
+        upload.save(update_fields=['status', 'error_message', 'updated_at'])
+        return f"Upload {upload.id} failed. Error: {error[0]}"
+
+    metrics.save(timesheet_file.id)
+
+    upload.file = timesheet_file
+    upload.status = Status.PROCESSED
+    upload.save(update_fields=['file', 'status', 'updated_at'])
+
+    process_csv_file.delay(timesheet_file.id)
+
+    return f"Upload {upload.id} has been assembled into file {timesheet_file.id}."
+
+
+@shared_task
+def render_invoice_pdfs(file_id):
+    """
+    Task to render the PDF invoices of a file once its summary is saved: one for all its
+    projects and one per project. They are kept in storage, so that downloads are served
+    without rendering them again until the summary changes.
+    """
+    try:
+        invoice_summary = InvoiceSummary.objects.get(file__id=file_id)
+    except InvoiceSummary.DoesNotExist:
+        return f"No invoice summary found for file {file_id}."
+
+    metrics = StageMetrics()
+
+    with metrics.measure(Stage.RENDER):
+        delete_stale_pdfs(invoice_summary)
+
+        get_invoice_pdf(invoice_summary)
+        for project_name in invoice_summary.project_summary:
+            get_invoice_pdf(invoice_summary, project_name)
+
+    metrics.save(file_id)
+
+    return f"PDF invoices of file {file_id} have been rendered."
+
+
+def save_invoice_summary(file_id, accumulator, invoice_summary=None):
+    """
+    Save the invoice summary of a file built from the accumulated entries, with its Decimal
+    values converted for JSON serialization. An existing summary is updated if one is given.
+    """
+    project_summary, project_total_costs = accumulator.summarize()
+
+    if invoice_summary is None:
+        invoice_summary = InvoiceSummary(file_id=file_id)
+
+    invoice_summary.project_summary = convert_decimal_to_string(project_summary)
+    invoice_summary.project_total_costs = convert_decimal_to_string(project_total_costs)
+    invoice_summary.entry_groups = accumulator.to_json()
+    invoice_summary.save()
+
+    # The rendered summary page is out of date once the new summary is committed
+    transaction.on_commit(lambda: cache.delete(invoice_page_cache_key(file_id)))
+
+    if settings.INVOICES_PRERENDER_PDFS:
+        transaction.on_commit(lambda: render_invoice_pdfs.delay(file_id))
+
+    return invoice_summary
+
+
+def ingest_rows(timesheet_file, batches, accumulator=None, loader=None, metrics=None, rollup=None, resolver=None):
+    """
+    Resolve and insert batches of parsed rows of a timesheet file, adding them to
+    the summary accumulator and the RollupAccumulator if they are given.
+    The rows are inserted by the given loader, or the one set by INVOICES_LOADER.
+    The time spent parsing, resolving and inserting the rows is added to the given StageMetrics.
+    Entities are resolved by the given EntityResolver, or one that creates the missing ones.
+    Returns the EntityResolver holding the entities referenced by the rows.
+    """
+    resolver = resolver or EntityResolver(timesheet_file)
+    loader = loader or get_loader()
+    metrics = metrics or StageMetrics()
+    batches = iter(batches)
+
+    while True:
+        # The rows are parsed as the batches are read
+        with metrics.measure(Stage.PARSE) as parse:
+            rows = next(batches, None)
+            if rows is not None:
+                parse.add_rows(len(rows))
+
+        if rows is None:
+            break
+
+        # Get or create the projects, employees and billable rates not seen in earlier batches
+        with metrics.measure(Stage.RESOLVE) as resolve:
+            resolver.resolve(rows)
+            resolve.add_rows(len(rows))
+
+        # Build the TimesheetInvoice objects from the identity map
+        with metrics.measure(Stage.INSERT) as insert:
+            loader.load([resolver.build_invoice(row) for row in rows])
+            insert.add_rows(len(rows))
+
+        add_progress(timesheet_file.id, len(rows))
+
+        if accumulator is not None:
+            for row in rows:
+                accumulator.add(row.project, row.employee_id, resolver.rates[row.employee_id].rate, row.duration)
+
+        if rollup is not None:
+            with metrics.measure(Stage.ROLLUP) as rollup_stage:
+                rollup_stage.add_rows(len(rows))
+                for row in rows:
+                    rollup.add(
+                        row.date,
+                        resolver.projects[row.project].pk,
+                        resolver.employees[row.employee_id].pk,
+                        resolver.rates[row.employee_id].rate,
+                        minutes_between(row.start_time, row.end_time)
+                    )
+
+    return resolver
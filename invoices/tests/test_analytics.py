@@ -0,0 +1,96 @@
+"""
+Tests of the totals across files computed from the daily rollups: grouping by dimensions
+and periods, cursor pagination and the caching of the results.
+"""
+from datetime import date
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from invoices.analytics import aggregate_totals, cached_totals, encode_cursor
+from invoices.models import DailyRollup, Employee, Project
+from invoices.rollup import RollupAccumulator
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AggregateTotalsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        google, apple = Project.objects.create(name='Google'), Project.objects.create(name='Apple')
+        first, second = Employee.objects.create(employee_id=1), Employee.objects.create(employee_id=2)
+        self.rollup = lambda day, project, employee, minutes, cost: DailyRollup(
+            date=day, project=project, employee=employee, rate=100, entries=1, minutes=minutes, cost=cost
+        )
+        DailyRollup.objects.bulk_create([
+            # Monday 1st and Tuesday 2nd of July 2019, in the same week
+            self.rollup(date(2019, 7, 1), google, first, 60, 100),
+            self.rollup(date(2019, 7, 2), google, second, 30, 50),
+            self.rollup(date(2019, 7, 2), apple, first, 90, 150),
+            self.rollup(date(2019, 7, 8), apple, second, 60, 100),
+            self.rollup(date(2019, 8, 1), google, first, 120, 200),
+        ])
+
+    def test_totals_by_project_and_month(self):
+        rows, next_cursor = aggregate_totals(date(2019, 7, 1), date(2019, 8, 31), ['project'], period='month')
+
+        self.assertIsNone(next_cursor)
+        self.assertEqual(rows, [
+            {'period': date(2019, 7, 1), 'project': 'Apple', 'entries': 2, 'hours': Decimal('2.50'), 'cost': Decimal('250')},
+            {'period': date(2019, 7, 1), 'project': 'Google', 'entries': 2, 'hours': Decimal('1.50'), 'cost': Decimal('150')},
+            {'period': date(2019, 8, 1), 'project': 'Google', 'entries': 1, 'hours': Decimal('2.00'), 'cost': Decimal('200')},
+        ])
+
+    def test_totals_by_week_of_an_employee(self):
+        rows, _ = aggregate_totals(date(2019, 7, 1), date(2019, 7, 31), [], period='week', employee=1)
+
+        self.assertEqual([(row['period'], row['hours']) for row in rows], [(date(2019, 7, 1), Decimal('2.50'))])
+
+    def test_pages_follow_each_other(self):
+        everything, _ = aggregate_totals(date(2019, 7, 1), date(2019, 8, 31), ['employee', 'project'], period='day')
+
+        pages, cursor = [], None
+        while True:
+            rows, cursor = aggregate_totals(
+                date(2019, 7, 1), date(2019, 8, 31), ['employee', 'project'], period='day', cursor=cursor, limit=2
+            )
+            pages.append(rows)
+            if cursor is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([row for page in pages for row in page], everything)
+
+    def test_invalid_parameters(self):
+        for params, message in [
+            ({'dimensions': []}, "Totals must be grouped by a dimension or a period."),
+            ({'dimensions': ['rate']}, "Totals cannot be grouped by rate."),
+            ({'period': 'year'}, "Unknown period 'year'."),
+            ({'cursor': 'not a cursor'}, "Invalid cursor."),
+            # Well-formed cursors of values of the wrong type
+            ({'dimensions': [], 'period': 'week', 'cursor': encode_cursor([1])}, "Invalid cursor."),
+            ({'dimensions': [], 'period': 'week', 'cursor': encode_cursor([{'a': 1}])}, "Invalid cursor."),
+            ({'dimensions': ['employee'], 'cursor': encode_cursor(['1'])}, "Invalid cursor."),
+            ({'dimensions': ['project'], 'cursor': encode_cursor([None])}, "Invalid cursor."),
+        ]:
+            with self.subTest(params=params), self.assertRaisesMessage(ValueError, message):
+                aggregate_totals(date(2019, 7, 1), date(2019, 8, 31), **params)
+
+    def test_results_are_cached_until_the_rollups_change(self):
+        params = {'start': date(2019, 7, 1), 'end': date(2019, 7, 31), 'dimensions': ['project']}
+        cached_totals(**params)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows, _ = cached_totals(**params)
+        self.assertEqual(len(queries), 0)
+
+        accumulator = RollupAccumulator()
+        accumulator.add(date(2019, 7, 3), Project.objects.get(name='Google').pk,
+                        Employee.objects.get(employee_id=2).pk, Decimal('100'), 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            accumulator.save()
+
+        updated_rows, _ = cached_totals(**params)
+        self.assertEqual(updated_rows[1]['entries'], rows[1]['entries'] + 1)
+
@@ -0,0 +1,158 @@
+"""
+Unit tests for the CSV ingestion helpers in the invoices app.
+These tests cover the streaming reader, the bounds on its memory use,
+the splitting of files into chunks and the parsing of dates and times.
+"""
+import tracemalloc
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from invoices.ingestion import iter_row_batches, parse_date, parse_row, parse_time, split_byte_ranges
+from invoices.models import TimeSheetFile, Status
+
+
+HEADER = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+
+
+def make_timesheet_file(row_count):
+    """Create a timesheet file stored on disk with the given number of rows."""
+    rows = (f"{i % 50},{100 + i % 50},Project {i % 20},2019-07-{1 + i % 28:02d},09:00,17:00\n" for i in range(row_count))
+    return TimeSheetFile.objects.create(
+        file=ContentFile(HEADER + "".join(rows), name='test_streaming.csv'),
+        status=Status.PENDING
+    )
+
+
+def peak_memory_of_reading(timesheet_file, batch_size):
+    """Return the peak memory (in bytes) allocated while reading every batch of the file."""
+    tracemalloc.start()
+    try:
+        for _ in iter_row_batches(timesheet_file, batch_size=batch_size):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class IterRowBatchesTest(TestCase):
+    """Test cases for the streaming CSV reader."""
+
+    def test_rows_are_parsed_in_batches(self):
+        """Test that the rows are parsed and split into batches of the requested size."""
+        timesheet_file = make_timesheet_file(25)
+
+        batches = list(iter_row_batches(timesheet_file, batch_size=10))
+
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        first_row = batches[0][0]
+        self.assertEqual(first_row.project, 'Project 0')
+        self.assertEqual(first_row.employee_id, 0)
+        self.assertEqual(first_row.rate, Decimal('100'))
+        self.assertEqual(first_row.date, date(2019, 7, 1))
+        self.assertEqual(first_row.start_time, time(9, 0))
+        self.assertEqual(first_row.end_time, time(17, 0))
+
+    def test_empty_rows_are_skipped(self):
+        """Test that empty rows do not produce parsed rows."""
+        timesheet_file = TimeSheetFile.objects.create(
+            file=ContentFile(HEADER + "\n1,300,Google,2019-07-01,09:00,17:00\n,,,,,\n", name='test_empty_rows.csv'),
+            status=Status.PENDING
+        )
+
+        batches = list(iter_row_batches(timesheet_file))
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 1)
+
+    def test_memory_ceiling(self):
+        """
+        Test that the peak memory used to read a file stays flat as the file grows.
+        A file 20 times larger must not need noticeably more memory, and never more
+        than a fraction of its own size.
+        """
+        small_file = make_timesheet_file(1000)
+        large_file = make_timesheet_file(20000)
+
+        small_peak = peak_memory_of_reading(small_file, batch_size=200)
+        large_peak = peak_memory_of_reading(large_file, batch_size=200)
+
+        self.assertLess(large_peak, small_peak * 1.5)
+        self.assertLess(large_peak, large_file.file.size / 4)
+
+
+class SplitByteRangesTest(TestCase):
+    """Test cases for splitting a timesheet file into chunks."""
+
+    def test_ranges_cover_every_row_once(self):
+        """Test that reading every byte range yields each row of the file exactly once."""
+        timesheet_file = make_timesheet_file(500)
+
+        header, byte_ranges = split_byte_ranges(timesheet_file, chunk_size=1000)
+
+        self.assertEqual(header, HEADER.strip().split(','))
+        self.assertGreater(len(byte_ranges), 10)
+
+        rows = [
+            row
+            for byte_range in byte_ranges
+            for batch in iter_row_batches(timesheet_file, byte_range=byte_range, header=header)
+            for row in batch
+        ]
+        expected_rows = [row for batch in iter_row_batches(timesheet_file) for row in batch]
+        self.assertEqual(rows, expected_rows)
+
+    def test_small_file_is_a_single_range(self):
+        """Test that a file smaller than the chunk size is not split."""
+        timesheet_file = make_timesheet_file(10)
+
+        _, byte_ranges = split_byte_ranges(timesheet_file, chunk_size=1024 * 1024)
+
+        self.assertEqual(len(byte_ranges), 1)
+        self.assertEqual(byte_ranges[0][1], timesheet_file.file.size)
+
+
+class ParseDateTimeTest(TestCase):
+    """Test cases for the memoized date and time parsers, checked against datetime.strptime."""
+
+    def assertParsedLikeStrptime(self, parse, values, date_format):
+        for value in values:
+            try:
+                expected = datetime.strptime(value, date_format)
+            except (TypeError, ValueError) as e:
+                with self.assertRaises(type(e), msg=value):
+                    parse(value)
+            else:
+                parsed = parse(value)
+                self.assertEqual(parsed, expected.date() if date_format == '%Y-%m-%d' else expected.time(), value)
+
+    def test_dates(self):
+        self.assertParsedLikeStrptime(parse_date, [
+            '2019-07-01', '2024-02-29', '2019-7-1', '2019-07-1', '2023-02-29', '2019-13-01', '2019-00-10',
+            '0000-01-01', '2019/07/01', '2019-07-01 ', ' 2019-07-01', '2019-07-0a', '2019-07-٠١', '', None,
+        ], '%Y-%m-%d')
+
+    def test_times(self):
+        self.assertParsedLikeStrptime(parse_time, [
+            '09:00', '23:59', '00:00', '9:00', '9:5', '24:00', '12:60', '12-00', '12:00 ', '1a:00', '١٢:00', '', None,
+        ], '%H:%M')
+
+    def test_values_are_memoized(self):
+        """Test that a value seen before is not parsed again."""
+        parse_date.cache_clear()
+        for _ in range(3):
+            parse_date('2019-07-01')
+
+        self.assertEqual(parse_date.cache_info().hits, 2)
+
+    def test_format_error_in_row(self):
+        """Test that a row with an invalid date or time still fails with the row in the message."""
+        row = {
+            'Employee ID': '1', 'Billable Rate (per hour)': '300', 'Project': 'Google',
+            'Date': '2019-07-01', 'Start Time': '25:00', 'End Time': '17:00'
+        }
+        with self.assertRaisesMessage(ValueError, 'Failed to process file 1. Date/Time format error in row'):
+            parse_row(row, 1)
+
+        row['Start Time'] = '09:00'
+        self.assertEqual(parse_row(row, 1).start_time, time(9, 0))
@@ -4,9 +4,30 @@ These tests verify the functionality of the upload_csv view, ensuring it
 correctly handles different scenarios for uploading CSV files, including 
 valid and invalid inputs.
 """
-from django.test import TestCase, Client
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import warnings
+import zipfile
+from datetime import date, time, timedelta
+from unittest import mock
+from urllib.parse import urlencode
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from invoices.models import (
+    BillableRate, ChunkedUpload, DailyRollup, Employee, InvoiceSummary, ProcessingStage, Project, Stage, Status, TimeSheetFile,
+    TimesheetInvoice, UploadBatch
+)
+from invoices.tasks import assemble_chunked_upload
+from invoices.views import BatchStatusView, BatchUploadView
 
 class TimeSheetCSVUploadTest(TestCase):
     def setUp(self):
@@ -145,4 +166,836 @@ class TimeSheetCSVUploadTest(TestCase):
             'file_id': response.json().get('file_id')  # You may want to assert the specific file_id if needed
         }
         
-        self.assertJSONEqual(response.content, expected_response)
\ No newline at end of file
+        self.assertJSONEqual(response.content, expected_response)
+
+class DuplicateUploadTest(TestCase):
+    """Tests for uploading a file identical to one uploaded before."""
+
+    valid_csv = b"""Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time
+101,50,Website Development,2024-09-01,09:00,17:00"""
+
+    def setUp(self):
+        """Set up test client and URL."""
+        self.client = Client()
+        self.upload_url = reverse('upload_csv')
+
+    def upload(self, **data):
+        uploaded_file = SimpleUploadedFile("valid.csv", self.valid_csv, content_type="text/csv")
+        return self.client.post(self.upload_url, {'csvFile': uploaded_file, **data})
+
+    @mock.patch('invoices.views.process_csv_file.delay')
+    def test_same_file_is_not_processed_again(self, mock_process_csv_file):
+        """Test that uploading the same content returns the existing file and its summary."""
+        file_id = self.upload().json()['file_id']
+        timesheet_file = TimeSheetFile.objects.get(id=file_id)
+        timesheet_file.status = Status.PROCESSED
+        timesheet_file.save()
+        InvoiceSummary.objects.create(
+            file=timesheet_file,
+            project_summary={'Website Development': []},
+            project_total_costs={'Website Development': '400.00'}
+        )
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['file_id'], file_id)
+        self.assertEqual(response.json()['status'], Status.PROCESSED)
+        self.assertEqual(response.json()['project_total_costs'], {'Website Development': '400.00'})
+        self.assertEqual(TimeSheetFile.objects.count(), 1)
+        mock_process_csv_file.assert_called_once()
+
+    @mock.patch('invoices.views.process_csv_file.delay')
+    def test_force_reprocessing(self, mock_process_csv_file):
+        """Test that the same file is processed again when forced."""
+        first_file_id = self.upload().json()['file_id']
+
+        response = self.upload(force='true')
+
+        self.assertNotEqual(response.json()['file_id'], first_file_id)
+        self.assertEqual(mock_process_csv_file.call_count, 2)
+        self.assertEqual(
+            len(set(TimeSheetFile.objects.values_list('content_hash', flat=True))), 1
+        )
+
+    @mock.patch('invoices.views.process_csv_file.delay')
+    def test_failed_file_is_processed_again(self, mock_process_csv_file):
+        """Test that a file whose processing failed is processed again."""
+        first_file_id = self.upload().json()['file_id']
+        TimeSheetFile.objects.filter(id=first_file_id).update(status=Status.FAILED)
+
+        response = self.upload()
+
+        self.assertNotEqual(response.json()['file_id'], first_file_id)
+        self.assertEqual(mock_process_csv_file.call_count, 2)
+
+
+class BatchUploadTest(TestCase):
+    """Tests for uploading many files at once, as a ZIP archive or in a single request."""
+
+    valid_csv = b"""Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time
+101,50,Website Development,2024-09-01,09:00,17:00"""
+
+    def setUp(self):
+        """Set up test client, URL and a temporary media root."""
+        self.client = Client()
+        self.upload_url = reverse('upload_batch')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        # The files of a batch are processed in parallel once the batch is committed
+        group_patcher = mock.patch('invoices.views.group')
+        self.mock_group = group_patcher.start()
+        self.addCleanup(group_patcher.stop)
+
+    def make_archive(self, members):
+        content = io.BytesIO()
+        with zipfile.ZipFile(content, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return SimpleUploadedFile('month.zip', content.getvalue(), content_type='application/zip')
+
+    def test_archive_upload(self):
+        """Test that the valid members of an archive are saved in a batch and processed, and the others reported."""
+        archive = self.make_archive({
+            'january/client-a.csv': self.valid_csv,
+            'january/client-b.csv': self.valid_csv.replace(b'101', b'102'),
+            'january/notes.csv': b'Some notes',
+            '__MACOSX/january/._client-a.csv': b'metadata',
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.upload_url, {'archive': archive})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        batch = UploadBatch.objects.get(id=data['batch_id'])
+        self.assertEqual(batch.name, 'month.zip')
+        self.assertEqual(data['status'], Status.PENDING)
+        self.assertEqual(data['counts'], {Status.PENDING: 2})
+        self.assertEqual(len(data['files']), 2)
+        self.assertEqual(data['errors'], [{'name': 'notes.csv', 'error': 'Invalid CSV file. Please ensure the file has the correct headers in their right/specified order.'}])
+
+        timesheet_files = TimeSheetFile.objects.filter(batch=batch)
+        self.assertEqual(len({timesheet_file.content_hash for timesheet_file in timesheet_files}), 2)
+        self.assertEqual(
+            {str(signature.args[0]) for signature in self.mock_group.call_args.args[0]},
+            {str(timesheet_file.id) for timesheet_file in timesheet_files}
+        )
+        self.mock_group.return_value.apply_async.assert_called_once()
+        self.assertEqual(
+            set(ProcessingStage.objects.filter(file__batch=batch).values_list('name', flat=True)),
+            {Stage.VALIDATE, Stage.STORE}
+        )
+
+    def test_several_files_upload(self):
+        """Test that several files of a single request are saved in a batch, each with its own hash."""
+        contents = [self.valid_csv.replace(b'101', str(101 + i).encode()) for i in range(3)]
+        csv_files = [
+            SimpleUploadedFile(f"client-{i}.csv", content, content_type="text/csv") for i, content in enumerate(contents)
+        ]
+
+        # The files are hashed by the upload handler, not read again
+        with mock.patch('invoices.views.hash_file') as mock_hash_file:
+            response = self.client.post(self.upload_url, {'csvFiles': csv_files})
+
+        self.assertEqual(response.status_code, 200)
+        mock_hash_file.assert_not_called()
+        timesheet_files = TimeSheetFile.objects.filter(batch_id=response.json()['batch_id']).order_by('file')
+        self.assertEqual(
+            [timesheet_file.content_hash for timesheet_file in timesheet_files],
+            [hashlib.sha256(content).hexdigest() for content in contents]
+        )
+
+    def test_invalid_uploads(self):
+        """Test that invalid archives and batches without a valid file are rejected, and no batch is kept."""
+        uploads = [
+            ({}, 'No file was uploaded.'),
+            ({'archive': SimpleUploadedFile('month.zip', b'not a zip')}, 'File is not a ZIP archive.'),
+            ({'archive': self.make_archive({'empty/': b''})}, 'The archive does not contain any file.'),
+            ({'archive': self.make_archive({'a.csv': self.valid_csv, 'b.csv': self.valid_csv})},
+             'At most 1 files can be uploaded at once.'),
+            ({'archive': self.make_archive({'a.txt': self.valid_csv})}, 'None of the files can be processed.'),
+        ]
+
+        with mock.patch.object(BatchUploadView, 'max_files', 1):
+            for data, error in uploads:
+                with self.subTest(error=error):
+                    response = self.client.post(self.upload_url, data)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()['error'], error)
+
+        self.assertFalse(UploadBatch.objects.exists())
+        self.mock_group.assert_not_called()
+
+    def test_batch_status(self):
+        """Test that the status of a batch is pending until all its files are processed or failed."""
+        csv_files = [SimpleUploadedFile(f"client-{i}.csv", self.valid_csv, content_type="text/csv") for i in range(2)]
+        batch_id = self.client.post(self.upload_url, {'csvFiles': csv_files}).json()['batch_id']
+        status_url = reverse('upload_batch_status', args=[batch_id])
+        first, second = TimeSheetFile.objects.filter(batch_id=batch_id)
+
+        TimeSheetFile.objects.filter(id=first.id).update(status=Status.PROCESSED)
+        self.assertEqual(self.client.get(status_url).json()['status'], Status.PENDING)
+
+        TimeSheetFile.objects.filter(id=second.id).update(status=Status.FAILED, error_message='Failed.')
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['status'], Status.FAILED)
+        self.assertEqual(data['counts'], {Status.PROCESSED: 1, Status.FAILED: 1})
+        self.assertEqual(
+            {state['file_id']: state.get('message') for state in data['files']},
+            {str(first.id): None, str(second.id): 'Failed.'}
+        )
+
+        TimeSheetFile.objects.filter(id=second.id).update(status=Status.PROCESSED)
+        self.assertEqual(self.client.get(status_url).json()['status'], Status.PROCESSED)
+
+    def test_unknown_batch(self):
+        response = self.client.get(reverse('upload_batch_status', args=['00000000-0000-4000-8000-000000000000']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(INVOICES_UPLOAD_CHUNK_SIZE=64)
+class ChunkedUploadTest(TestCase):
+    """Tests for uploading a file in parts, resumed after an interruption."""
+
+    content = b"Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n" + b"".join(
+        f"{100 + i},50,Website Development,2024-09-{1 + i:02d},09:00,17:00\n".encode() for i in range(5)
+    )
+
+    def setUp(self):
+        """Set up test client and a temporary media root."""
+        self.client = Client()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        # The parts are assembled as soon as the upload is complete, as a worker would
+        assemble = mock.patch('invoices.views.assemble_chunked_upload.delay', side_effect=assemble_chunked_upload)
+        assemble.start()
+        self.addCleanup(assemble.stop)
+
+    def start(self, content=None, name='large.csv'):
+        content = self.content if content is None else content
+        response = self.client.post(reverse('start_chunked_upload'), {'name': name, 'size': len(content)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def send_part(self, upload, number, content=None):
+        content = self.content if content is None else content
+        data = content[(number - 1) * upload['chunk_size']:number * upload['chunk_size']]
+        return self.client.put(
+            reverse('upload_chunked_part', args=[upload['upload_id'], number]),
+            data, content_type='application/octet-stream'
+        )
+
+    def complete(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('upload_chunked_complete', args=[upload['upload_id']]))
+
+    def get_upload(self, upload):
+        return self.client.get(reverse('upload_chunked', args=[upload['upload_id']])).json()
+
+    @mock.patch('invoices.tasks.process_csv_file.delay')
+    def test_resumed_upload(self, mock_process_csv_file):
+        """Test that an upload resumed after the last part received assembles the whole file and processes it."""
+        upload = self.start()
+        self.assertEqual(upload['parts'], -(-len(self.content) // 64))
+        self.assertGreater(upload['parts'], 3)
+        self.assertEqual(upload['parts_received'], 0)
+
+        for number in (1, 2):
+            self.assertEqual(self.send_part(upload, number).status_code, 200)
+
+        # The client resumes from the progress of the upload, and may send the last part again
+        upload = self.client.get(reverse('upload_chunked', args=[upload['upload_id']])).json()
+        self.assertEqual(upload['parts_received'], 2)
+        self.assertEqual(self.send_part(upload, 2).status_code, 200)
+
+        for number in range(upload['parts_received'] + 1, upload['parts'] + 1):
+            self.assertEqual(self.send_part(upload, number).json()['parts_received'], number)
+
+        response = self.complete(upload)
+
+        # The parts are assembled by a task, whose progress is followed like the upload's
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], Status.LOADED)
+        upload = self.get_upload(upload)
+        self.assertEqual(upload['status'], Status.PROCESSED)
+        timesheet_file = TimeSheetFile.objects.get(id=upload['file_id'])
+        with timesheet_file.file.open('rb') as stored_file:
+            self.assertEqual(stored_file.read(), self.content)
+        self.assertEqual(timesheet_file.content_hash, hashlib.sha256(self.content).hexdigest())
+        mock_process_csv_file.assert_called_once_with(timesheet_file.id)
+        self.assertEqual(
+            list(ProcessingStage.objects.filter(file=timesheet_file).values_list('name', flat=True)),
+            [Stage.STORE, Stage.VALIDATE]
+        )
+
+        # The parts are deleted, and completing the upload again returns the same file
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'timesheets', 'chunked', upload['upload_id'])), [])
+        self.assertEqual(self.complete(upload).json()['file_id'], str(timesheet_file.id))
+        self.assertEqual(self.send_part(upload, 1).status_code, 409)
+
+    def test_invalid_parts(self):
+        """Test that parts sent out of order, out of range or of the wrong size are rejected."""
+        upload = self.start()
+        self.assertEqual(self.send_part(upload, 2).status_code, 409)
+        self.assertEqual(self.send_part(upload, upload['parts'] + 1).status_code, 400)
+
+        response = self.client.put(
+            reverse('upload_chunked_part', args=[upload['upload_id'], 1]), b'too short', content_type='application/octet-stream'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Part 1 must be 64 bytes long.'})
+        self.assertEqual(ChunkedUpload.objects.get(id=upload['upload_id']).parts_received, 0)
+
+    def test_incomplete_upload(self):
+        """Test that an upload cannot be completed before all its parts are received."""
+        upload = self.start()
+        self.send_part(upload, 1)
+
+        response = self.complete(upload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Part 2 is expected.')
+        self.assertFalse(TimeSheetFile.objects.exists())
+
+    def test_invalid_file(self):
+        """Test that a file with the wrong header is rejected on completion and discarded."""
+        content = b"Employee,Rate\n101,50\n"
+        upload = self.start(content)
+        self.send_part(upload, 1, content)
+
+        self.assertEqual(self.complete(upload).status_code, 202)
+
+        upload = self.get_upload(upload)
+        self.assertEqual(upload['status'], Status.FAILED)
+        self.assertEqual(upload['message'], 'Invalid CSV file. Please ensure the file has the correct headers in their right/specified order.')
+        self.assertFalse(TimeSheetFile.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'timesheets')), ['chunked'])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'timesheets', 'chunked', upload['upload_id'])), [])
+
+    def test_invalid_start(self):
+        """Test that only CSV files of a positive size can be uploaded."""
+        for data in [{'name': 'large.txt', 'size': '100'}, {'name': 'large.csv', 'size': '0'}, {'name': 'large.csv'}]:
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post(reverse('start_chunked_upload'), data).status_code, 400)
+
+    @override_settings(INVOICES_UPLOAD_MAX_SIZE=1000)
+    def test_file_too_large(self):
+        """Test that files larger than INVOICES_UPLOAD_MAX_SIZE cannot be uploaded."""
+        response = self.client.post(reverse('start_chunked_upload'), {'name': 'large.csv', 'size': '1001'})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['error'], 'Files larger than 1000 bytes cannot be uploaded.')
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    @mock.patch('invoices.tasks.process_csv_file.delay')
+    def test_stale_uploads_are_deleted(self, mock_process_csv_file):
+        """Test that incomplete uploads not added to for INVOICES_UPLOAD_EXPIRY seconds are deleted with their parts."""
+        stale, recent, complete = self.start(), self.start(), self.start()
+        for upload in (stale, recent):
+            self.send_part(upload, 1)
+        for number in range(1, complete['parts'] + 1):
+            self.send_part(complete, number)
+        self.complete(complete)
+
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        ChunkedUpload.objects.exclude(id=recent['upload_id']).update(updated_at=an_hour_ago)
+
+        out = io.StringIO()
+        call_command('delete_stale_uploads', '--max-age=600', stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), "Deleted 1 stale chunked uploads.")
+        self.assertEqual(
+            {str(upload_id) for upload_id in ChunkedUpload.objects.values_list('id', flat=True)},
+            {recent['upload_id'], complete['upload_id']}
+        )
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'timesheets', 'chunked', str(recent['upload_id']))), ['000001.part'])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'timesheets', 'chunked', str(stale['upload_id']))), [])
+        # Parts sent to a deleted upload are rejected
+        self.assertEqual(self.send_part(stale, 2).status_code, 404)
+
+
+class AppendCSVUploadTest(TestCase):
+    """Tests for appending rows to a file that has already been processed."""
+
+    rows_csv = b"""Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time
+101,50,Website Development,2024-09-08,09:00,17:00"""
+
+    def setUp(self):
+        """Set up test client and a processed file."""
+        self.client = Client()
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        self.append_url = reverse('append_csv', args=[self.timesheet_file.id])
+
+    @mock.patch('invoices.views.append_csv_file.delay')
+    def test_valid_append(self, mock_append_csv_file):
+        """Test appending valid rows to a processed file."""
+        uploaded_file = SimpleUploadedFile("week.csv", self.rows_csv, content_type="text/csv")
+
+        response = self.client.post(self.append_url, {'csvFile': uploaded_file})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['file_id'], str(self.timesheet_file.id))
+        mock_append_csv_file.assert_called_once()
+
+        status_response = self.client.get(reverse('append_status', args=[response.json()['append_id']]))
+        self.assertJSONEqual(status_response.content, {'status': Status.PENDING})
+
+    def test_append_to_file_not_processed(self):
+        """Test that rows cannot be appended to a file still being processed."""
+        self.timesheet_file.status = Status.LOADED
+        self.timesheet_file.save()
+        uploaded_file = SimpleUploadedFile("week.csv", self.rows_csv, content_type="text/csv")
+
+        response = self.client.post(self.append_url, {'csvFile': uploaded_file})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_append_invalid_header(self):
+        """Test that appended rows are validated like uploaded files."""
+        uploaded_file = SimpleUploadedFile("week.csv", b"Emp ID,Rate\n101,50", content_type="text/csv")
+
+        response = self.client.post(self.append_url, {'csvFile': uploaded_file})
+
+        expected_error = 'Invalid CSV file. Please ensure the file has the correct headers in their right/specified order.'
+        self.assertEqual(response.status_code, 400)
+        self.assertJSONEqual(response.content, {'error': expected_error})
+
+
+@override_settings(INVOICES_STATUS_POLL_INTERVAL=0.01)
+class StatusEventsTest(TestCase):
+    """Tests for the Server-Sent Events stream of the status of a file."""
+
+    async def read_event(self, events):
+        """Return the data of the next status event of the stream."""
+        while True:
+            chunk = await anext(events)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('event: status'):
+                return json.loads(chunk.split('data: ', 1)[1])
+
+    async def test_status_changes_are_pushed(self):
+        """Test that each status change is pushed until the file is processed."""
+        timesheet_file = await TimeSheetFile.objects.acreate(file='timesheets/test.csv')
+
+        response = await self.async_client.get(reverse('upload_status_events', args=[timesheet_file.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        self.assertEqual(await self.read_event(events), {'status': Status.PENDING, 'rows_processed': 0})
+
+        await TimeSheetFile.objects.filter(id=timesheet_file.id).aupdate(status=Status.LOADED)
+        self.assertEqual((await self.read_event(events))['status'], Status.LOADED)
+
+        await TimeSheetFile.objects.filter(id=timesheet_file.id).aupdate(status=Status.PROCESSED)
+        self.assertEqual((await self.read_event(events))['status'], Status.PROCESSED)
+
+        # The stream ends once the file is processed
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    async def test_unknown_file(self):
+        """Test that the stream of an unknown file reports an error and ends."""
+        response = await self.async_client.get(
+            reverse('upload_status_events', args=['00000000-0000-4000-8000-000000000000'])
+        )
+        events = aiter(response.streaming_content)
+
+        self.assertEqual(await self.read_event(events), {'status': 'error', 'message': 'File not found.'})
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_no_stream_through_wsgi(self):
+        """Test that no stream is opened through WSGI, where the page polls the status instead."""
+        timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv')
+
+        response = self.client.get(reverse('upload_status_events', args=[timesheet_file.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+        self.assertContains(self.client.get(reverse('index')), 'const status_events = false;')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    async def test_index_page_uses_events_through_asgi(self):
+        """Test that the page follows the status through the event stream when served through ASGI."""
+        response = await self.async_client.get(reverse('index'))
+
+        self.assertContains(response, 'const status_events = true;')
+
+
+class BatchStatusTest(TestCase):
+    """Tests for checking the status of many files in one request."""
+
+    def setUp(self):
+        """Set up test client and files in different states."""
+        self.client = Client()
+        self.batch_status_url = reverse('batch_status')
+        self.processed_file = TimeSheetFile.objects.create(file='timesheets/a.csv', status=Status.PROCESSED)
+        self.failed_file = TimeSheetFile.objects.create(
+            file='timesheets/b.csv', status=Status.FAILED, error_message='Date/Time format error'
+        )
+
+    def get_batch(self, file_ids, **headers):
+        return self.client.get(self.batch_status_url, {'ids': ','.join(str(file_id) for file_id in file_ids)}, **headers)
+
+    def test_statuses_in_one_query(self):
+        """Test that the statuses of every file are returned with a single query."""
+        missing_id = '00000000-0000-4000-8000-000000000000'
+
+        with self.assertNumQueries(1):
+            response = self.get_batch([self.processed_file.id, self.failed_file.id, missing_id])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {'files': {
+            str(self.processed_file.id): {'status': Status.PROCESSED, 'rows_processed': 0},
+            str(self.failed_file.id): {'status': Status.FAILED, 'rows_processed': 0, 'message': 'Date/Time format error'},
+            missing_id: {'status': 'error', 'message': 'File not found.'},
+        }})
+
+    def test_unchanged_batch_not_modified(self):
+        """Test that an unchanged batch is answered with 304, and a changed one with the new statuses."""
+        file_ids = [self.processed_file.id, self.failed_file.id]
+        etag = self.get_batch(file_ids)['ETag']
+
+        response = self.get_batch(file_ids, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.failed_file.status = Status.PENDING
+        self.failed_file.save()
+
+        response = self.get_batch(file_ids, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalid_ids(self):
+        """Test that invalid or missing IDs are rejected."""
+        self.assertEqual(self.get_batch(['not-a-uuid']).status_code, 400)
+        self.assertEqual(self.get_batch([]).status_code, 400)
+
+    def test_ids_fit_in_a_request_line(self):
+        """Test that the most IDs checked at once fit in the request line limit of gunicorn."""
+        file_ids = [uuid4() for _ in range(BatchStatusView.max_files + 1)]
+
+        query = urlencode({'ids': ','.join(map(str, file_ids[:-1]))})
+        self.assertLessEqual(len(f'GET {self.batch_status_url}?{query} HTTP/1.1'), 4094)
+
+        self.assertEqual(self.get_batch(file_ids[:-1]).status_code, 200)
+        self.assertEqual(self.get_batch(file_ids).status_code, 400)
+
+
+# The manifest of the static files only exists once they are collected
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class InvoicesViewTest(TestCase):
+    """Tests for the cached and conditional rendering of the invoice summary."""
+
+    def setUp(self):
+        """Set up test client and a processed file with its summary."""
+        self.client = Client()
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        self.invoice_summary = InvoiceSummary.objects.create(
+            file=self.timesheet_file,
+            project_summary={'Google': [{'employee_id': 1, 'total_hours': '8.00', 'unit_price': '300.00', 'cost': '2400.00'}]},
+            project_total_costs={'Google': '2400.00'}
+        )
+        self.invoices_url = reverse('view_invoices', args=[self.timesheet_file.id])
+
+    def test_summary_is_rendered_with_validators(self):
+        """Test that the summary page carries an ETag and a Last-Modified header."""
+        response = self.client.get(self.invoices_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '2400.00')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_not_modified(self):
+        """Test that revalidating an unchanged summary gets a 304 without rendering it."""
+        response = self.client.get(self.invoices_url)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.invoices_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        not_modified = self.client.get(self.invoices_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_rendered_page_is_cached(self):
+        """Test that the rendered page is served from the cache, without loading the summary."""
+        self.client.get(self.invoices_url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.invoices_url)
+        self.assertContains(response, '2400.00')
+
+    def test_new_summary_invalidates_the_page(self):
+        """Test that the page is rendered again once the summary is recomputed."""
+        response = self.client.get(self.invoices_url)
+
+        self.invoice_summary.project_total_costs = {'Google': '2700.00'}
+        self.invoice_summary.save()
+
+        updated = self.client.get(self.invoices_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, 200)
+        self.assertContains(updated, '2700.00')
+        self.assertNotEqual(updated['ETag'], response['ETag'])
+
+    def test_unknown_file(self):
+        """Test that a file without summary is not found."""
+        response = self.client.get(reverse('view_invoices', args=['00000000-0000-4000-8000-000000000000']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportViewsTest(TestCase):
+    """Tests for the streaming CSV and NDJSON exports of a file."""
+
+    def setUp(self):
+        """Set up test client and a processed file with two entries and its summary."""
+        self.client = Client()
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        employee = Employee.objects.create(employee_id=1)
+        project = Project.objects.create(name='Google')
+        billable_rate = BillableRate.objects.create(file=self.timesheet_file, employee=employee, rate=300)
+        TimesheetInvoice.objects.bulk_create([
+            TimesheetInvoice(
+                file=self.timesheet_file, employee=employee, project=project, billable_rate=billable_rate,
+                date=date(2019, 7, day), start_time=time(9, 0), end_time=time(13, 0)
+            )
+            for day in (1, 2)
+        ])
+        InvoiceSummary.objects.create(
+            file=self.timesheet_file,
+            project_summary={'Google': [{'employee_id': 1, 'total_hours': '8.00', 'unit_price': '300.00', 'cost': '2400.00'}]},
+            project_total_costs={'Google': '2400.00'}
+        )
+
+    def export(self, name, export_format):
+        response = self.client.get(reverse(name, args=[self.timesheet_file.id, export_format]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_line_items_csv(self):
+        """Test that the entries are exported in the format of the uploaded files."""
+        content = self.export('export_line_items', 'csv')
+
+        self.assertEqual(content.splitlines(), [
+            'Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time',
+            '1,300.00,Google,2019-07-01,09:00:00,13:00:00',
+            '1,300.00,Google,2019-07-02,09:00:00,13:00:00',
+        ])
+
+    def test_line_items_ndjson(self):
+        """Test that the entries are exported as one JSON object per line."""
+        content = self.export('export_line_items', 'ndjson')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0], {
+            'employee_id': 1, 'billable_rate': '300.00', 'project': 'Google',
+            'date': '2019-07-01', 'start_time': '09:00:00', 'end_time': '13:00:00'
+        })
+
+    def test_summary_csv(self):
+        """Test that the summary is exported with a row per employee of each project."""
+        content = self.export('export_summary', 'csv')
+
+        self.assertEqual(content.splitlines(), [
+            'Project,Employee ID,Total Hours,Unit Price,Cost',
+            'Google,1,8.00,300.00,2400.00',
+        ])
+
+    def test_summary_ndjson(self):
+        """Test that the summary is exported with a JSON object per project."""
+        content = self.export('export_summary', 'ndjson')
+
+        self.assertEqual(json.loads(content), {
+            'project': 'Google',
+            'employees': [{'employee_id': 1, 'total_hours': '8.00', 'unit_price': '300.00', 'cost': '2400.00'}],
+            'total_cost': '2400.00',
+        })
+
+    def test_unknown_format_or_file(self):
+        """Test that unknown formats and files are not found."""
+        response = self.client.get(reverse('export_line_items', args=[self.timesheet_file.id, 'xml']))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse('export_summary', args=['00000000-0000-4000-8000-000000000000', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_exports_served_through_asgi(self):
+        """Test that exports served through ASGI are read by an async iterator."""
+        sync_content = await sync_to_async(self.export)('export_line_items', 'csv')
+
+        with warnings.catch_warnings():
+            # Raised if Django has to read a synchronous iterator to the end first
+            warnings.filterwarnings('error', message='StreamingHttpResponse must consume synchronous iterators')
+            response = await self.async_client.get(
+                reverse('export_line_items', args=[self.timesheet_file.id, 'csv'])
+            )
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(content, sync_content)
+
+
+class InvoicePDFViewTest(TestCase):
+    """Tests for the download of the invoices rendered on the server."""
+
+    def setUp(self):
+        """Set up test client, a temporary media root and a processed file with its summary."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client = Client()
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        InvoiceSummary.objects.create(
+            file=self.timesheet_file,
+            project_summary={'Google & Co': [{'employee_id': 1, 'total_hours': '8.00', 'unit_price': '300.00', 'cost': '2400.00'}]},
+            project_total_costs={'Google & Co': '2400.00'}
+        )
+        self.pdf_url = reverse('invoice_pdf', args=[self.timesheet_file.id])
+
+    def test_combined_invoice(self):
+        """Test downloading the invoice of every project."""
+        response = self.client.get(self.pdf_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(f'Invoice_{self.timesheet_file.id}.pdf', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_project_invoice(self):
+        """Test downloading the invoice of a single project."""
+        response = self.client.get(self.pdf_url, {'project': 'Google & Co'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'Invoice_{self.timesheet_file.id}_google-co.pdf', response['Content-Disposition'])
+        response.close()
+
+        response = self.client.get(self.pdf_url, {'project': 'Amazon'})
+        self.assertEqual(response.status_code, 404)
+
+
+class StagesViewTest(TestCase):
+    """Tests for the processing stages recorded for an uploaded file."""
+
+    @mock.patch('invoices.views.process_csv_file.delay')
+    def test_upload_stages(self, mock_process_csv_file):
+        """Test that the validation and storage of an upload are recorded and returned."""
+        csv_file = SimpleUploadedFile(
+            "test.csv",
+            b"Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n1,300,Google,2019-07-01,09:00,17:00\n",
+            content_type="text/csv"
+        )
+        file_id = self.client.post(reverse('upload_csv'), {'csvFile': csv_file}).json()['file_id']
+
+        response = self.client.get(reverse('file_stages', args=[file_id]))
+
+        self.assertEqual(response.status_code, 200)
+        stages = response.json()['stages']
+        self.assertEqual([stage['name'] for stage in stages], [Stage.VALIDATE, Stage.STORE])
+        self.assertEqual(stages[1]['bytes_processed'], csv_file.size)
+
+    def test_unknown_file(self):
+        response = self.client.get(reverse('file_stages', args=['00000000-0000-4000-8000-000000000000']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReportViewTest(TestCase):
+    """Tests for the reports read from the daily rollups."""
+
+    def setUp(self):
+        google = Project.objects.create(name='Google')
+        employee = Employee.objects.create(employee_id=1)
+        DailyRollup.objects.bulk_create([
+            DailyRollup(date=date(2019, 7, 1), project=google, employee=employee, rate=300, entries=2, minutes=40, cost='198.00'),
+            DailyRollup(date=date(2019, 7, 2), project=google, employee=employee, rate=300, entries=1, minutes=480, cost='2400.00'),
+        ])
+
+    def test_report_by_date(self):
+        response = self.client.get(reverse('report'), {'start': '2019-07-01', 'end': '2019-07-31', 'group_by': 'date'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {
+            'start': '2019-07-01',
+            'end': '2019-07-31',
+            'group_by': 'date',
+            'rows': [
+                {'date': '2019-07-01', 'entries': 2, 'hours': '0.67', 'cost': '198.00'},
+                {'date': '2019-07-02', 'entries': 1, 'hours': '8.00', 'cost': '2400.00'},
+            ],
+        })
+
+    def test_report_of_an_employee(self):
+        response = self.client.get(reverse('report'), {'start': '2019-07-02', 'end': '2019-07-02', 'employee': '1'})
+
+        self.assertEqual(response.json()['rows'], [{'project': 'Google', 'entries': 1, 'hours': '8.00', 'cost': '2400.00'}])
+
+    def test_invalid_parameters(self):
+        for params in [
+            {'start': '2019-07-01'},
+            {'start': '2019-07-01', 'end': '2019-02-30'},
+            {'start': '2019-07-31', 'end': '2019-07-01'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'group_by': 'rate'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'employee': 'one'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('report'), params).status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AnalyticsViewTest(TestCase):
+    """Tests for the totals across files, grouped and paginated."""
+
+    def setUp(self):
+        google, apple = Project.objects.create(name='Google'), Project.objects.create(name='Apple')
+        employee = Employee.objects.create(employee_id=1)
+        DailyRollup.objects.bulk_create([
+            DailyRollup(date=date(2019, 7, 1), project=google, employee=employee, rate=300, entries=2, minutes=40, cost='198.00'),
+            DailyRollup(date=date(2019, 7, 2), project=apple, employee=employee, rate=300, entries=1, minutes=480, cost='2400.00'),
+            DailyRollup(date=date(2019, 8, 5), project=google, employee=employee, rate=300, entries=1, minutes=60, cost='300.00'),
+        ])
+
+    def test_paginated_totals(self):
+        params = {'start': '2019-07-01', 'end': '2019-08-31', 'group_by': 'project,employee', 'period': 'month', 'limit': '2'}
+
+        first_page = self.client.get(reverse('analytics'), params).json()
+        self.assertEqual(first_page['group_by'], ['project', 'employee'])
+        self.assertEqual(first_page['rows'], [
+            {'period': '2019-07-01', 'project': 'Apple', 'employee': 1, 'entries': 1, 'hours': '8.00', 'cost': '2400.00'},
+            {'period': '2019-07-01', 'project': 'Google', 'employee': 1, 'entries': 2, 'hours': '0.67', 'cost': '198.00'},
+        ])
+        self.assertIsNotNone(first_page['next'])
+
+        second_page = self.client.get(reverse('analytics'), {**params, 'cursor': first_page['next']}).json()
+        self.assertEqual(second_page['rows'], [
+            {'period': '2019-08-01', 'project': 'Google', 'employee': 1, 'entries': 1, 'hours': '1.00', 'cost': '300.00'},
+        ])
+        self.assertIsNone(second_page['next'])
+
+    def test_invalid_parameters(self):
+        for params in [
+            {'end': '2019-07-31'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'limit': '0'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'group_by': 'project,rate'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'period': 'quarter'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'cursor': 'abc'},
+            # base64 of [1] and [{"a": 1}], for a page grouped by period only
+            {'start': '2019-07-01', 'end': '2019-07-31', 'group_by': '', 'period': 'week', 'cursor': 'WzFd'},
+            {'start': '2019-07-01', 'end': '2019-07-31', 'group_by': '', 'period': 'week', 'cursor': 'W3siYSI6IDF9XQ=='},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('analytics'), params).status_code, 400)
@@ -0,0 +1,78 @@
+"""
+Unit tests for the timesheet loaders in the invoices app.
+The COPY loader needs PostgreSQL, so only its row formatting is tested here.
+"""
+from datetime import date, time
+from django.db import connection
+from django.test import TestCase, override_settings
+from invoices.loaders import BulkCreateLoader, PostgresCopyLoader, format_copy_row, get_loader
+from invoices.models import BillableRate, Employee, Project, TimeSheetFile, TimesheetInvoice
+
+
+class BulkCreateLoaderTest(TestCase):
+    """Test cases for the bulk_create loader."""
+
+    def setUp(self):
+        self.timesheet = TimeSheetFile.objects.create(file='timesheets/test.csv')
+        self.employee = Employee.objects.create(employee_id=1)
+        self.project = Project.objects.create(name='Google')
+        self.billable_rate = BillableRate.objects.create(file=self.timesheet, employee=self.employee, rate=300)
+
+    def make_invoices(self, count):
+        return [
+            TimesheetInvoice(
+                file=self.timesheet,
+                employee=self.employee,
+                project=self.project,
+                billable_rate=self.billable_rate,
+                date=date(2019, 7, 1),
+                start_time=time(9, 0),
+                end_time=time(17, 0)
+            )
+            for _ in range(count)
+        ]
+
+    def test_rows_inserted_in_batches(self):
+        """Test that the rows are inserted with one statement per batch."""
+        with self.assertNumQueries(3):
+            BulkCreateLoader(batch_size=10).load(self.make_invoices(25))
+
+        self.assertEqual(TimesheetInvoice.objects.filter(file=self.timesheet).count(), 25)
+
+    @override_settings(INVOICES_LOADER_BATCH_SIZE=7)
+    def test_batch_size_setting(self):
+        """Test that the batch size defaults to INVOICES_LOADER_BATCH_SIZE."""
+        self.assertEqual(BulkCreateLoader().batch_size, 7)
+
+
+class GetLoaderTest(TestCase):
+    """Test cases for the selection of the loader."""
+
+    @override_settings(INVOICES_LOADER='auto')
+    def test_auto_picks_the_loader_of_the_database(self):
+        """Test that COPY is only used on PostgreSQL."""
+        expected = PostgresCopyLoader if connection.vendor == 'postgresql' else BulkCreateLoader
+        self.assertIsInstance(get_loader(), expected)
+
+    def test_unknown_loader(self):
+        """Test that an unknown loader name is rejected."""
+        with self.assertRaises(ValueError):
+            get_loader('unknown')
+
+    def test_copy_requires_postgresql(self):
+        """Test that the COPY loader cannot be used on other databases."""
+        if connection.vendor == 'postgresql':
+            self.skipTest('The COPY loader is available on PostgreSQL.')
+
+        with self.assertRaises(ValueError):
+            get_loader('copy')
+
+
+class FormatCopyRowTest(TestCase):
+    """Test cases for the formatting of rows in the text format of COPY."""
+
+    def test_values_are_tab_separated(self):
+        self.assertEqual(format_copy_row([1, '2019-07-01', '09:00:00']), '1\t2019-07-01\t09:00:00\n')
+
+    def test_null_and_special_characters(self):
+        self.assertEqual(format_copy_row([None, 'a\tb\\c\nd']), '\\N\ta\\tb\\\\c\\nd\n')
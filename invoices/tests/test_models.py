@@ -104,6 +104,37 @@ class TimesheetInvoiceModelTest(TestCase):
         self.assertEqual(self.invoice.billable_rate, self.billable_rate)
         self.assertEqual(self.invoice.hours_worked, 8)
 
+    def test_duration_minutes_is_stored(self):
+        """Test that the duration is stored by save and bulk_create, rounded like hours_worked."""
+        self.assertEqual(TimesheetInvoice.objects.get(id=self.invoice.id).duration_minutes, 480)
+
+        TimesheetInvoice.objects.bulk_create([
+            TimesheetInvoice(
+                file=self.timesheet,
+                employee=self.employee,
+                project=self.project,
+                billable_rate=self.billable_rate,
+                date=date(2023, 1, 2),
+                start_time=time(9, 0),
+                end_time=time(9, 20),
+            )
+        ])
+        invoice = TimesheetInvoice.objects.get(date=date(2023, 1, 2))
+
+        self.assertEqual(invoice.duration_minutes, 20)
+        self.assertEqual(invoice.hours_worked, 0.33)
+
+    def test_duration_minutes_follows_edited_times(self):
+        """Test that the duration of a saved entry is computed again when its times are edited."""
+        invoice = TimesheetInvoice.objects.get(id=self.invoice.id)
+        invoice.start_time = time(10, 0)
+        invoice.end_time = time(17, 0)
+        invoice.save()
+
+        invoice = TimesheetInvoice.objects.get(id=self.invoice.id)
+        self.assertEqual(invoice.duration_minutes, 420)
+        self.assertEqual(invoice.hours_worked, 7)
+
 class InvoiceSummaryModelTest(TestCase):
     """Test cases for the InvoiceSummary model."""
 
@@ -0,0 +1,131 @@
+"""
+Unit tests for the server-side PDF invoices in the invoices app: their rendering,
+the artifact cache keeping them in storage, and the task pre-rendering them.
+"""
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from invoices.models import InvoiceSummary, Status, TimeSheetFile
+from invoices.pdf import build_pdf, escape_text, get_invoice_pdf, layout_project, pdf_path, render_invoice_pdf
+from invoices.tasks import render_invoice_pdfs, save_invoice_summary
+from invoices.summary import SummaryAccumulator
+
+
+def count_pages(content):
+    return len(re.findall(rb'/Type /Page\b', content))
+
+
+class RenderInvoicePDFTest(TestCase):
+    """Test cases for the rendering of invoice summaries as PDF documents."""
+
+    def setUp(self):
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        self.invoice_summary = InvoiceSummary.objects.create(
+            file=self.timesheet_file,
+            project_summary={
+                'Google': [{'employee_id': 1, 'total_hours': '8.00', 'unit_price': '300.00', 'cost': '2400.00'}],
+                'Amazon (EU)': [{'employee_id': 2, 'total_hours': '2.50', 'unit_price': '100.00', 'cost': '250.00'}],
+            },
+            project_total_costs={'Google': '2400.00', 'Amazon (EU)': '250.00'}
+        )
+
+    def test_combined_invoice(self):
+        """Test that the combined invoice has a page per project with its totals."""
+        content = render_invoice_pdf(self.invoice_summary)
+
+        self.assertTrue(content.startswith(b'%PDF-1.4'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        self.assertEqual(count_pages(content), 2)
+        self.assertIn(b'(Company: Google)', content)
+        self.assertIn(b'(Company: Amazon \\(EU\\))', content)
+        self.assertIn(b'(2400.00)', content)
+
+    def test_project_invoice(self):
+        """Test that the invoice of a project only contains that project."""
+        content = render_invoice_pdf(self.invoice_summary, 'Google')
+
+        self.assertEqual(count_pages(content), 1)
+        self.assertNotIn(b'Amazon', content)
+
+        with self.assertRaises(KeyError):
+            render_invoice_pdf(self.invoice_summary, 'Unknown')
+
+    def test_cross_reference_offsets(self):
+        """Test that the cross-reference table points at the start of every object."""
+        content = render_invoice_pdf(self.invoice_summary)
+
+        xref_offset = int(content.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        offsets = re.findall(rb'(\d{10}) 00000 n ', content[xref_offset:])
+
+        for number, offset in enumerate(offsets, 1):
+            self.assertTrue(content[int(offset):].startswith(b'%d 0 obj' % number))
+
+    def test_long_projects_continue_on_new_pages(self):
+        """Test that a project with many employees is split across pages."""
+        employees = [
+            {'employee_id': i, 'total_hours': '1.00', 'unit_price': '1.00', 'cost': '1.00'} for i in range(100)
+        ]
+        pages = layout_project('Google', employees, '100.00')
+
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(count_pages(build_pdf(pages)), len(pages))
+        self.assertIn('Company: Google \\(continued\\)', pages[1].content())
+
+    def test_escape_text(self):
+        self.assertEqual(escape_text('a(b)\\c\nd'), 'a\\(b\\)\\\\c d')
+
+
+class InvoicePDFCacheTest(TestCase):
+    """Test cases for the storage of the rendered invoices, keyed by file and summary version."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.timesheet_file = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.PROCESSED)
+        accumulator = SummaryAccumulator()
+        accumulator.add('Google', 1, Decimal('300.00'), timedelta(hours=8))
+        with self.captureOnCommitCallbacks():
+            self.invoice_summary = save_invoice_summary(self.timesheet_file.id, accumulator)
+
+    def test_invoice_is_rendered_once(self):
+        """Test that a stored invoice is served without being rendered again."""
+        path = get_invoice_pdf(self.invoice_summary)
+        self.assertTrue(default_storage.exists(path))
+
+        with mock.patch('invoices.pdf.render_invoice_pdf') as mock_render:
+            self.assertEqual(get_invoice_pdf(self.invoice_summary), path)
+        mock_render.assert_not_called()
+
+    def test_task_renders_every_invoice(self):
+        """Test that the task renders the combined invoice and the invoice of every project."""
+        render_invoice_pdfs(self.timesheet_file.id)
+
+        self.assertTrue(default_storage.exists(pdf_path(self.invoice_summary)))
+        self.assertTrue(default_storage.exists(pdf_path(self.invoice_summary, 'Google')))
+
+    def test_new_summary_replaces_the_invoices(self):
+        """Test that recomputing the summary schedules new invoices and deletes the outdated ones."""
+        render_invoice_pdfs(self.timesheet_file.id)
+        old_path = pdf_path(self.invoice_summary)
+
+        accumulator = SummaryAccumulator()
+        accumulator.add('Google', 1, Decimal('300.00'), timedelta(hours=9))
+        with mock.patch('invoices.tasks.render_invoice_pdfs.delay') as mock_render:
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice_summary = save_invoice_summary(self.timesheet_file.id, accumulator, self.invoice_summary)
+        mock_render.assert_called_once_with(self.timesheet_file.id)
+
+        render_invoice_pdfs(self.timesheet_file.id)
+
+        self.assertNotEqual(pdf_path(invoice_summary), old_path)
+        self.assertFalse(default_storage.exists(old_path))
+        self.assertTrue(default_storage.exists(pdf_path(invoice_summary)))
@@ -0,0 +1,149 @@
+"""
+Query budgets of the invoice pipeline and views, checked on generated files of 1k and
+10k rows with the profiling harness of invoices.profiling.
+
+The budgets are upper bounds measured on SQLite, whose limit on query parameters splits
+each batch of rows in several INSERT statements. They hold on PostgreSQL, where rows are
+inserted with fewer statements (or COPY, which is not counted).
+"""
+import io
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from invoices.models import TimeSheetFile
+from invoices.profiling import QueryBudgetMixin, QueryProfile, fingerprint
+from invoices.synthetic import write_timesheet
+from invoices.tasks import compute_invoice_summary, process_csv_file
+
+
+def make_synthetic_file(rows):
+    content = io.StringIO()
+    write_timesheet(content, rows, employees=50, projects=20)
+    return TimeSheetFile.objects.create(file=ContentFile(content.getvalue(), name='test_budget.csv'))
+
+
+class QueryProfileTest(QueryBudgetMixin, TestCase):
+    """Test cases for the profiling harness itself."""
+
+    def test_fingerprints_ignore_the_number_of_values(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)')
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)')
+        )
+
+    def test_duplicates_are_reported(self):
+        with QueryProfile() as profile:
+            for _ in range(3):
+                list(TimeSheetFile.objects.all())
+
+        self.assertEqual(profile.count, 3)
+        self.assertEqual(list(profile.duplicates().values()), [3])
+        self.assertGreaterEqual(profile.total_time, 0)
+
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(AssertionError, 'Query budget of 1 exceeded'):
+            with self.assertQueryBudget(1):
+                list(TimeSheetFile.objects.all())
+                list(TimeSheetFile.objects.all())
+
+        with self.assertRaisesMessage(AssertionError, 'Queries run more than 1 times'):
+            with self.assertQueryBudget(5, max_repeats=1):
+                list(TimeSheetFile.objects.all())
+                list(TimeSheetFile.objects.all())
+
+
+@override_settings(INVOICES_PRERENDER_PDFS=False, INVOICES_LOADER='bulk_create')
+class PipelineQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Query budgets of the ingestion and summary of generated files."""
+
+    # Rows -> (ingestion, summary) budgets. Ingestion grows with the INSERT statements of the rows,
+    # the summary with the ones of their daily rollups, one per day, project and employee of the file
+    budgets = {1_000: (25, 20), 10_000: (115, 75)}
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_budgets(self, mock_compute_invoice_summary):
+        for rows, (ingestion_budget, summary_budget) in self.budgets.items():
+            with self.subTest(rows=rows):
+                timesheet_file = make_synthetic_file(rows)
+
+                with self.assertQueryBudget(ingestion_budget) as profile:
+                    process_csv_file(timesheet_file.id)
+
+                # Only the INSERT statements of the rows grow with the file, entities are looked up once
+                self.assertEqual(self.repeated_lookups(profile), {})
+
+                with self.assertQueryBudget(summary_budget) as profile:
+                    compute_invoice_summary(timesheet_file.id)
+
+                # Only the INSERT statements of the rollups grow with the file
+                self.assertEqual(self.repeated_lookups(profile), {})
+
+    def repeated_lookups(self, profile):
+        return {sql: count for sql, count in profile.duplicates().items() if sql.startswith('SELECT') and count > 2}
+
+
+# The manifest of the static files only exists once they are collected
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    INVOICES_PRERENDER_PDFS=False,
+)
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Query budgets of the views, for a processed file of 1k rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.timesheet_file = make_synthetic_file(1_000)
+        with mock.patch('invoices.tasks.compute_invoice_summary.delay'):
+            process_csv_file(cls.timesheet_file.id)
+        compute_invoice_summary(cls.timesheet_file.id)
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def test_views(self):
+        file_id = self.timesheet_file.id
+        views = [
+            ('view_invoices', [file_id], {}, 2),
+            ('upload_status', [file_id], {}, 1),
+            ('batch_status', [], {'ids': str(file_id)}, 1),
+            ('file_stages', [file_id], {}, 2),
+            ('export_line_items', [file_id, 'csv'], {}, 2),
+            ('export_summary', [file_id, 'ndjson'], {}, 1),
+            ('report', [], {'start': '2024-01-01', 'end': '2024-01-31', 'group_by': 'employee'}, 1),
+            ('analytics', [], {'start': '2024-01-01', 'end': '2024-01-31', 'period': 'week'}, 1),
+        ]
+        for name, args, params, budget in views:
+            with self.subTest(view=name), self.assertQueryBudget(budget, max_repeats=1):
+                self.get(name, *args, **params)
+
+    def test_invoice_pdf(self):
+        with self.settings(MEDIA_ROOT=self._media_root()), self.assertQueryBudget(1):
+            self.get('invoice_pdf', self.timesheet_file.id)
+
+    @mock.patch('invoices.views.process_csv_file.delay')
+    def test_upload(self, mock_process_csv_file):
+        content = io.BytesIO()
+        text = io.StringIO()
+        write_timesheet(text, 1_000, seed=1)
+        content.write(text.getvalue().encode())
+        content.seek(0)
+        content.name = 'test_budget_upload.csv'
+
+        with self.assertQueryBudget(4, max_repeats=1):
+            response = self.client.post(reverse('upload_csv'), {'csvFile': content})
+        self.assertEqual(response.status_code, 200)
+
+    def _media_root(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        return media_root
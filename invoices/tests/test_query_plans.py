@@ -0,0 +1,65 @@
+"""
+Tests checking the query plans of the main access paths to the timesheet entries,
+so that a query no longer served by its index is caught.
+"""
+from datetime import date
+from uuid import uuid4
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from invoices.analytics import aggregate_totals, encode_cursor
+from invoices.models import DailyRollup, Project, TimesheetInvoice
+from invoices.summary import invoice_groups
+
+
+class QueryPlanTest(TestCase):
+    """Test cases for the indexes used by the queries on timesheet entries, projects and daily rollups."""
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, make sure the planner picks an index whenever it can
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} is not used by the query plan:\n{plan}")
+
+    def assertQueryUsesIndex(self, sql, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            plan = '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
+        self.assertIn(index_name, plan, f"{index_name} is not used by the query plan:\n{plan}")
+
+    @property
+    def rollup_index_name(self):
+        # SQLite names the index of a unique constraint after its table
+        return 'invoices_rollup_key' if connection.vendor == 'postgresql' else 'sqlite_autoindex_invoices_dailyrollup'
+
+    def test_summary_uses_the_composite_index(self):
+        """Test that the entries of a file are grouped using the (file, project, employee) index."""
+        self.assertUsesIndex(invoice_groups(uuid4()), 'invoices_ts_file_proj_emp_idx')
+
+    def test_entries_of_a_file_use_the_composite_index(self):
+        """Test that the entries of a file are read using the index starting with the file."""
+        self.assertUsesIndex(TimesheetInvoice.objects.filter(file_id=uuid4()), 'invoices_ts_file_proj_emp_idx')
+
+    def test_projects_are_looked_up_by_name_with_an_index(self):
+        """Test that looking up projects by name uses the index on their name."""
+        self.assertUsesIndex(Project.objects.filter(name__in=['Google', 'Amazon']), 'invoices_project_name')
+
+    def test_rollups_are_selected_by_date_with_an_index(self):
+        """Test that the rollups of a range of dates are read using the index of their unique key."""
+        self.assertUsesIndex(
+            DailyRollup.objects.filter(date__range=(date(2019, 7, 1), date(2019, 9, 30))), self.rollup_index_name
+        )
+
+    def test_analytics_pages_select_rollups_by_date_with_an_index(self):
+        """Test that the query of a page of analytics reads the rollups of its dates using their unique key."""
+        cursor = encode_cursor([date(2019, 7, 8), 'Google'])
+
+        with CaptureQueriesContext(connection) as queries:
+            aggregate_totals(date(2019, 7, 1), date(2019, 9, 30), ['project'], period='week', cursor=cursor)
+
+        [query] = queries
+        self.assertQueryUsesIndex(query['sql'], self.rollup_index_name)
@@ -0,0 +1,206 @@
+"""
+Tests of the daily rollups of the timesheet entries: maintained as files are processed,
+in one task, in chunks or by appending rows, and rebuilt from the stored entries.
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from invoices.analytics import aggregate_totals
+from invoices.ingestion import iter_row_batches, resolve_file_entities, split_byte_ranges
+from invoices.models import DailyRollup, Employee, Project, Status, TimeSheetAppend, TimeSheetFile
+from invoices.rollup import RollupAccumulator, rebuild_rollups, rollup_report
+from invoices.tasks import (
+    append_csv_file, compute_invoice_summary, merge_csv_chunks, process_csv_chunk, process_csv_file
+)
+
+
+HEADER = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+
+
+def rollup_values():
+    return sorted(
+        DailyRollup.objects.values_list('date', 'project__name', 'employee__employee_id', 'rate', 'entries', 'minutes', 'cost')
+    )
+
+
+@override_settings(INVOICES_PRERENDER_PDFS=False)
+class RollupMaintenanceTest(TestCase):
+
+    rows = ("1,300.50,Google,2019-07-01,09:00,09:20\n"
+            "1,300.50,Google,2019-07-01,13:00,13:20\n"
+            "2,150,Google,2019-07-01,10:00,15:00\n"
+            "1,300.50,Apple,2019-07-02,11:45,16:00\n")
+
+    def process(self, content, name='test_rollup.csv'):
+        timesheet_file = TimeSheetFile.objects.create(file=ContentFile(HEADER + content, name=name))
+        process_csv_file(timesheet_file.id, fused=True)
+        return timesheet_file
+
+    def test_processing_adds_rollups(self):
+        self.process(self.rows)
+
+        self.assertEqual(rollup_values(), [
+            (date(2019, 7, 1), 'Google', 1, Decimal('300.50'), 2, 40, Decimal('198.3300')),
+            (date(2019, 7, 1), 'Google', 2, Decimal('150.00'), 1, 300, Decimal('750.0000')),
+            (date(2019, 7, 2), 'Apple', 1, Decimal('300.50'), 1, 255, Decimal('1277.1250')),
+        ])
+
+    def test_files_add_up(self):
+        self.process(self.rows)
+        self.process(self.rows + "3,99.99,Amazon,2019-07-02,13:10,14:00\n", name='test_rollup_again.csv')
+
+        rollups = {(rollup.date, rollup.project.name, rollup.employee.employee_id): rollup
+                   for rollup in DailyRollup.objects.select_related('project', 'employee')}
+        self.assertEqual(len(rollups), 4)
+        self.assertEqual(rollups[date(2019, 7, 1), 'Google', 1].entries, 4)
+        self.assertEqual(rollups[date(2019, 7, 1), 'Google', 1].minutes, 80)
+        self.assertEqual(rollups[date(2019, 7, 2), 'Amazon', 3].minutes, 50)
+
+        # Maintained rollups are the same as the ones rebuilt from the entries
+        maintained = rollup_values()
+        rebuild_rollups()
+        self.assertEqual(rollup_values(), maintained)
+
+    def test_failed_file_adds_no_rollups(self):
+        self.process(self.rows + "1,999,Google,2019-07-03,09:00,10:00\n")
+
+        self.assertFalse(DailyRollup.objects.exists())
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_rollups_are_added_with_the_summary(self, mock_compute_invoice_summary):
+        self.process(self.rows)
+        fused = rollup_values()
+        DailyRollup.objects.all().delete()
+
+        timesheet_file = TimeSheetFile.objects.create(file=ContentFile(HEADER + self.rows, name='test_two_tasks.csv'))
+        process_csv_file(timesheet_file.id, fused=False)
+        # Nothing is added until the summary is saved
+        self.assertFalse(DailyRollup.objects.exists())
+
+        with mock.patch('invoices.tasks.aggregate_invoices', side_effect=ValueError("Summary failed.")):
+            compute_invoice_summary(timesheet_file.id)
+        timesheet_file.refresh_from_db()
+        self.assertEqual(timesheet_file.status, Status.FAILED)
+        self.assertFalse(DailyRollup.objects.exists())
+
+        TimeSheetFile.objects.filter(id=timesheet_file.id).update(status=Status.LOADED)
+        compute_invoice_summary(timesheet_file.id)
+        self.assertEqual(rollup_values(), fused)
+
+    def test_chunks_add_the_same_rollups(self):
+        content = "".join(
+            f"{i % 7},{100 + i % 7}.25,Project {i % 5},2019-07-{1 + i % 28:02d},09:{i % 60:02d},17:00\n"
+            for i in range(300)
+        )
+        self.process(content)
+        single_task = rollup_values()
+        DailyRollup.objects.all().delete()
+
+        timesheet_file = TimeSheetFile.objects.create(file=ContentFile(HEADER + content, name='test_chunks.csv'))
+        header, byte_ranges = split_byte_ranges(timesheet_file, chunk_size=1024)
+        resolve_file_entities(timesheet_file, iter_row_batches(timesheet_file))
+        results = [process_csv_chunk(timesheet_file.id, header, byte_range) for byte_range in byte_ranges]
+        self.assertGreater(len(results), 1)
+        # Nothing is added until every chunk has been merged
+        self.assertFalse(DailyRollup.objects.exists())
+
+        merge_csv_chunks(results, timesheet_file.id)
+        self.assertEqual(rollup_values(), single_task)
+
+    def test_appended_rows_add_rollups(self):
+        timesheet_file = self.process(self.rows)
+        timesheet_append = TimeSheetAppend.objects.create(
+            timesheet_file=timesheet_file,
+            file=ContentFile(HEADER + "2,150,Google,2019-07-01,16:00,17:00\n", name='test_append.csv')
+        )
+        append_csv_file(timesheet_append.id)
+
+        rollup = DailyRollup.objects.get(date=date(2019, 7, 1), employee__employee_id=2)
+        self.assertEqual((rollup.entries, rollup.minutes, rollup.cost), (2, 360, Decimal('900.0000')))
+
+
+class RollupAccumulatorTest(TestCase):
+
+    def test_json_round_trip(self):
+        accumulator = RollupAccumulator()
+        accumulator.add(date(2019, 7, 1), 1, 2, Decimal('300.50'), 20, entries=2)
+        accumulator.add(date(2019, 7, 1), 1, 2, Decimal('300.50'), 255)
+
+        merged = RollupAccumulator()
+        merged.merge(accumulator.to_json())
+        merged.merge(accumulator.to_json())
+
+        [rollup] = merged.rollups()
+        self.assertEqual((rollup.entries, rollup.minutes), (6, 590))
+        # Hours are rounded per entry: 0.33 h and 4.25 h
+        self.assertEqual(rollup.cost, 2 * (2 * Decimal('0.33') + Decimal('4.25')) * Decimal('300.50'))
+
+
+class RebuildRollupsTest(TestCase):
+
+    def setUp(self):
+        timesheet_file = TimeSheetFile.objects.create(file=ContentFile(
+            HEADER + RollupMaintenanceTest.rows, name='test_rebuild.csv'
+        ))
+        process_csv_file(timesheet_file.id, fused=True)
+        self.rollups = rollup_values()
+
+    def test_rebuild_everything(self):
+        DailyRollup.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), "Rebuilt 3 daily rollups.")
+        self.assertEqual(rollup_values(), self.rollups)
+
+    def test_rebuild_a_range_of_dates(self):
+        DailyRollup.objects.update(entries=0, minutes=0, cost=0)
+
+        self.assertEqual(rebuild_rollups(start=date(2019, 7, 2), end=date(2019, 7, 2)), 1)
+
+        # Only the rollups of the range are rebuilt
+        rebuilt = DailyRollup.objects.get(date=date(2019, 7, 2))
+        self.assertEqual(rebuilt.minutes, 255)
+        self.assertFalse(DailyRollup.objects.filter(date=date(2019, 7, 1), minutes__gt=0).exists())
+
+
+class RollupReportTest(TestCase):
+
+    def setUp(self):
+        google, apple = Project.objects.create(name='Google'), Project.objects.create(name='Apple')
+        first, second = Employee.objects.create(employee_id=1), Employee.objects.create(employee_id=2)
+        DailyRollup.objects.bulk_create([
+            DailyRollup(date=date(2019, 7, 1), project=google, employee=first, rate=100, entries=2, minutes=90, cost=150),
+            DailyRollup(date=date(2019, 7, 2), project=google, employee=second, rate=50, entries=1, minutes=60, cost=50),
+            DailyRollup(date=date(2019, 7, 2), project=apple, employee=first, rate=100, entries=1, minutes=20, cost=33),
+            DailyRollup(date=date(2019, 8, 1), project=apple, employee=first, rate=100, entries=1, minutes=60, cost=100),
+        ])
+
+    def test_report_by_project(self):
+        self.assertEqual(rollup_report(date(2019, 7, 1), date(2019, 7, 31)), [
+            {'project': 'Apple', 'entries': 1, 'hours': Decimal('0.33'), 'cost': Decimal('33')},
+            {'project': 'Google', 'entries': 3, 'hours': Decimal('2.50'), 'cost': Decimal('200')},
+        ])
+
+    def test_report_by_employee_of_a_project(self):
+        report = rollup_report(date(2019, 7, 1), date(2019, 8, 31), group_by='employee', project='Apple')
+
+        self.assertEqual(report, [{'employee': 1, 'entries': 2, 'hours': Decimal('1.33'), 'cost': Decimal('133')}])
+
+    def test_report_by_date_matches_the_analytics_per_day(self):
+        report = rollup_report(date(2019, 7, 1), date(2019, 7, 31), group_by='date')
+        rows, _ = aggregate_totals(date(2019, 7, 1), date(2019, 7, 31), [], period='day')
+
+        self.assertEqual([row['date'] for row in report], [date(2019, 7, 1), date(2019, 7, 2)])
+        for row in report:
+            row['period'] = row.pop('date')
+        self.assertEqual(report, rows)
+
+    def test_unknown_grouping(self):
+        with self.assertRaisesMessage(ValueError, "Reports cannot be grouped by 'rate'."):
+            rollup_report(date(2019, 7, 1), date(2019, 7, 31), group_by='rate')
@@ -0,0 +1,184 @@
+"""
+Unit tests for the invoice summary aggregation in the invoices app.
+The database-side aggregation is checked against the entry-by-entry
+computation based on TimesheetInvoice.hours_worked, and the NumPy backend
+against the Decimal one.
+"""
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from django.test import TestCase, override_settings
+from invoices.models import (
+    Employee, Project, TimeSheetFile, BillableRate, TimesheetInvoice, Status
+)
+from invoices.summary import SummaryAccumulator, aggregate_invoices, get_summary_backend, summarize_decimal
+from invoices.utils import convert_decimal_to_string
+from invoices.vectorized import numpy_available
+
+
+def summarize_entry_by_entry(file_id):
+    """Reference implementation adding up the hours worked of every entry in Python."""
+    project_summary = {}
+    project_total_costs = {}
+    invoices = TimesheetInvoice.objects.filter(file_id=file_id).select_related(
+        'project', 'employee', 'billable_rate'
+    ).order_by('id')
+
+    employees_by_project = {}
+    for invoice in invoices:
+        employees = employees_by_project.setdefault(invoice.project.name, {})
+        totals = employees.setdefault(
+            invoice.employee.employee_id,
+            {'total_hours': Decimal('0.00'), 'unit_price': Decimal('0.00'), 'total_cost': Decimal('0.00')}
+        )
+        hours = Decimal(invoice.hours_worked)
+        totals['total_hours'] += hours
+        totals['unit_price'] = invoice.billable_rate.rate
+        totals['total_cost'] += hours * invoice.billable_rate.rate
+
+    for project_name, employees in employees_by_project.items():
+        project_summary[project_name] = [
+            {
+                'employee_id': employee_id,
+                'total_hours': totals['total_hours'],
+                'unit_price': totals['unit_price'],
+                'cost': totals['total_cost'],
+            }
+            for employee_id, totals in employees.items()
+        ]
+        project_total_costs[project_name] = Decimal('0.00')
+        for totals in employees.values():
+            project_total_costs[project_name] += totals['total_cost']
+
+    return project_summary, project_total_costs
+
+
+class AggregateInvoicesTest(TestCase):
+    """Test cases for the database-side aggregation of timesheet entries."""
+
+    def setUp(self):
+        """Create entries whose durations and rates do not round to whole cents."""
+        self.timesheet = TimeSheetFile.objects.create(file='timesheets/test.csv', status=Status.LOADED)
+
+        rates = [Decimal('50.50'), Decimal('33.33'), Decimal('0.57'), Decimal('199.99')]
+        durations = [(time(9, 0), time(9, 20)), (time(9, 0), time(9, 40)),
+                     (time(10, 7), time(11, 0)), (time(8, 1), time(17, 59))]
+        projects = [Project.objects.create(name=f'Project {i}') for i in range(3)]
+        employees = [Employee.objects.create(employee_id=100 + i) for i in range(len(rates))]
+        billable_rates = [
+            BillableRate.objects.create(file=self.timesheet, employee=employee, rate=rate)
+            for employee, rate in zip(employees, rates)
+        ]
+
+        TimesheetInvoice.objects.bulk_create([
+            TimesheetInvoice(
+                file=self.timesheet,
+                employee=employees[i % len(employees)],
+                project=projects[(i * 7) % len(projects)],
+                billable_rate=billable_rates[i % len(employees)],
+                date=date(2019, 7, 1 + i % 28),
+                start_time=durations[(i // 3) % len(durations)][0],
+                end_time=durations[(i // 3) % len(durations)][1],
+            )
+            for i in range(200)
+        ])
+
+    def test_matches_entry_by_entry_summary(self):
+        """Test that the aggregated summary is identical to adding up the entries one by one."""
+        project_summary, project_total_costs = aggregate_invoices(self.timesheet.id).summarize()
+        expected_summary, expected_total_costs = summarize_entry_by_entry(self.timesheet.id)
+
+        self.assertEqual(convert_decimal_to_string(project_summary), convert_decimal_to_string(expected_summary))
+        self.assertEqual(convert_decimal_to_string(project_total_costs), convert_decimal_to_string(expected_total_costs))
+        self.assertEqual(list(project_summary), list(expected_summary))
+
+    def test_single_query(self):
+        """Test that the entries of every project are aggregated in a single query."""
+        with self.assertNumQueries(1):
+            accumulator = aggregate_invoices(self.timesheet.id)
+
+        self.assertEqual(sum(entries for *_, entries in accumulator.groups()), 200)
+
+
+@skipUnless(numpy_available(), 'NumPy is not installed.')
+class VectorizedSummaryTest(TestCase):
+    """Test cases for the NumPy summary backend, checked against the Decimal backend to the cent."""
+
+    def assertSameSummary(self, accumulator):
+        expected = [convert_decimal_to_string(value) for value in accumulator.summarize('decimal')]
+        summary = [convert_decimal_to_string(value) for value in accumulator.summarize('numpy')]
+
+        self.assertEqual(summary, expected)
+        self.assertEqual(list(summary[0]), list(expected[0]))
+        for project_name, employees in summary[0].items():
+            self.assertEqual(employees, expected[0][project_name])
+
+    def test_random_groups(self):
+        """Test random projects, employees, durations and rates."""
+        generator = random.Random(7)
+
+        for _ in range(20):
+            accumulator = SummaryAccumulator()
+            rates = {}
+            for _ in range(generator.randint(1, 300)):
+                employee_id = generator.randint(1, 40)
+                rate = rates.setdefault(employee_id, Decimal(generator.randint(1, 50000)) / 100)
+                accumulator.add(
+                    f'Project {generator.randint(1, 8)}', employee_id, rate,
+                    timedelta(minutes=generator.randint(1, 12 * 60)), entries=generator.randint(1, 1000)
+                )
+
+            self.assertSameSummary(accumulator)
+
+    def test_half_cent_totals(self):
+        """Test totals on a half cent, which the Decimal backend rounds by the error of float hours."""
+        for minutes, rate in [(34, '0.50'), (20, '0.50'), (34, '0.10'), (7, '0.50'), (1, '0.50')]:
+            accumulator = SummaryAccumulator()
+            accumulator.add('Google', 1, Decimal(rate), timedelta(minutes=minutes))
+            accumulator.add('Amazon', 2, Decimal('10.00'), timedelta(hours=1))
+
+            self.assertSameSummary(accumulator)
+
+    def test_durations_in_seconds(self):
+        """Test that durations that are not whole minutes are still summarized like the Decimal backend."""
+        accumulator = SummaryAccumulator()
+        accumulator.add('Google', 1, Decimal('0.50'), timedelta(seconds=18))
+        accumulator.add('Google', 1, Decimal('0.50'), timedelta(minutes=-20))
+
+        self.assertSameSummary(accumulator)
+
+    def test_totals_netting_to_zero(self):
+        """Test zero totals of negative and positive hours, signed by the float errors of the Decimal backend."""
+        for minutes in [(6, 12, -18), (-6, -12, 18)]:
+            accumulator = SummaryAccumulator()
+            for duration in minutes:
+                accumulator.add('Google', 1, Decimal('10.00'), timedelta(minutes=duration))
+            accumulator.add('Amazon', 2, Decimal('10.00'), timedelta(hours=1))
+
+            self.assertSameSummary(accumulator)
+
+    def test_stored_entries(self):
+        """Test the summary of entries aggregated in the database."""
+        AggregateInvoicesTest.setUp(self)
+        self.assertSameSummary(aggregate_invoices(self.timesheet.id))
+
+
+class SummaryBackendTest(TestCase):
+    """Test cases for the selection of the summary backend."""
+
+    @override_settings(INVOICES_SUMMARY_BACKEND='decimal')
+    def test_decimal_is_the_default(self):
+        self.assertIs(get_summary_backend(), summarize_decimal)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_summary_backend('unknown')
+
+    def test_numpy_requires_numpy(self):
+        """Test that the NumPy backend cannot be used without NumPy."""
+        if numpy_available():
+            self.skipTest('NumPy is installed.')
+
+        with self.assertRaises(ValueError):
+            get_summary_backend('numpy')
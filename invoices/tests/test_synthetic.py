@@ -0,0 +1,95 @@
+"""
+Unit tests for the synthetic timesheet files and the pipeline benchmark in the invoices app.
+"""
+import csv
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from invoices.models import Status, TimeSheetFile, TimesheetInvoice
+from invoices.synthetic import HEADER, generate_rows, write_timesheet
+from invoices.tasks import process_csv_file
+
+
+def synthetic_file(rows, **options):
+    content = io.StringIO()
+    write_timesheet(content, rows, **options)
+    return content.getvalue()
+
+
+class SyntheticTimesheetTest(TestCase):
+    """Test cases for the generator of synthetic timesheet files."""
+
+    def test_rows_are_reproducible(self):
+        """Test that the same seed gives the same rows, and another seed other rows."""
+        self.assertEqual(list(generate_rows(100, seed=1)), list(generate_rows(100, seed=1)))
+        self.assertNotEqual(list(generate_rows(100, seed=1)), list(generate_rows(100, seed=2)))
+
+    def test_file_format(self):
+        """Test that the file has the expected header, rows, employees and projects."""
+        rows = list(csv.reader(io.StringIO(synthetic_file(500, employees=5, projects=3))))
+
+        self.assertEqual(rows[0], HEADER)
+        self.assertEqual(len(rows), 501)
+        self.assertLessEqual({row[0] for row in rows[1:]}, {str(i) for i in range(1, 6)})
+        self.assertEqual(len({row[2] for row in rows[1:]}), 3)
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_conflicting_rates(self, mock_compute_invoice_summary):
+        """Test that files are processed without conflicts, and fail with them."""
+        for conflict_ratio, expected_status in [(0.0, Status.LOADED), (0.5, Status.FAILED)]:
+            timesheet_file = TimeSheetFile.objects.create(
+                file=ContentFile(synthetic_file(200, employees=4, conflict_ratio=conflict_ratio), name='test_synthetic.csv')
+            )
+            process_csv_file(timesheet_file.id)
+
+            timesheet_file.refresh_from_db()
+            self.assertEqual(timesheet_file.status, expected_status)
+
+
+class BenchmarkPipelineCommandTest(TestCase):
+    """Test cases for the benchmark_pipeline management command."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    @override_settings(STATICFILES_STORAGE='whitenoise.storage.CompressedManifestStaticFilesStorage')
+    def test_results_are_written_as_json(self):
+        """
+        Test that every stage is measured and that the database is left unchanged,
+        including the rendering when the static files have not been collected.
+        """
+        output = io.StringIO()
+        call_command('benchmark_pipeline', rows=[50, 100], no_memory=True, stdout=output, stderr=io.StringIO())
+
+        report = json.loads(output.getvalue())
+        self.assertEqual(
+            [(result['rows'], result['stage']) for result in report['results']],
+            [(50, 'ingest'), (50, 'summary'), (50, 'render'), (100, 'ingest'), (100, 'summary'), (100, 'render')]
+        )
+        for result in report['results']:
+            self.assertNotIn('error', result)
+            self.assertGreater(result['queries'], 0)
+
+        self.assertFalse(TimeSheetFile.objects.exists())
+        self.assertFalse(TimesheetInvoice.objects.exists())
+
+    def test_failing_files_stop_at_ingestion(self):
+        """Test that a file with conflicting rates records the error of its ingestion."""
+        output = io.StringIO()
+        call_command(
+            'benchmark_pipeline', rows=[100], conflict_ratio=0.5, employees=4, stdout=output, stderr=io.StringIO()
+        )
+
+        results = json.loads(output.getvalue())['results']
+        self.assertEqual(len(results), 1)
+        self.assertIn("can't have two different values", results[0]['error'])
+        self.assertIsNotNone(results[0]['peak_memory_bytes'])
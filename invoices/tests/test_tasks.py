@@ -24,20 +24,53 @@ Test Cases:
 - test_compute_invoice_summary_correct_values: Verifies that the computed invoice summary reflects the 
   correct total costs and project summaries based on the processed timesheet data.
 
+- test_process_csv_file_fused_mode: Verifies that in fused mode the invoice summary is saved by
+  process_csv_file itself, identical to the one computed by compute_invoice_summary.
+
+- test_process_csv_file_records_progress: Verifies that the number of rows processed is recorded for
+  the status event stream.
+
+- test_process_csv_file_records_stages: Verifies that the time, rows, queries and bytes of the parse,
+  entity resolution, bulk insert, daily rollup and summary stages are recorded for the file.
+
+- test_failed_file_keeps_its_stages: Verifies that the stages of a file that fails are still recorded.
+
+- test_process_csv_file_queries_independent_of_rows: Ensures that the projects, employees and billable
+  rates are resolved with a number of queries that does not grow with the number of rows.
+
+- ChunkedProcessingTests: Verify that large files are split into chunks processed in parallel, whose
+  results are merged into the same summary, that the entities of the file are created before the chunks,
+  which only read them, and that one failing chunk fails and rolls back the whole file.
+
+- OverlappingChunksTests: Verifies on PostgreSQL that chunks loaded in overlapping transactions
+  do not wait for each other.
+
+- AppendProcessingTests: Verify that rows appended to a processed file update its invoice summary to the
+  same values as processing all the rows at once, and that rates conflicting with the file are rejected.
+
 Setup:
 - The `setUp` method creates a mock timesheet file in a pending state to be used in the tests. 
 """
 
+from threading import Barrier, BrokenBarrierError, Thread
 from time import sleep
-from django.test import TestCase
-from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
 from invoices.models import (
-    Employee, Project, TimeSheetFile, BillableRate, TimesheetInvoice, Status, InvoiceSummary
+    Employee, Project, TimeSheetFile, TimeSheetAppend, BillableRate, TimesheetInvoice, Status, InvoiceSummary,
+    ProcessingStage, Stage
 )
 from invoices.utils import convert_decimal_to_string
 from decimal import Decimal
 from django.core.files.base import ContentFile
-from invoices.tasks import process_csv_file, compute_invoice_summary
+from invoices.ingestion import iter_row_batches, resolve_file_entities, split_byte_ranges
+from invoices.status import get_file_states, progress_key
+from invoices.tasks import (
+    process_csv_file, compute_invoice_summary, process_csv_chunk, merge_csv_chunks, append_csv_file
+)
 
 
 class TimeSheetProcessingTests(TestCase):
@@ -251,3 +284,312 @@ class TimeSheetProcessingTests(TestCase):
 
         # Check that the total costs match the expected total costs
         self.assertEqual(project_total_costs, expected_total_costs)
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_process_csv_file_records_progress(self, mock_compute_invoice_summary):
+        process_csv_file(self.timesheet_file.id)
+
+        state = get_file_states([self.timesheet_file.id])[self.timesheet_file.id]
+        self.assertEqual(state, {'status': Status.LOADED, 'rows_processed': 2})
+
+        # The progress is deleted once the file is processed
+        with self.captureOnCommitCallbacks(execute=True):
+            compute_invoice_summary(self.timesheet_file.id)
+        self.assertIsNone(cache.get(progress_key(self.timesheet_file.id)))
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_process_csv_file_records_stages(self, mock_compute_invoice_summary):
+        process_csv_file(self.timesheet_file.id)
+        compute_invoice_summary(self.timesheet_file.id)
+
+        stages = {stage.name: stage for stage in ProcessingStage.objects.filter(file=self.timesheet_file)}
+        self.assertEqual(set(stages), {Stage.PARSE, Stage.RESOLVE, Stage.INSERT, Stage.ROLLUP, Stage.SUMMARY})
+        for stage in stages.values():
+            self.assertEqual(stage.rows, 2)
+            self.assertGreaterEqual(stage.finished_at, stage.started_at)
+        self.assertEqual(stages[Stage.PARSE].bytes_processed, self.timesheet_file.file.size)
+        self.assertGreater(stages[Stage.INSERT].queries, 0)
+
+    def test_failed_file_keeps_its_stages(self):
+        timesheet_file = TimeSheetFile.objects.create(
+            file=ContentFile("Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+                             "1,300,Google,07/01/2019,09:00,17:00\n", name='test_invalid.csv'),
+        )
+        process_csv_file(timesheet_file.id)
+
+        self.assertEqual(
+            list(ProcessingStage.objects.filter(file=timesheet_file).values_list('name', flat=True)), [Stage.PARSE]
+        )
+
+    @mock.patch('invoices.tasks.compute_invoice_summary.delay')
+    def test_process_csv_file_queries_independent_of_rows(self, mock_compute_invoice_summary):
+        header = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+
+        def count_entity_queries(row_count, prefix):
+            # Each run references its own new projects and employees
+            rows = [
+                f"{prefix}1,300,Google {prefix},2019-07-01,09:00,17:00\n",
+                f"{prefix}2,100,Facebook {prefix},2019-07-01,11:00,16:00\n",
+            ]
+            timesheet_file = TimeSheetFile.objects.create(
+                file=ContentFile(header + "".join(rows[i % 2] for i in range(row_count)), name='test_queries.csv'),
+                status=Status.PENDING
+            )
+            with CaptureQueriesContext(connection) as queries:
+                process_csv_file(timesheet_file.id)
+
+            timesheet_file.refresh_from_db()
+            self.assertEqual(timesheet_file.status, Status.LOADED)
+            self.assertEqual(TimesheetInvoice.objects.filter(file=timesheet_file).count(), row_count)
+
+            # Leave out the batched inserts of the timesheet entries themselves
+            return len([
+                query for query in queries.captured_queries
+                if 'INSERT INTO "invoices_timesheetinvoice"' not in query['sql']
+            ])
+
+        self.assertEqual(count_entity_queries(4, 1), count_entity_queries(400, 2))
+
+    def test_process_csv_file_fused_mode(self):
+        csv_content = ("Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+                       "1,300.50,Google,2019-07-01,09:00,09:20\n"
+                       "2,150,Google,2019-07-01,10:00,15:00\n"
+                       "1,300.50,Apple,2019-07-01,11:45,16:00\n"
+                       "1,300.50,Google,2019-07-02,09:00,09:20\n")
+        fused_file = TimeSheetFile.objects.create(file=ContentFile(csv_content, name='test_fused.csv'))
+        two_task_file = TimeSheetFile.objects.create(file=ContentFile(csv_content, name='test_two_tasks.csv'))
+
+        with mock.patch('invoices.tasks.compute_invoice_summary.delay') as mock_compute_invoice_summary:
+            result = process_csv_file(fused_file.id, fused=True)
+            mock_compute_invoice_summary.assert_not_called()
+
+            process_csv_file(two_task_file.id, fused=False)
+            compute_invoice_summary(two_task_file.id)
+
+        fused_file.refresh_from_db()
+        self.assertEqual(fused_file.status, Status.PROCESSED)
+        self.assertEqual(result, f"File {fused_file.id} has been processed and its invoice summary saved.")
+        self.assertEqual(TimesheetInvoice.objects.filter(file=fused_file).count(), 4)
+
+        fused_summary = InvoiceSummary.objects.get(file=fused_file)
+        two_task_summary = InvoiceSummary.objects.get(file=two_task_file)
+        self.assertEqual(fused_summary.project_summary, two_task_summary.project_summary)
+        self.assertEqual(fused_summary.project_total_costs, two_task_summary.project_total_costs)
+        self.assertEqual(fused_summary.project_total_costs, {'Google': '948.33', 'Apple': '1277.13'})
+
+
+class ChunkedProcessingTests(TestCase):
+
+    def setUp(self):
+        self.csv_content = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n" + "".join(
+            f"{i % 7},{100 + i % 7}.25,Project {i % 5},2019-07-{1 + i % 28:02d},09:{i % 60:02d},17:00\n"
+            for i in range(300)
+        )
+        self.timesheet_file = TimeSheetFile.objects.create(file=ContentFile(self.csv_content, name='test_chunks.csv'))
+
+    def load_chunks(self, timesheet_file):
+        # Create the entities and run the chunks the way process_csv_file and the chord would
+        header, byte_ranges = split_byte_ranges(timesheet_file, chunk_size=1024)
+        resolve_file_entities(timesheet_file, iter_row_batches(timesheet_file))
+        return [process_csv_chunk(timesheet_file.id, header, byte_range) for byte_range in byte_ranges]
+
+    def process_in_chunks(self, timesheet_file):
+        return merge_csv_chunks(self.load_chunks(timesheet_file), timesheet_file.id)
+
+    @override_settings(INVOICES_PARALLEL_CHUNK_SIZE=1024)
+    def test_large_file_is_split_into_chunks(self):
+        with mock.patch('invoices.tasks.chord') as mock_chord:
+            result = process_csv_file(self.timesheet_file.id)
+
+        chunks = list(mock_chord.call_args.args[0])
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(result, f"Processing file {self.timesheet_file.id} in {len(chunks)} chunks.")
+        self.assertEqual(TimesheetInvoice.objects.count(), 0)
+        # The entities of the whole file are created before the chunks start
+        self.assertEqual(BillableRate.objects.filter(file=self.timesheet_file).count(), 7)
+        self.assertEqual(Project.objects.count(), 5)
+
+    def test_chunks_only_read_entities(self):
+        header, byte_ranges = split_byte_ranges(self.timesheet_file, chunk_size=1024)
+        resolve_file_entities(self.timesheet_file, iter_row_batches(self.timesheet_file))
+
+        with CaptureQueriesContext(connection) as queries:
+            for byte_range in byte_ranges:
+                self.assertNotIn('error', process_csv_chunk(self.timesheet_file.id, header, byte_range))
+
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        for table in ('invoices_project', 'invoices_employee', 'invoices_billablerate'):
+            self.assertFalse([sql for sql in inserts if f'"{table}"' in sql], table)
+
+    def test_chunk_of_unresolved_entities_fails(self):
+        header, [byte_range, *_] = split_byte_ranges(self.timesheet_file, chunk_size=1024)
+
+        result = process_csv_chunk(self.timesheet_file.id, header, byte_range)
+
+        self.assertIn("must be created before its rows are loaded", result['error'])
+        self.assertFalse(TimesheetInvoice.objects.exists())
+
+    def test_chunks_give_the_same_summary(self):
+        result = self.process_in_chunks(self.timesheet_file)
+
+        self.timesheet_file.refresh_from_db()
+        self.assertEqual(self.timesheet_file.status, Status.PROCESSED)
+        self.assertEqual(result, f"File {self.timesheet_file.id} has been processed and its invoice summary saved.")
+        self.assertEqual(TimesheetInvoice.objects.filter(file=self.timesheet_file).count(), 300)
+
+        single_task_file = TimeSheetFile.objects.create(file=ContentFile(self.csv_content, name='test_single.csv'))
+        process_csv_file(single_task_file.id, fused=True)
+
+        chunked_summary = InvoiceSummary.objects.get(file=self.timesheet_file)
+        single_task_summary = InvoiceSummary.objects.get(file=single_task_file)
+        self.assertEqual(chunked_summary.project_summary, single_task_summary.project_summary)
+        self.assertEqual(list(chunked_summary.project_summary), list(single_task_summary.project_summary))
+        self.assertEqual(chunked_summary.project_total_costs, single_task_summary.project_total_costs)
+
+    def test_failing_chunk_rolls_back_the_file(self):
+        results = self.load_chunks(self.timesheet_file)
+        results[-1] = {'error': "Failed to load the chunk."}
+
+        result = merge_csv_chunks(results, self.timesheet_file.id)
+
+        self.timesheet_file.refresh_from_db()
+        self.assertEqual(self.timesheet_file.status, Status.FAILED)
+        self.assertIn("Failed to load the chunk.", result)
+        self.assertFalse(TimesheetInvoice.objects.filter(file=self.timesheet_file).exists())
+        self.assertFalse(BillableRate.objects.filter(file=self.timesheet_file).exists())
+        self.assertFalse(InvoiceSummary.objects.filter(file=self.timesheet_file).exists())
+
+    @override_settings(INVOICES_PARALLEL_CHUNK_SIZE=1024)
+    def test_invalid_row_fails_the_file_before_the_chunks(self):
+        self.timesheet_file.file = ContentFile(self.csv_content + "1,101.25,Project 1,07-01-2019,09:00,17:00\n",
+                                               name='test_chunks_invalid.csv')
+        self.timesheet_file.save()
+
+        with mock.patch('invoices.tasks.chord') as mock_chord:
+            result = process_csv_file(self.timesheet_file.id)
+
+        mock_chord.assert_not_called()
+        self.timesheet_file.refresh_from_db()
+        self.assertEqual(self.timesheet_file.status, Status.FAILED)
+        self.assertIn("Date/Time format error", result)
+        self.assertFalse(BillableRate.objects.filter(file=self.timesheet_file).exists())
+
+    @override_settings(INVOICES_PARALLEL_CHUNK_SIZE=1024)
+    def test_rate_conflict_between_chunks(self):
+        self.timesheet_file.file = ContentFile(self.csv_content + "1,999,Project 1,2019-07-01,09:00,17:00\n",
+                                               name='test_chunks_conflict.csv')
+        self.timesheet_file.save()
+
+        with mock.patch('invoices.tasks.chord') as mock_chord:
+            result = process_csv_file(self.timesheet_file.id)
+
+        mock_chord.assert_not_called()
+        self.timesheet_file.refresh_from_db()
+        self.assertEqual(self.timesheet_file.status, Status.FAILED)
+        self.assertIn("Billable rate for employee 1 in same file can't have two different values", result)
+        self.assertFalse(BillableRate.objects.filter(file=self.timesheet_file).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite runs one write transaction at a time.')
+class OverlappingChunksTests(TransactionTestCase):
+
+    def test_chunk_transactions_overlap(self):
+        csv_content = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n" + "".join(
+            f"{i % 7},{100 + i % 7}.25,Project {i % 5},2019-07-{1 + i % 28:02d},09:{i % 60:02d},17:00\n"
+            for i in range(300)
+        )
+        timesheet_file = TimeSheetFile.objects.create(file=ContentFile(csv_content, name='test_overlap.csv'))
+        header, byte_ranges = split_byte_ranges(timesheet_file, chunk_size=4096)
+        resolve_file_entities(timesheet_file, iter_row_batches(timesheet_file))
+
+        # Every chunk keeps its transaction open until all of them have loaded their rows,
+        # which times out if a chunk waits on the uncommitted inserts of another one
+        barrier = Barrier(len(byte_ranges), timeout=30)
+        results = [None] * len(byte_ranges)
+
+        def load_chunk(index, byte_range):
+            try:
+                with transaction.atomic():
+                    results[index] = process_csv_chunk(timesheet_file.id, header, byte_range)
+                    barrier.wait()
+            except BrokenBarrierError:
+                results[index] = {'error': "Chunks waited for each other."}
+            finally:
+                connection.close()
+
+        threads = [Thread(target=load_chunk, args=item) for item in enumerate(byte_ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertGreater(len(byte_ranges), 1)
+        self.assertEqual([result for result in results if 'error' in result], [])
+
+        merge_csv_chunks(results, timesheet_file.id)
+        timesheet_file.refresh_from_db()
+        self.assertEqual(timesheet_file.status, Status.PROCESSED)
+        self.assertEqual(TimesheetInvoice.objects.filter(file=timesheet_file).count(), 300)
+
+
+class AppendProcessingTests(TestCase):
+
+    header = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+    rows = ("1,300.50,Google,2019-07-01,09:00,09:20\n"
+            "2,150,Google,2019-07-01,10:00,15:00\n"
+            "1,300.50,Apple,2019-07-01,11:45,16:00\n")
+    appended_rows = ("1,300.50,Google,2019-07-08,09:00,09:20\n"
+                     "3,99.99,Amazon,2019-07-08,13:10,14:00\n"
+                     "2,150,Google,2019-07-09,10:00,10:20\n")
+
+    def setUp(self):
+        self.timesheet_file = TimeSheetFile.objects.create(file=ContentFile(self.header + self.rows, name='test_month.csv'))
+        process_csv_file(self.timesheet_file.id, fused=True)
+
+    def append(self, rows):
+        timesheet_append = TimeSheetAppend.objects.create(
+            timesheet_file=self.timesheet_file,
+            file=ContentFile(self.header + rows, name='test_week.csv')
+        )
+        result = append_csv_file(timesheet_append.id)
+        timesheet_append.refresh_from_db()
+        return timesheet_append, result
+
+    def test_append_matches_processing_everything(self):
+        timesheet_append, result = self.append(self.appended_rows)
+
+        self.assertEqual(timesheet_append.status, Status.PROCESSED)
+        self.assertEqual(result, f"Rows {timesheet_append.id} have been appended to file {self.timesheet_file.id}.")
+        self.assertEqual(TimesheetInvoice.objects.filter(file=self.timesheet_file).count(), 6)
+
+        whole_file = TimeSheetFile.objects.create(
+            file=ContentFile(self.header + self.rows + self.appended_rows, name='test_whole.csv')
+        )
+        process_csv_file(whole_file.id, fused=True)
+
+        appended_summary = InvoiceSummary.objects.get(file=self.timesheet_file)
+        whole_summary = InvoiceSummary.objects.get(file=whole_file)
+        self.assertEqual(appended_summary.project_summary, whole_summary.project_summary)
+        self.assertEqual(appended_summary.project_total_costs, whole_summary.project_total_costs)
+
+    def test_append_to_summary_without_entry_groups(self):
+        # Summaries saved before entry groups were kept are computed again from the entries
+        InvoiceSummary.objects.filter(file=self.timesheet_file).update(entry_groups=[])
+
+        timesheet_append, _ = self.append(self.appended_rows)
+
+        self.assertEqual(timesheet_append.status, Status.PROCESSED)
+        summary = InvoiceSummary.objects.get(file=self.timesheet_file)
+        self.assertEqual(summary.project_total_costs['Amazon'], '82.99')
+        self.assertNotEqual(summary.entry_groups, [])
+
+    def test_append_rate_conflict(self):
+        summary_before = InvoiceSummary.objects.get(file=self.timesheet_file)
+
+        timesheet_append, result = self.append("2,175,Google,2019-07-09,10:00,12:00\n")
+
+        self.assertEqual(timesheet_append.status, Status.FAILED)
+        self.assertIn("Billable rate for employee 2 in same file can't have two different values", result)
+        self.assertEqual(TimesheetInvoice.objects.filter(file=self.timesheet_file).count(), 3)
+        summary_after = InvoiceSummary.objects.get(file=self.timesheet_file)
+        self.assertEqual(summary_after.project_total_costs, summary_before.project_total_costs)
@@ -1,11 +1,23 @@
 """
 Test suite for the utility functions in the invoices app.
 """
+from io import BytesIO
 from django.test import TestCase
-from invoices.utils import convert_decimal_to_string
+from invoices.utils import convert_decimal_to_string, read_csv_head
 from decimal import Decimal
 
 
+class CountingFile(BytesIO):
+    """In-memory file counting the bytes read from it."""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
 class ConvertDecimalToStringTest(TestCase):
     """
     Test suite for the convert_decimal_to_string utility function.
@@ -62,3 +74,44 @@ class ConvertDecimalToStringTest(TestCase):
                 "is_active": True
             }
         )
+
+
+class ReadCsvHeadTest(TestCase):
+    """
+    Test suite for the read_csv_head utility function.
+    """
+
+    header = "Employee ID,Billable Rate (per hour),Project,Date,Start Time,End Time\n"
+
+    def test_reads_only_the_beginning_of_the_file(self):
+        """
+        Test that the header and first row are found without reading the rest of a large file.
+        """
+        csv_file = CountingFile((self.header + "1,300,Google,2019-07-01,09:00,17:00\n" * 100000).encode())
+
+        header, first_row = read_csv_head(csv_file, chunk_size=1024)
+
+        self.assertEqual(header, self.header.strip().split(','))
+        self.assertEqual(first_row, ['1', '300', 'Google', '2019-07-01', '09:00', '17:00'])
+        self.assertEqual(csv_file.bytes_read, 1024)
+        self.assertEqual(csv_file.tell(), 0)
+
+    def test_rows_split_across_chunks(self):
+        """
+        Test that rows and multi-byte characters cut by the end of a chunk are read whole.
+        """
+        csv_file = CountingFile((self.header + "\n\n1,300,Société Générale,2019-07-01,09:00,17:00\n").encode())
+
+        header, first_row = read_csv_head(csv_file, chunk_size=7)
+
+        self.assertEqual(header, self.header.strip().split(','))
+        self.assertEqual(first_row[2], 'Société Générale')
+
+    def test_header_only(self):
+        """
+        Test that no first row is returned for a file containing only the header.
+        """
+        header, first_row = read_csv_head(CountingFile(self.header.encode()), chunk_size=16)
+
+        self.assertEqual(header, self.header.strip().split(','))
+        self.assertIsNone(first_row)
@@ -0,0 +1,69 @@
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Upload handler computing the SHA-256 of each uploaded file while it is received.
+
+    It must come first in FILE_UPLOAD_HANDLERS: the data is passed on unchanged to the
+    next handlers, which store the file, and the hashes are made available to the views
+    in ``request.upload_content_hashes``, as a list per field name in the order the files
+    were received.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request.upload_content_hashes = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_content_hashes.setdefault(self.field_name, []).append(self.sha256.hexdigest())
+        # Let the next handlers return the file
+        return None
+
+
+def streamed_content_hashes(request, field_name):
+    """
+    Return the SHA-256 computed by the upload handler of each file uploaded in a field, in
+    the order of ``request.FILES.getlist``, or None for each file if it did not hash them.
+    """
+    uploaded_files = request.FILES.getlist(field_name)
+    content_hashes = getattr(request, 'upload_content_hashes', {}).get(field_name, [])
+
+    if len(content_hashes) != len(uploaded_files):
+        return [None] * len(uploaded_files)
+
+    return content_hashes
+
+
+def get_content_hash(request, field_name):
+    """
+    Return the SHA-256 of an uploaded file, computing it from the file if the
+    upload handler did not.
+    """
+    # Like request.FILES[field_name], the last file of the field is used
+    content_hashes = streamed_content_hashes(request, field_name)
+    content_hash = content_hashes[-1] if content_hashes else None
+
+    if content_hash is None:
+        content_hash = hash_file(request.FILES[field_name])
+
+    return content_hash
+
+
+def hash_file(uploaded_file):
+    """
+    Return the SHA-256 of an uploaded file, read a chunk at a time, and rewind it.
+    """
+    sha256 = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        sha256.update(chunk)
+    uploaded_file.seek(0)
+    return sha256.hexdigest()
@@ -1,9 +1,30 @@
 from django.urls import path
-from .views import IndexView, UploadCSVView, InvoicesView, StatusView
+from .views import (
+    IndexView, UploadCSVView, InvoicesView, StatusView, StatusEventsView, BatchStatusView,
+    AppendCSVView, AppendStatusView, LineItemsExportView, SummaryExportView,
+    InvoicePDFView, StagesView, ReportView, AnalyticsView, BatchUploadView, UploadBatchStatusView,
+    ChunkedUploadView, ChunkedUploadStatusView, ChunkedUploadPartView, ChunkedUploadCompleteView
+)
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
     path('upload/', UploadCSVView.as_view(), name='upload_csv'),
+    path('upload/batch/', BatchUploadView.as_view(), name='upload_batch'),
+    path('upload/chunked/', ChunkedUploadView.as_view(), name='start_chunked_upload'),
+    path('upload/chunked/<uuid:upload_id>/', ChunkedUploadStatusView.as_view(), name='upload_chunked'),
+    path('upload/chunked/<uuid:upload_id>/parts/<int:number>/', ChunkedUploadPartView.as_view(), name='upload_chunked_part'),
+    path('upload/chunked/<uuid:upload_id>/complete/', ChunkedUploadCompleteView.as_view(), name='upload_chunked_complete'),
     path('invoices/<uuid:file_id>/', InvoicesView.as_view(), name='view_invoices'),
+    path('invoices/<uuid:file_id>/pdf/', InvoicePDFView.as_view(), name='invoice_pdf'),
+    path('invoices/<uuid:file_id>/export/line-items.<str:export_format>', LineItemsExportView.as_view(), name='export_line_items'),
+    path('invoices/<uuid:file_id>/export/summary.<str:export_format>', SummaryExportView.as_view(), name='export_summary'),
     path('status/<uuid:file_id>/', StatusView.as_view(), name='upload_status'),
+    path('status/<uuid:file_id>/events/', StatusEventsView.as_view(), name='upload_status_events'),
+    path('status/<uuid:file_id>/stages/', StagesView.as_view(), name='file_stages'),
+    path('status/batch/', BatchStatusView.as_view(), name='batch_status'),
+    path('status/upload-batch/<uuid:batch_id>/', UploadBatchStatusView.as_view(), name='upload_batch_status'),
+    path('upload/<uuid:file_id>/append/', AppendCSVView.as_view(), name='append_csv'),
+    path('status/append/<uuid:append_id>/', AppendStatusView.as_view(), name='append_status'),
+    path('reports/', ReportView.as_view(), name='report'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
 ]
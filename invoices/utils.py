@@ -1,4 +1,11 @@
+import codecs
+import csv
 from decimal import Decimal, ROUND_HALF_UP
+from io import StringIO
+
+
+# Number of bytes read at a time when looking for the first rows of an uploaded CSV file
+CSV_HEAD_SIZE = 8 * 1024
 
 
 def convert_decimal_to_string(data):
@@ -15,3 +22,88 @@ def convert_decimal_to_string(data):
         return f"{rounded_data:.2f}"
     else:
         return data
+
+
+def invoice_page_cache_key(file_id):
+    """
+    Return the cache key of the rendered invoice summary page of a file.
+    """
+    return f'invoices:summary-page:{file_id}'
+
+
+def read_csv_head(csv_file, chunk_size=CSV_HEAD_SIZE):
+    """
+    Read the header and the first non-empty data row of an uploaded CSV file.
+    Only the beginning of the file is read, a chunk at a time until both rows are found,
+    and the file is rewound afterwards so it can be saved as it is.
+    Returns a (header, first_row) tuple, where either may be None if it is missing.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    text = ''
+    csv_file.seek(0)
+
+    try:
+        while True:
+            chunk = csv_file.read(chunk_size)
+            text += decoder.decode(chunk, final=not chunk)
+
+            lines = StringIO(text, newline=None).readlines()
+            if chunk and lines and not lines[-1].endswith('\n'):
+                # The last line may continue in the next chunk
+                lines.pop()
+
+            rows = csv.reader(lines)
+            header = next(rows, None)
+            first_row = next((row for row in rows if row), None)
+
+            if first_row is not None or not chunk:
+                return header, first_row
+
+    finally:
+        csv_file.seek(0)
+
+
+def csv_upload_error(csv_file):
+    """
+    Check that an uploaded file is a CSV file with the expected header and at least one row.
+    Returns the error message and the HTTP status of the error if it is not, otherwise None.
+    """
+    if not csv_file:
+        return 'No file was uploaded.', 400
+    
+    if not (csv_file.name.endswith('.csv') or csv_file.content_type == 'text/csv'):
+        return 'File is not in CSV format. Please upload a CSV file.', 400
+    
+    if csv_file.size == 0:
+        return 'File is empty.', 400
+    
+    # Expected headers in the exact order
+    expected_headers = [
+        'Employee ID',
+        'Billable Rate (per hour)',
+        'Project',
+        'Date',
+        'Start Time',
+        'End Time'
+    ]            
+    
+    # Read only the beginning of the CSV file, the rest is left to the Celery task
+    try:
+        # The header row should be the first row, per guidelines
+        header, first_row = read_csv_head(csv_file)
+        
+        if not header:
+            return 'CSV file does not contain a header or does not conform to the guidelines! Please read the guidelines.', 400
+
+        # Check if the header row matches the expected headers
+        if header != expected_headers:
+            return 'Invalid CSV file. Please ensure the file has the correct headers in their right/specified order.', 400
+
+        # Check if there are any rows after the header
+        if first_row is None:
+            return 'CSV file contains only the header.', 400
+    
+    except Exception as e:
+        return f'Error reading the file: {str(e)}', 500
+
+    return None
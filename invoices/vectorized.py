@@ -0,0 +1,138 @@
+from datetime import timedelta
+from decimal import Decimal
+from .summary import hours_groups, summarize
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional, only the 'numpy' summary backend needs it
+    np = None
+
+
+# Largest magnitude of the intermediate integer totals, kept clear of the int64 limit
+MAX_INT64_TOTAL = 2 ** 62
+
+
+def numpy_available():
+    return np is not None
+
+
+def to_decimal(value, exponent):
+    """
+    Return an integer number of 10**exponent units as a Decimal, e.g. cents with exponent -2.
+    """
+    return Decimal(int(value)).scaleb(exponent)
+
+
+def round_half_up(values, unit):
+    """
+    Divide integer amounts by ``unit``, rounding halves away from zero like ROUND_HALF_UP.
+    """
+    half = unit // 2
+    return np.where(values >= 0, (values + half) // unit, -((-values + half) // unit))
+
+
+def summarize_vectorized(accumulator):
+    """
+    Summarize the groups of an accumulator like summarize, with the totals computed as NumPy
+    integer arrays: hours in hundredths, unit prices in cents and costs in ten-thousandths.
+    Groups are reduced per project and employee by sorting them on a combined key.
+
+    The amounts are those of the Decimal backend to the cent. The Decimal backend adds up
+    hours converted from floats, whose tiny errors only matter for totals falling exactly
+    on a half cent or netting to zero: projects with such a total are summarized with the
+    Decimal backend, as are summaries with durations or prices that are not whole minutes
+    or cents.
+    """
+    groups = list(accumulator.duration_groups())
+    if not groups:
+        return {}, {}
+
+    project_codes = {}
+    employee_codes = {}
+    columns = []
+
+    for project_name, employee_id, unit_price, duration, entries in groups:
+        minutes, remainder = divmod(duration, timedelta(minutes=1))
+        rate_cents = unit_price * 100
+
+        if remainder or rate_cents != rate_cents.to_integral_value():
+            return summarize(hours_groups(groups))
+
+        columns.append((
+            project_codes.setdefault(project_name, len(project_codes)),
+            employee_codes.setdefault(employee_id, len(employee_codes)),
+            minutes,
+            int(rate_cents),
+            entries,
+        ))
+
+    project, employee, minutes, rate, entries = (np.array(column, dtype=np.int64) for column in zip(*columns))
+
+    # Hours worked per entry in hundredths, rounded like hours_worked (no duration in whole
+    # minutes falls on a half hundredth)
+    hours = (minutes * 100 + 30) // 60
+
+    if int(np.abs(hours).max()) * int(np.abs(rate).max()) * int(entries.sum()) >= MAX_INT64_TOTAL:
+        return summarize(hours_groups(groups))
+
+    # Sort the groups by project and employee, keeping their order within each pair
+    key = project * len(employee_codes) + employee
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+    ends = np.r_[starts[1:], len(key)]
+
+    total_hours = np.add.reduceat((hours * entries)[order], starts)
+    total_costs = np.add.reduceat((hours * rate * entries)[order], starts)
+    first_group = order[starts]
+    last_group = order[ends - 1]
+    pair_project = sorted_key[starts] // len(employee_codes)
+
+    # Pairs are sorted by project, so the totals of the projects are reduced the same way
+    project_starts = np.flatnonzero(np.r_[True, pair_project[1:] != pair_project[:-1]])
+    project_costs = np.add.reduceat(total_costs, project_starts)
+
+    # Totals on a half cent depend on the float errors of the Decimal backend, and so does
+    # the sign of zero totals netted from negative and positive hours ("-0.00" or "0.00")
+    pair_negative = np.minimum.reduceat(hours[order], starts) < 0
+    project_negative = np.logical_or.reduceat(pair_negative, project_starts)
+    pair_zero = pair_negative & ((total_hours == 0) | (total_costs == 0))
+    project_zero = project_negative & (project_costs == 0)
+
+    undecided = set(pair_project[(total_costs % 100 == 50) | pair_zero].tolist())
+    undecided.update(pair_project[project_starts][(project_costs % 100 == 50) | project_zero].tolist())
+
+    cost_cents = round_half_up(total_costs, 100)
+    project_cents = round_half_up(project_costs, 100)
+
+    # Projects in order of first appearance, and their employees as well
+    pairs = np.lexsort((first_group, pair_project))
+    project_names = list(project_codes)
+
+    project_summary = {}
+    project_total_costs = {}
+
+    # Project codes follow the order of first appearance, as do the reduced projects
+    for code, project_name in enumerate(project_names):
+        project_summary[project_name] = []
+        project_total_costs[project_name] = to_decimal(project_cents[code], -2)
+
+    for pair in pairs.tolist():
+        project_name = project_names[pair_project[pair]]
+        project_summary[project_name].append({
+            'employee_id': groups[first_group[pair]][1],
+            'total_hours': to_decimal(total_hours[pair], -2),
+            'unit_price': groups[last_group[pair]][2],
+            'cost': to_decimal(cost_cents[pair], -2),
+        })
+
+    for code in undecided:
+        project_name = project_names[code]
+        decimal_summary, decimal_total_costs = summarize(
+            hours_groups(group for group in groups if group[0] == project_name)
+        )
+        project_summary[project_name] = decimal_summary[project_name]
+        project_total_costs[project_name] = decimal_total_costs[project_name]
+
+    return project_summary, project_total_costs
@@ -1,11 +1,47 @@
-import csv
-from io import TextIOWrapper
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
+import hashlib
+import json
+from itertools import chain
+from uuid import UUID
+from celery import group
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from django.utils.text import slugify
 from django.views import View
 from django.views.generic import TemplateView
-from .models import  InvoiceSummary, Status, TimeSheetFile
-from .tasks import process_csv_file
+from .analytics import cached_totals
+from .batches import iter_archive_members
+from .chunked import accept_part, save_part
+from .exports import iter_async, stream_line_items, stream_summary
+from .instrumentation import StageMetrics
+from .models import  ChunkedUpload, InvoiceSummary, ProcessingStage, Stage, Status, TimeSheetAppend, TimeSheetFile, UploadBatch
+from .pdf import get_invoice_pdf
+from .rollup import REPORT_GROUPS, rollup_report
+from .status import get_batch_state, get_file_states, status_events
+from .tasks import append_csv_file, assemble_chunked_upload, process_csv_file
+from .upload_handlers import get_content_hash, hash_file, streamed_content_hashes
+from .utils import convert_decimal_to_string, csv_upload_error, invoice_page_cache_key
+
+
+def validate_csv_upload(csv_file):
+    """
+    Check that an uploaded file is a CSV file with the expected header and at least one row.
+    Returns the JSON error response if it is not, otherwise None.
+    """
+    error = csv_upload_error(csv_file)
+    if error:
+        message, status = error
+        return JsonResponse({'error': message}, status=status)
+
+    return None
 
 
 class IndexView(TemplateView):
@@ -17,66 +53,48 @@ class IndexView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Billable Hours'
+        # Status events are only pushed as they happen when served through ASGI, the page polls otherwise
+        context['status_events'] = isinstance(self.request, ASGIRequest)
         return context
 
 
 class UploadCSVView(View):
     """
     View to handle the uploading of a CSV file.
+    A file identical to one already uploaded returns the existing file and its summary,
+    unless the 'force' field is set to 'true' to process it again.
     """
     def post(self, request):
         if request.method == 'POST':
             csv_file = request.FILES.get('csvFile')
+            metrics = StageMetrics()
             
-            if not csv_file:
-                return JsonResponse({'error': 'No file was uploaded.'}, status=400)
-            
-            if not (csv_file.name.endswith('.csv') or csv_file.content_type == 'text/csv'):
-                return JsonResponse({'error': 'File is not in CSV format. Please upload a CSV file.'}, status=400)
-            
-            if csv_file.size == 0:
-                return JsonResponse({'error': 'File is empty.'}, status=400)
-            
-            # Expected headers in the exact order
-            expected_headers = [
-                'Employee ID',
-                'Billable Rate (per hour)',
-                'Project',
-                'Date',
-                'Start Time',
-                'End Time'
-            ]            
-            
-            # Open and read the CSV file to check if it's empty
-            try:
-                # Read the CSV content
-                decoded_file = TextIOWrapper(csv_file, encoding='utf-8')
-                csv_reader = csv.reader(decoded_file)
-
-                # Skip the header row (assuming the first row is the header)
-                # Per guidelines, the header row should be the first row
-                header = next(csv_reader, None)
-                
-                if not header:
-                    return JsonResponse(
-                        {
-                            'error': 'CSV file does not contain a header or does not conform to the guidelines! Please read the guidelines.'}, status=400)
-
-                # Check if the header row matches the expected headers
-                if header != expected_headers:
-                    return JsonResponse(
-                        {'error': 'Invalid CSV file. Please ensure the file has the correct headers in their right/specified order.'}, status=400)
-
-                # Check if there are any rows after the header
-                if not any(csv_reader):
-                    return JsonResponse({'error': 'CSV file contains only the header.'}, status=400)
-            
-            except Exception as e:
-                return JsonResponse({'error': f'Error reading the file: {str(e)}'}, status=500)
-            
-        
+            # Check the file and its header
+            with metrics.measure(Stage.VALIDATE) as validation:
+                error_response = validate_csv_upload(csv_file)
+                if error_response:
+                    return error_response
+
+                content_hash = get_content_hash(request, 'csvFile')
+                validation.add_rows(1)
+                validation.add_bytes(csv_file.size)
+
+            # Unless reprocessing is forced, the same file uploaded again is not processed again
+            if request.POST.get('force') != 'true':
+                existing_file = TimeSheetFile.objects.filter(
+                    content_hash=content_hash
+                ).exclude(status=Status.FAILED).order_by('-uploaded_at').first()
+
+                if existing_file:
+                    return JsonResponse(self.already_uploaded(existing_file))
+
             # Save the uploaded CSV file to the TimeSheetFile model
-            timesheet_file = TimeSheetFile.objects.create(file=csv_file)
+            # (a file uploaded to a temporary file is moved to the storage rather than copied)
+            with metrics.measure(Stage.STORE) as storage:
+                timesheet_file = TimeSheetFile.objects.create(file=csv_file, content_hash=content_hash)
+                storage.add_bytes(csv_file.size)
+
+            metrics.save(timesheet_file.id)
 
             # Trigger Celery task to process the CSV file asynchronously
             process_csv_file.delay(timesheet_file.id)
@@ -91,6 +109,307 @@ class UploadCSVView(View):
 
         return JsonResponse({'error': 'Invalid request method'}, status=400)
 
+    def already_uploaded(self, timesheet_file):
+        """
+        Build the response for a file identical to one uploaded before,
+        including its invoice summary if it has already been processed.
+        """
+        data = {
+            'message': 'This file has already been uploaded.',
+            'file_id': timesheet_file.id,
+            'status': timesheet_file.status,
+        }
+
+        invoice_summary = InvoiceSummary.objects.filter(file=timesheet_file).first()
+        if invoice_summary:
+            data['project_summary'] = invoice_summary.project_summary
+            data['project_total_costs'] = invoice_summary.project_total_costs
+
+        return data
+
+
+class AppendCSVView(View):
+    """
+    View to handle the uploading of rows to append to a file that has already been processed.
+    Only the appended rows are processed, and the invoice summary is updated from them.
+    """
+    def post(self, request, file_id):
+        timesheet_file = get_object_or_404(TimeSheetFile, id=file_id)
+
+        if timesheet_file.status != Status.PROCESSED:
+            return JsonResponse({'error': 'Rows can only be appended to a file that has been processed.'}, status=400)
+
+        csv_file = request.FILES.get('csvFile')
+
+        # Check the file and its header
+        error_response = validate_csv_upload(csv_file)
+        if error_response:
+            return error_response
+
+        timesheet_append = TimeSheetAppend.objects.create(timesheet_file=timesheet_file, file=csv_file)
+
+        # Trigger Celery task to append the rows asynchronously
+        append_csv_file.delay(timesheet_append.id)
+
+        return JsonResponse(
+            {
+                'message': 'Rows uploaded successfully. Processing commenced.',
+                'file_id': timesheet_file.id,
+                'append_id': timesheet_append.id
+            }
+        )
+
+
+class BatchUploadView(View):
+    """
+    View to handle the uploading of many CSV files at once, as a ZIP archive (the 'archive' field)
+    and/or as several files of the 'csvFiles' field.
+
+    Each file is checked like a single upload. The valid ones are saved as the files of a new
+    UploadBatch and processed in parallel, and the invalid ones are reported by name.
+    Files identical to ones already uploaded are processed again, as part of the batch.
+    """
+    max_files = 200
+    # Total size of the files of an archive once extracted
+    max_archive_size = 1024 * 1024 * 1024
+
+    def post(self, request):
+        archive = request.FILES.get('archive')
+        csv_files = request.FILES.getlist('csvFiles')
+
+        if not archive and not csv_files:
+            return JsonResponse({'error': 'No file was uploaded.'}, status=400)
+
+        if len(csv_files) > self.max_files:
+            return JsonResponse({'error': f'At most {self.max_files} files can be uploaded at once.'}, status=400)
+
+        # The files are hashed while they are received, the members of an archive once extracted
+        uploads = zip(csv_files, streamed_content_hashes(request, 'csvFiles'))
+        try:
+            if archive:
+                members = iter_archive_members(archive, self.max_files - len(csv_files), self.max_archive_size)
+                uploads = chain(uploads, members)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        files, errors = [], []
+
+        try:
+            with transaction.atomic():
+                batch = UploadBatch.objects.create(name=archive.name if archive else '')
+
+                for csv_file, content_hash in uploads:
+                    timesheet_file = self.save_file(batch, csv_file, content_hash, errors)
+                    if timesheet_file:
+                        files.append(timesheet_file)
+
+                if not files:
+                    # Nothing to process, keep no empty batch
+                    transaction.set_rollback(True)
+
+        except ValueError as e:
+            # A member of the archive cannot be extracted, the files saved so far are rolled back
+            for timesheet_file in files:
+                timesheet_file.file.delete(save=False)
+            return JsonResponse({'error': str(e)}, status=400)
+
+        if not files:
+            return JsonResponse({'error': 'None of the files can be processed.', 'errors': errors}, status=400)
+
+        # Process the files in parallel once they are committed
+        file_ids = [timesheet_file.id for timesheet_file in files]
+        transaction.on_commit(lambda: group(process_csv_file.s(file_id) for file_id in file_ids).apply_async())
+
+        return JsonResponse(
+            {
+                'message': f'{len(files)} files uploaded successfully. Processing commenced.',
+                'batch_id': batch.id,
+                **get_batch_state(batch.id),
+                'errors': errors,
+            }
+        )
+
+    def save_file(self, batch, csv_file, content_hash, errors):
+        """
+        Check a file of the batch and save it, recording its stages like a single upload.
+        Returns the saved TimeSheetFile, or None if the file is invalid, in which case its error is added to errors.
+        """
+        metrics = StageMetrics()
+
+        with metrics.measure(Stage.VALIDATE) as validation:
+            error = csv_upload_error(csv_file)
+            if error:
+                errors.append({'name': csv_file.name, 'error': error[0]})
+                return None
+
+            content_hash = content_hash or hash_file(csv_file)
+            validation.add_rows(1)
+            validation.add_bytes(csv_file.size)
+
+        with metrics.measure(Stage.STORE) as storage:
+            timesheet_file = TimeSheetFile.objects.create(file=csv_file, content_hash=content_hash, batch=batch)
+            storage.add_bytes(csv_file.size)
+
+        metrics.save(timesheet_file.id)
+        return timesheet_file
+
+
+def chunked_upload_state(upload):
+    """
+    Return what a client needs to know to resume a chunked upload.
+    """
+    return {
+        'upload_id': upload.id,
+        'name': upload.name,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'parts': upload.part_count,
+        'parts_received': upload.parts_received,
+        'status': upload.status,
+        'message': upload.error_message,
+        'file_id': upload.file_id,
+    }
+
+
+class ChunkedUploadView(View):
+    """
+    View to start the upload of a CSV file in parts, given its `name` and `size` in bytes.
+
+    The parts are then sent in order with PUT requests to the `upload_chunked_part` URL,
+    each of `chunk_size` bytes but the last, and the upload is completed with a POST to
+    the `upload_chunked_complete` URL. An interrupted upload is resumed after the number
+    of parts received returned by the `upload_chunked` URL, unless it has not received a part
+    for INVOICES_UPLOAD_EXPIRY seconds and was deleted by the delete_stale_uploads command.
+    """
+    def post(self, request):
+        name = request.POST.get('name', '')
+        size = request.POST.get('size', '')
+
+        if not name.endswith('.csv'):
+            return JsonResponse({'error': 'File is not in CSV format. Please upload a CSV file.'}, status=400)
+
+        if not size.isdigit() or int(size) == 0:
+            return JsonResponse({'error': 'The size of the file must be a positive number of bytes.'}, status=400)
+
+        if int(size) > settings.INVOICES_UPLOAD_MAX_SIZE:
+            return JsonResponse(
+                {'error': f'Files larger than {settings.INVOICES_UPLOAD_MAX_SIZE} bytes cannot be uploaded.'}, status=413
+            )
+
+        upload = ChunkedUpload.objects.create(
+            name=name, size=int(size), chunk_size=settings.INVOICES_UPLOAD_CHUNK_SIZE
+        )
+        return JsonResponse(chunked_upload_state(upload))
+
+
+class ChunkedUploadStatusView(View):
+    """
+    View to return the progress of a chunked upload, to resume it.
+    """
+    def get(self, request, upload_id):
+        upload = get_object_or_404(ChunkedUpload, id=upload_id)
+        return JsonResponse(chunked_upload_state(upload))
+
+
+class ChunkedUploadPartView(View):
+    """
+    View to receive a part of a chunked upload, written to storage as it is received.
+    Parts are numbered from 1 and are sent in order; a part already received is acknowledged
+    again without being written, so a client unsure of the last part sent can send it again.
+    """
+    def put(self, request, upload_id, number):
+        upload = get_object_or_404(ChunkedUpload, id=upload_id)
+
+        error = self.part_error(upload, number)
+        if error:
+            return error
+
+        expected_size = upload.part_size(number)
+        if request.META.get('CONTENT_LENGTH') != str(expected_size):
+            return JsonResponse({'error': f'Part {number} must be {expected_size} bytes long.'}, status=400)
+
+        # The body is streamed to storage, not read in memory, and out of the transaction,
+        # so that a slow client does not hold the lock of the upload
+        temporary_path, size = save_part(upload, number, request)
+
+        try:
+            if size != expected_size:
+                return JsonResponse({'error': f'Part {number} was not received completely.'}, status=400)
+
+            with transaction.atomic():
+                # Parts of the same upload are accepted one at a time
+                upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), id=upload_id)
+
+                # The same part may have been received in the meantime
+                error = self.part_error(upload, number)
+                if error:
+                    return error
+
+                accept_part(upload, number, temporary_path)
+                upload.parts_received = number
+                upload.save(update_fields=['parts_received', 'updated_at'])
+
+        finally:
+            if default_storage.exists(temporary_path):
+                default_storage.delete(temporary_path)
+
+        return JsonResponse(chunked_upload_state(upload))
+
+    def part_error(self, upload, number):
+        """
+        Return the response to a part that is not the next one expected, otherwise None.
+        """
+        if upload.status != Status.PENDING:
+            return JsonResponse({'error': 'The upload is already complete.'}, status=409)
+
+        if not 1 <= number <= upload.part_count:
+            return JsonResponse({'error': f'Parts are numbered from 1 to {upload.part_count}.'}, status=400)
+
+        if number <= upload.parts_received:
+            return JsonResponse(chunked_upload_state(upload))
+
+        if number != upload.parts_received + 1:
+            return JsonResponse(
+                {'error': f'Part {upload.parts_received + 1} is expected.', **chunked_upload_state(upload)},
+                status=409
+            )
+
+        return None
+
+
+class ChunkedUploadCompleteView(View):
+    """
+    View to complete a chunked upload once all its parts are received. The parts are assembled
+    into a TimeSheetFile by the assemble_chunked_upload task, which checks its header and
+    processes the file; the progress is then followed with the `upload_chunked` URL.
+    """
+    def post(self, request, upload_id):
+        with transaction.atomic():
+            upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), id=upload_id)
+
+            # Completing the upload again returns its current state
+            if upload.status != Status.PENDING:
+                return JsonResponse(chunked_upload_state(upload))
+
+            if upload.parts_received < upload.part_count:
+                return JsonResponse(
+                    {'error': f'Part {upload.parts_received + 1} is expected.', **chunked_upload_state(upload)},
+                    status=400
+                )
+
+            upload.status = Status.LOADED
+            upload.save(update_fields=['status', 'updated_at'])
+
+            transaction.on_commit(lambda: assemble_chunked_upload.delay(upload.id))
+
+        return JsonResponse(
+            {
+                'message': 'File uploaded successfully. It is being assembled before it is processed.',
+                **chunked_upload_state(upload),
+            },
+            status=202
+        )
+
 
 class StatusView(View):
     """
@@ -109,11 +428,151 @@ class StatusView(View):
             return JsonResponse({'status': 'error', 'message': 'File not found.'})
 
 
+class StatusEventsView(View):
+    """
+    View to push the processing status of the uploaded CSV file as Server-Sent Events:
+    every status change and the number of rows processed so far, over a single connection.
+    The events are only streamed as they happen when served through ASGI (billable_hours/asgi.py):
+    through WSGI, the stream would be read to the end before being sent, so none is opened and
+    the 204 status tells the browser not to reconnect.
+    """
+    async def get(self, request, file_id):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+
+        return StreamingHttpResponse(
+            status_events(file_id),
+            content_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+
+class BatchStatusView(View):
+    """
+    View to return the processing status of many files at once, given as a comma-separated
+    list of file IDs in the `ids` query parameter, with a single query.
+    Responses carry an ETag, so an unchanged batch is answered with 304 Not Modified.
+    """
+    # As many IDs as fit in a request line of 4094 bytes, the default limit of gunicorn,
+    # even with their commas percent-encoded
+    max_files = 100
+
+    def get(self, request):
+        try:
+            # Keep the order of the IDs, without duplicates
+            file_ids = list(dict.fromkeys(UUID(file_id) for file_id in request.GET.get('ids', '').split(',') if file_id))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid file ID.'}, status=400)
+
+        if not file_ids:
+            return JsonResponse({'error': 'No file IDs were given.'}, status=400)
+
+        if len(file_ids) > self.max_files:
+            return JsonResponse({'error': f'At most {self.max_files} files can be checked at once.'}, status=400)
+
+        states = get_file_states(file_ids)
+        data = {'files': {str(file_id): states[file_id] for file_id in file_ids}}
+
+        etag = quote_etag(hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest())
+
+        # 304 Not Modified if the client already has this batch
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse(data)
+
+        response['ETag'] = etag
+        return response
+
+
+class UploadBatchStatusView(View):
+    """
+    View to return the status of a batch of uploaded files as a whole, the number of its
+    files in each status, and the status of each of them.
+    """
+    def get(self, request, batch_id):
+        state = get_batch_state(batch_id)
+
+        # Batches are saved with at least one file, which may have been deleted since
+        if not state['files'] and not UploadBatch.objects.filter(id=batch_id).exists():
+            return JsonResponse({'status': 'error', 'message': 'Batch not found.'}, status=404)
+
+        return JsonResponse({'batch_id': batch_id, **state})
+
+
+class StagesView(View):
+    """
+    View to return the time spent, rows, queries and bytes of each processing stage of a file,
+    to find where the processing of a slow file goes.
+    """
+    def get(self, request, file_id):
+        timesheet_file = TimeSheetFile.objects.filter(id=file_id).values('status', 'uploaded_at').first()
+        if timesheet_file is None:
+            return JsonResponse({'status': 'error', 'message': 'File not found.'}, status=404)
+
+        stages = ProcessingStage.objects.filter(file_id=file_id).values(
+            'name', 'started_at', 'finished_at', 'seconds', 'rows', 'queries', 'bytes_processed'
+        )
+
+        return JsonResponse({
+            'file_id': file_id,
+            'status': timesheet_file['status'],
+            'uploaded_at': timesheet_file['uploaded_at'],
+            'stages': list(stages),
+        })
+
+
+class AppendStatusView(View):
+    """
+    View to return the processing status of rows appended to a file.
+    """
+    def get(self, request, append_id):
+        try:
+            timesheet_append = TimeSheetAppend.objects.get(id=append_id)
+
+            if timesheet_append.status == Status.FAILED:
+                return JsonResponse({'status': timesheet_append.status, 'message': timesheet_append.error_message})
+
+            return JsonResponse({'status': timesheet_append.status})
+
+        except TimeSheetAppend.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Appended rows not found.'})
+
+
 class InvoicesView(View):
     """
     View to display the invoice summary for a specific file.
+    The rendered page is cached until the summary changes, and is served with ETag and
+    Last-Modified headers so that browsers and proxies can revalidate it (304 Not Modified).
     """
+    template_name = 'invoices/invoices_summary.html'
+
     def get(self, request, file_id):
+        # The version of the summary is enough to answer a conditional request
+        version = InvoiceSummary.objects.filter(file__id=file_id).values('id', 'updated_at').first()
+        if version is None:
+            raise Http404('No InvoiceSummary matches the given query.')
+
+        etag = quote_etag(f"{version['id']}-{version['updated_at'].timestamp()}")
+        last_modified = int(version['updated_at'].timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(self.render_summary(request, file_id, etag))
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def render_summary(self, request, file_id, etag):
+        """
+        Return the rendered page of the summary, from the cache if it is still the current version.
+        """
+        cache_key = invoice_page_cache_key(file_id)
+        cached = cache.get(cache_key)
+        if cached and cached[0] == etag:
+            return cached[1]
+
         invoice_summary = get_object_or_404(InvoiceSummary, file__id=file_id)
 
         context = {
@@ -122,5 +581,177 @@ class InvoicesView(View):
             'project_total_costs': invoice_summary.project_total_costs,
         }
 
-        return render(request, 'invoices/invoices_summary.html', context)
+        content = render_to_string(self.template_name, context, request)
+        cache.set(cache_key, (etag, content), timeout=settings.INVOICES_PAGE_CACHE_TIMEOUT)
+        return content
+
+
+class InvoicePDFView(View):
+    """
+    View to download the invoice of a file as a PDF, for all its projects or for the one
+    given in the `project` query parameter.
+    The PDFs are rendered once per version of the summary (see render_invoice_pdfs) and
+    served from storage afterwards.
+    """
+    def get(self, request, file_id):
+        invoice_summary = get_object_or_404(InvoiceSummary, file__id=file_id)
+        project = request.GET.get('project')
+
+        if project is not None and project not in invoice_summary.project_summary:
+            raise Http404('No project matches the given query.')
+
+        path = get_invoice_pdf(invoice_summary, project)
+
+        filename = f'Invoice_{file_id}.pdf' if project is None else f'Invoice_{file_id}_{slugify(project)}.pdf'
+        return FileResponse(
+            default_storage.open(path), as_attachment=True, filename=filename, content_type='application/pdf'
+        )
+
+
+# Content types of the export formats
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_response(request, content, file_id, name, export_format):
+    """
+    Return a streaming response downloading the exported content as a file.
+    Served through ASGI, the content is read by an async iterator, as Django would otherwise
+    read a synchronous one to the end before sending anything.
+    """
+    if isinstance(request, ASGIRequest):
+        content = iter_async(content)
+
+    return StreamingHttpResponse(
+        content,
+        content_type=EXPORT_CONTENT_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{name}-{file_id}.{export_format}"'}
+    )
+
+
+class LineItemsExportView(View):
+    """
+    View to download the timesheet entries of a file as CSV or NDJSON.
+    The rows are streamed from a server-side cursor, so exports of any size use constant memory.
+    """
+    def get(self, request, file_id, export_format):
+        get_object_or_404(TimeSheetFile, id=file_id)
+
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise Http404('Unknown export format.')
+
+        return export_response(request, stream_line_items(file_id, export_format), file_id, 'line-items', export_format)
+
+
+class SummaryExportView(View):
+    """
+    View to download the per-project invoice summary of a file as CSV or NDJSON.
+    """
+    def get(self, request, file_id, export_format):
+        invoice_summary = get_object_or_404(InvoiceSummary, file__id=file_id)
+
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise Http404('Unknown export format.')
+
+        return export_response(request, stream_summary(invoice_summary, export_format), file_id, 'summary', export_format)
+
+
+def parse_report_filters(request):
+    """
+    Read the `start` and `end` dates and the optional `employee` of a report request.
+    Returns a (start, end, employee) tuple and None, or None and the JSON error response.
+    """
+    try:
+        start = parse_date(request.GET.get('start', ''))
+        end = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        start = end = None
+
+    if start is None or end is None:
+        return None, JsonResponse({'error': 'A start and an end date are required, as YYYY-MM-DD.'}, status=400)
+
+    if start > end:
+        return None, JsonResponse({'error': 'The start date is after the end date.'}, status=400)
+
+    employee = request.GET.get('employee')
+    if employee is not None and not employee.isdigit():
+        return None, JsonResponse({'error': 'Invalid employee ID.'}, status=400)
+
+    return (start, end, int(employee) if employee is not None else None), None
+
+
+class ReportView(View):
+    """
+    View to return the hours and cost of every file between two dates (the `start` and `end`
+    query parameters), per project, employee or date (`group_by`, project by default).
+    Reports can be limited to a `project` or an `employee`. They are read from the daily
+    rollups, so they take the same time however many timesheet entries there are.
+    """
+    def get(self, request):
+        filters, error_response = parse_report_filters(request)
+        if error_response:
+            return error_response
+        start, end, employee = filters
+
+        group_by = request.GET.get('group_by', 'project')
+        if group_by not in REPORT_GROUPS:
+            return JsonResponse({'error': f'Reports can be grouped by {", ".join(REPORT_GROUPS)}.'}, status=400)
+
+        rows = rollup_report(start, end, group_by, project=request.GET.get('project'), employee=employee)
+
+        return JsonResponse({
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'rows': convert_decimal_to_string(rows),
+        })
+
+
+class AnalyticsView(View):
+    """
+    View to return the hours and cost of every file between two dates (`start` and `end`),
+    grouped by any of project and employee (`group_by`, comma-separated, project by default)
+    and by `period` (day, week or month), optionally for a single `project` or `employee`.
+
+    Results are paginated: a page holds at most `limit` rows, and the `next` cursor of
+    a page is passed as the `cursor` parameter to get the following one. They are cached
+    until files are processed, see invoices.analytics.
+    """
+    default_limit = 100
+    max_limit = 1000
+
+    def get(self, request):
+        filters, error_response = parse_report_filters(request)
+        if error_response:
+            return error_response
+        start, end, employee = filters
+
+        limit = request.GET.get('limit', str(self.default_limit))
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_limit:
+            return JsonResponse({'error': f'The limit must be between 1 and {self.max_limit}.'}, status=400)
+
+        # Keep the order of the dimensions, without duplicates
+        dimensions = list(dict.fromkeys(
+            dimension for dimension in request.GET.get('group_by', 'project').split(',') if dimension
+        ))
+        period = request.GET.get('period') or None
+
+        try:
+            rows, next_cursor = cached_totals(
+                start=start, end=end, dimensions=dimensions, period=period,
+                project=request.GET.get('project'), employee=employee,
+                cursor=request.GET.get('cursor'), limit=int(limit)
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
+        return JsonResponse({
+            'start': start,
+            'end': end,
+            'group_by': dimensions,
+            'period': period,
+            'rows': convert_decimal_to_string(rows),
+            'next': next_cursor,
+        })
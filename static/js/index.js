@@ -67,6 +67,33 @@ document.getElementById("uploadForm").onsubmit = function (event) {
     tryAgainButton.style.display = "none"; // Hide the "Try Again" button
   }
 
+  // Follow the status of the file through Server-Sent Events
+  function listenForStatus(fileId) {
+    const source = new EventSource(`/status/${fileId}/events/`);
+
+    source.addEventListener("status", (event) => {
+      const statusData = JSON.parse(event.data);
+
+      if (statusData.status === "PROCESSED") {
+        source.close();
+        window.location.href = `/invoices/${fileId}`;
+      } else if (
+        statusData.status === "FAILED" ||
+        statusData.status === "error"
+      ) {
+        source.close();
+        showFlashMessage(
+          statusData.message || "An unknown error occurred.",
+          "danger"
+        );
+        resetUploadButton();
+      } else if (statusData.rows_processed) {
+        buttonText.textContent = `Processing... (${statusData.rows_processed} rows)`;
+      }
+    });
+    // The browser reconnects by itself when the stream is closed by the server
+  }
+
   fetch(upload_url, {
     method: "POST",
     body: formData,
@@ -87,6 +114,12 @@ document.getElementById("uploadForm").onsubmit = function (event) {
 
       const fileId = data.file_id;
 
+      // Let the server push the status changes when it can and the browser supports it
+      if (status_events && window.EventSource) {
+        listenForStatus(fileId);
+        return;
+      }
+
       let pollingInterval = 3000; // Start with 3 seconds
       let attempts = 0;
       let intervalId; // Declare the intervalId
@@ -1,17 +1,3 @@
-document.getElementById("download-pdf").addEventListener("click", function () {
-  var element = document.getElementById("invoice-content");
-
-  html2pdf()
-    .from(element)
-    .set({
-      margin: 1,
-      filename: "Invoice_" + fileId + ".pdf", // Pass fileId from Django
-      html2canvas: { scale: 2 },
-      jsPDF: { orientation: "portrait", unit: "in", format: "letter" },
-    })
-    .save();
-});
-
 // Scroll to Top Function
 function scrollToTop() {
   window.scrollTo({ top: 0, behavior: "smooth" });